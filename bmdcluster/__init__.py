@@ -3,24 +3,558 @@ __email__ = "csprock@gmail.com"
 __version__ = "0.3.1"
 
 
+import inspect
 import warnings
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
 from bmdcluster.optimizers.blockdiagonalBMD import run_bd_BMD
+from bmdcluster.optimizers.batched import run_bd_BMD_batched
 from bmdcluster.optimizers.generalBMD import run_BMD
 from bmdcluster.initializers.primary_initializer import initialize_general
 from bmdcluster.initializers.primary_initializer import initialize_block_diagonal
 from bmdcluster.optimizers.generalBMD import _updateA
-from bmdcluster.optimizers.blockdiagonalBMD import _bd_updateA
+from bmdcluster.optimizers.blockdiagonalBMD import _bd_updateA, _bd_objective, _bd_distances
+from bmdcluster.persistence import save_model, load_model, load_checkpoint, Checkpointer
+from bmdcluster.utils import collapse_rows, collapse_columns, labels_to_indicator, column_major, Deadline
+from bmdcluster.utils import EmptyClusters, EmptyClusterStats, select_columns, expand_columns
+from bmdcluster.optimizers.generalBMD import _objective, _affiliation_scores, _feature_mask
+from bmdcluster.optimizers.chunked import run_bd_BMD_chunked, run_BMD_chunked, chunk_rows, iter_chunks
+from bmdcluster.initializers.cluster_initializers import initialize_labels, initialize_B
+from bmdcluster.initializers.bootstrap_initializer import sample_data
+from bmdcluster.index import HammingLSH
+from bmdcluster.serving import PackedBMD
+from bmdcluster.cache import PredictionCache, FitCache, fingerprint
+
+
+def _check_init(init, use_bootstrap):
+
+    if init not in ('random', 'kmeans++'):
+        raise ValueError("'init' must be one of 'random' or 'kmeans++'")
+
+    if use_bootstrap and init == 'kmeans++':
+        raise ValueError("Cannot use bootstrapping with 'kmeans++' initialization")
+
+
+def _check_fit_mode(fit_mode, sample_size):
+
+    if fit_mode not in ('full', 'sample'):
+        raise ValueError("'fit_mode' must be one of 'full' or 'sample'")
+
+    if fit_mode == 'sample' and not sample_size:
+        raise ValueError("Must specify keyword argument 'sample_size' when 'fit_mode' is 'sample'.")
+
+
+def _check_empty_cluster(empty_cluster, n_jobs, fit_mode):
+
+    # raises a ValueError for an unknown policy
+    EmptyClusters(empty_cluster)
+
+    if empty_cluster != 'keep' and n_jobs > 1 and fit_mode == 'full':
+        raise ValueError("Only empty_cluster='keep' is supported with n_jobs > 1")
+
+
+def _top_k(S, k):
+    """ Returns the k columns with the lowest scores of each row of S and their scores, ordered by score 
+    and then by column. """
+
+    k = min(k, S.shape[1])
+    cols = np.argpartition(S, k - 1, axis=1)[:, :k] if k < S.shape[1] else np.tile(np.arange(k), (S.shape[0], 1))
+    scores = np.take_along_axis(S, cols, axis=1)
+
+    order = np.lexsort((cols, scores), axis=1)
+
+    return np.take_along_axis(cols, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
 
 class _BMD:
 
+    # arrays needed for inference, written by .save()
+    _inference_arrays = ('_B',)
+    # arrays only needed for training, dropped when pickling
+    _training_arrays = ('W',)
+    # parameters that do not change the result of a fit, left out of the key of the fit cache
+    _fit_cache_ignored = ('cache_size', 'index_tables', 'index_bits', 'max_time', 'checkpoint_dir', 'checkpoint_every',
+                          'checkpoint_seconds', 'fit_cache_dir', 'fit_cache_bytes')
+
     def __init__(self):
         pass
 
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        for name in self._training_arrays:
+            state.pop(name, None)
+
+        # the data cluster matrix is pickled as a vector of labels
+        if '_A' in state:
+            state['_A'] = self._get_labels(self._A).astype(np.int32)
+            state['_A_matrix'] = self._A.ndim == 2
+
+        return state
+
+    def __setstate__(self, state):
+
+        A_matrix = state.pop('_A_matrix', False)
+        self.__dict__.update(state)
+        if A_matrix:
+            self._A = labels_to_indicator(self._A.astype(np.int64), self._n_fitted)
+
+    def _get_params(self):
+
+        return {p: getattr(self, p) for p in inspect.signature(self.__init__).parameters}
+
+    def save(self, path):
+        """Save the fitted model to a directory. Only the parameters and the arrays needed
+        for inference are stored, the training data and data cluster matrix are not.
+        
+        Parameters
+        ----------
+        path : str
+            directory to save the model to
+        """
+
+        save_model(path, 
+                    model_name=type(self).__name__, 
+                    params=self._get_params(),
+                    arrays={name: getattr(self, name) for name in self._inference_arrays},
+                    attributes=self._save_attributes(),
+                    version=__version__)
+
+    def _save_attributes(self):
+        """ Attributes of the fitted model written by .save() besides the inference arrays, as JSON values. """
+
+        return {'cost': float(self.cost), 
+                'dropped_clusters': [int(k) for k in getattr(self, 'dropped_clusters', [])]}
+
+    def _load_attributes(self, attributes):
+        """ Set the attributes written by .save() on a loaded model. """
+
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a model saved with .save().
+        
+        Parameters
+        ----------
+        path : str
+            directory the model was saved to
+        mmap : bool, optional
+            memory-map the model arrays read-only so they can be shared between processes, by default True
+        
+        Returns
+        -------
+        _BMD
+            fitted model
+        
+        Raises
+        ------
+        ValueError
+            If the saved model is not an instance of this class
+        """
+
+        meta, arrays = load_model(path, mmap=mmap)
+
+        if meta['model'] != cls.__name__:
+            raise ValueError("Cannot load a {0} model as {1}".format(meta['model'], cls.__name__))
+
+        model = cls(**meta['params'])
+        model._load_attributes(meta['attributes'])
+        for name, arr in arrays.items():
+            setattr(model, name, arr)
+
+        return model
+
+    @property
+    def A(self):
+        """Data cluster assignment matrix. Out-of-core fits store a vector of data labels, which is 
+        expanded to a matrix when accessed."""
+
+        if self._A.ndim == 1:
+            return labels_to_indicator(self._A, self._n_fitted)
+
+        return self._A
+
+    @A.setter
+    def A(self, A):
+        self._A = A
+
+    @property
+    def _n_fitted(self):
+        """ Number of data clusters of the fitted model. """
+        return self.n_clusters
+
+    @property
+    def B(self):
+        """Feature cluster assignment matrix. The general model stores the identity initialization
+        as a vector of feature labels, which is expanded to a matrix when accessed."""
+
+        if self._B.ndim == 1:
+            return labels_to_indicator(self._B, self.X.shape[1])
+
+        return self._B
+
+    @B.setter
+    def B(self, B):
+        self._B = B
+        # cached predictions are stale once the feature clusters change
+        if getattr(self, 'cache', None) is not None:
+            self.cache.clear()
+
+    def cache_info(self):
+        """Return the hit and miss counters and the size of the prediction cache, see :code:`cache_size`.
+        
+        Returns
+        -------
+        bmdcluster.cache.CacheInfo
+            named tuple (hits, misses, maxsize, currsize), None if the cache is disabled
+        """
+        return None if self.cache is None else self.cache.info()
+
+    @staticmethod
+    def _in_memory(W):
+        """Determine if W is an array held in memory rather than read from disk, such as an
+        np.memmap or a matrix returned by the readers in :code:`bmdcluster.loaders`."""
+        return isinstance(W, np.ndarray) and not isinstance(W, np.memmap)
+
+    def _out_of_core(self, W):
+        """Determine if W should be streamed in blocks of rows rather than fit in memory. An np.memmap
+        is streamed unless an option needs all of W in memory. Raises a ValueError if such an option is
+        set with :code:`max_memory` or with data read by :code:`bmdcluster.loaders.read_packed`."""
+
+        if self.max_memory is None and self._in_memory(W):
+            return False
+
+        if self.max_memory is None and isinstance(W, np.memmap) and not self._streamable():
+            return False
+
+        if self.use_bootstrap or self.init != 'random':
+            raise ValueError("Only 'random' initialization is supported when fitting out-of-core")
+
+        if self.collapse_duplicates or getattr(self, 'collapse_features', False):
+            raise ValueError("Collapsing rows or features is not supported when fitting out-of-core")
+
+        if self.empty_cluster != 'keep':
+            raise ValueError("Only empty_cluster='keep' is supported when fitting out-of-core")
+
+        return True
+
+    def _streamable(self):
+        """Determine if the options allow fitting out-of-core."""
+
+        return (not self.use_bootstrap and self.init == 'random' and not self.collapse_duplicates
+                and not getattr(self, 'collapse_features', False) and self.empty_cluster == 'keep')
+
+    def _predict_blocks(self, W):
+        """Yield the predicted cluster assignment matrix of W. Data on disk is read in blocks of
+        rows and one matrix is yielded per block."""
+
+        if self._in_memory(W):
+            yield self._predict_block(W)
+            return
+
+        for _, W_chunk in iter_chunks(W, chunk_rows(W, self.n_clusters, self.max_memory)):
+            yield self._predict_block(W_chunk)
+
+    def _predict_block(self, W):
+        """ Assign the points of W to data clusters, looking up repeated rows in the cache if there is one. """
+
+        if self.cache is None:
+            return self._assign(W)
+
+        labels = self.cache.predict(W, lambda W_new: self._get_labels(self._assign(W_new)))
+
+        return labels_to_indicator(labels, self._n_fitted)
+
+    def predict(self, W):
+        """Predict cluster labels of new data. 
+        
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix, or data on disk such as returned by :code:`bmdcluster.loaders.read_packed`
+        
+        Returns
+        -------
+        np.array
+            predicted cluster labels
+        """
+
+        return np.concatenate([self._get_labels(A_pred) for A_pred in self._predict_blocks(W)])
+
+    def transform(self, W, output='indicator', k=1):
+        """Predict cluster assignment matrx of new data, or the scores of the clusters for each point
+        
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix, or data on disk such as returned by :code:`bmdcluster.loaders.read_packed`
+        output : str, optional
+            one of 'indicator' for the cluster assignment matrix, 'distances' for the matrix of scores of every
+            point and cluster or 'topk' for the :code:`k` best clusters of every point and their scores, by default 
+            'indicator'. The score is the squared distance to the cluster centroid for :code:`blockdiagonalBMD` and 
+            the affiliation score for :code:`generalBMD`, lower is better. 'topk' computes the scores in blocks of
+            rows and keeps only the best :code:`k` of each block.
+        k : int, optional
+            number of clusters returned per point with :code:`output='topk'`, by default 1
+        
+        Returns
+        -------
+        np.array
+            predicted cluster assignment matrix, or the n x K matrix of scores with :code:`output='distances'`, or 
+            the n x k matrix of best clusters ordered by score with :code:`output='topk'`
+        np.array
+            n x k matrix of the scores of the best clusters, only returned with :code:`output='topk'`
+
+        Raises
+        ------
+        ValueError
+            If :code:`output` is not one of 'indicator', 'distances' or 'topk'
+        """
+
+        if output == 'indicator':
+            return np.vstack(list(self._predict_blocks(W)))
+
+        if output == 'distances':
+            return np.vstack([self._scores(W_chunk) for _, W_chunk in self._chunks(W)])
+
+        if output == 'topk':
+            labels, scores = zip(*[_top_k(self._scores(W_chunk), k) for _, W_chunk in self._chunks(W)])
+            return np.vstack(labels), np.vstack(scores)
+
+        raise ValueError("'output' must be one of 'indicator', 'distances' or 'topk'")
+
+    def _chunks(self, W):
+        """ Iterate over blocks of rows of W bounded by :code:`max_memory`. """
+        return iter_chunks(W, chunk_rows(W, self.n_clusters, self.max_memory), prefetch=not self._in_memory(W))
+
+    def fit(self, W, verbose=False, sample_weight=None, callback=None, resume_from=None):
+        """Fit the model. If :code:`fit_cache_dir` is set and a fit of the same data with the same parameters
+        is cached, its clusters are loaded instead, see :code:`fit_cache_dir`.
+        
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix
+        verbose : bool, optional
+            print progress during optimization, by default False
+        sample_weight : np.array, optional
+            weight of each row of W, such as the weights of a coreset from :code:`bmdcluster.coreset`, by default 
+            None. A row of weight w counts as w copies of the row.
+        callback : callable, optional
+            function called with the number of iterations and the cost after every iteration, by default None.
+            The fit stops early if it returns True, and is aborted if it raises an exception. Not called with
+            :code:`fit_mode='sample'`.
+        resume_from : str, optional
+            directory of a checkpoint saved by a fit of the same model and data, see :code:`checkpoint_dir`, to
+            continue instead of starting a new fit, by default None. Resumed fits do not use the fit cache.
+        
+        Raises
+        ------
+        ValueError
+            If :code:`sample_weight` or :code:`resume_from` is given with :code:`fit_mode='sample'`
+        ValueError
+            If the checkpoint of :code:`resume_from` does not match the model or data
+        """
+
+        if self.fit_cache_dir is None or self.seed is None or resume_from is not None:
+            self._fit(W, verbose, sample_weight, callback, resume_from)
+            return
+
+        fit_cache = FitCache(self.fit_cache_dir, self.fit_cache_bytes)
+        key = fit_cache.key(W, self._fit_key(), sample_weight)
+
+        arrays = fit_cache.get(key)
+        if arrays is not None:
+            self.W = W
+            self._restore_fit(arrays)
+            return
+
+        # fits stopped early by the callback are not cached
+        stopped = []
+        if callback is not None:
+            def callback(n_iter, cost, callback=callback):
+                stop = callback(n_iter, cost)
+                if stop:
+                    stopped.append(n_iter)
+                return stop
+
+        self._fit(W, verbose, sample_weight, callback, resume_from)
+
+        if not stopped and not self.truncated:
+            fit_cache.put(key, self._fit_arrays())
+
+    def _fit_key(self):
+        """ Model class, library version and parameters a fit depends on, hashed into the key of the fit cache. """
+
+        params = {p: v for p, v in self._get_params().items() if p not in self._fit_cache_ignored}
+        return {'model': type(self).__name__, 'version': __version__, 'params': params}
+
+    def _fit_arrays(self):
+        """ Arrays and attributes of the fitted model stored in the fit cache. """
+
+        arrays = {name: getattr(self, name) for name in self._inference_arrays}
+        arrays.update(labels=self._get_labels(self._A).astype(np.int32), A_matrix=self._A.ndim == 2, cost=self.cost)
+        if getattr(self, 'validation_costs', None) is not None:
+            arrays['validation_costs'] = self.validation_costs
+        arrays['dropped_clusters'] = self.dropped_clusters
+        if self.empty_cluster_stats is not None:
+            arrays['empty_cluster_stats'] = np.array(self.empty_cluster_stats)
+
+        return arrays
+
+    def _restore_fit(self, arrays):
+        """ Set the fitted model from arrays stored in the fit cache. """
+
+        for name in self._inference_arrays:
+            setattr(self, name, arrays[name])
+        if self.cache is not None:
+            self.cache.clear()
+
+        labels = arrays['labels'].astype(np.int64)
+        self.A = labels_to_indicator(labels, self._n_fitted) if arrays['A_matrix'] else labels
+        self.cost = float(arrays['cost'])
+        if 'validation_costs' in arrays:
+            self.validation_costs = arrays['validation_costs']
+        self.dropped_clusters = arrays['dropped_clusters'].astype(int)
+        self.empty_cluster_stats = None
+        if 'empty_cluster_stats' in arrays:
+            self.empty_cluster_stats = EmptyClusterStats(*(int(n) for n in arrays['empty_cluster_stats']))
+        self.truncated = False
+        self._build_index()
+
+    def _build_index(self):
+        """ Build the structures used for prediction after a fit, none by default. """
+        pass
+
+    def _fit_sample(self, W, verbose=False, sample_weight=None):
+        """Fit copies of the model to :code:`n_samples` random samples of the rows of W in parallel, keep the 
+        feature clusters of the copy with the lowest cost on a validation sample and assign all rows of W to 
+        its data clusters in one pass over blocks of rows. The data clusters are stored as a vector of labels."""
+
+        if sample_weight is not None:
+            raise ValueError("Sample weights are not supported with fit_mode='sample'")
+
+        n = W.shape[0]
+        size = min(self.sample_size, n)
+
+        # one seed per sample so that the samples differ
+        samples = [sample_data(n, size, seed=self.seed + i + 1 if self.seed is not None else None) for i in range(self.n_samples)]
+        validation = sample_data(n, min(self.validation_size or size, n), seed=self.seed)
+
+        template = type(self)(**dict(self._get_params(), fit_mode='full', n_jobs=1, max_time=None,
+                                   checkpoint_dir=None, fit_cache_dir=None))
+        models = fit_many([np.asarray(W[rows]) for rows in samples], template, n_jobs=self.n_jobs, max_time=self.max_time)
+        self.truncated = any(m.truncated for m in models)
+
+        W_val = np.asarray(W[validation])
+        self.validation_costs = np.array([m._cost(m._assign(W_val), W_val) for m in models])
+        best = models[self.validation_costs.argmin()]
+
+        if verbose:
+            print("Validation costs of the samples: {0}".format(self.validation_costs))
+
+        for name in self._inference_arrays:
+            setattr(self, name, getattr(best, name))
+        self.empty_cluster_stats, self.dropped_clusters = best.empty_cluster_stats, best.dropped_clusters
+        if self.cache is not None:
+            self.cache.clear()
+
+        labels, cost = [], 0.0
+        for _, W_chunk in self._chunks(W):
+            A_chunk = self._assign(W_chunk)
+            labels.append(self._get_labels(A_chunk))
+            cost += self._cost(A_chunk, W_chunk)**2
+
+        self.A = np.concatenate(labels)
+        self.cost = np.sqrt(cost)
+
+    def _data_fingerprint(self, W, weights, resume_from):
+        """ Fingerprint of the data and weights, saved with checkpoints and checked on resume, None if neither is used. """
+
+        if resume_from is None and self.checkpoint_dir is None:
+            return None
+        return fingerprint(W, weights)
+
+    def _resume(self, resume_from, shape, data=None):
+        """Load the checkpoint to resume a fit to data of the given shape and fingerprint from, None to start a
+        new fit. Raises a ValueError if the checkpoint does not match the model or data."""
+
+        if resume_from is None:
+            return None
+
+        state = load_checkpoint(resume_from)
+        if state['n_clusters'] != self.n_clusters or len(state['labels']) != shape[0] or len(state['B']) != shape[1]:
+            raise ValueError("The checkpoint does not match the model or the data")
+        if data is not None and state['fingerprint'] is not None and state['fingerprint'] != data:
+            raise ValueError("The checkpoint was saved by a fit of different data")
+
+        return state
+
+    def _run_options(self, state, callback, data=None):
+        """Returns the number of iterations left, the callback counting iterations from the start of the fit 
+        and the checkpointer of a fit starting from the checkpoint state, or from scratch if it is None. The
+        checkpoints hold the fingerprint of the data."""
+
+        start = 0 if state is None else state['n_iter']
+
+        if callback is not None and start > 0:
+            callback = lambda n_iter, cost, callback=callback: callback(start + n_iter, cost)
+
+        checkpoint = None
+        if self.checkpoint_dir is not None:
+            checkpoint = Checkpointer(self.checkpoint_dir, self.n_clusters, every=self.checkpoint_every, 
+                                      seconds=self.checkpoint_seconds, start_iter=start, fingerprint=data)
+
+        return self.max_iter - start, callback, checkpoint
+
+    def _empty_clusters(self, state):
+        """Returns the empty cluster policy of a fit starting from the checkpoint state, or from scratch if it 
+        is None. The clusters dropped before a checkpoint are the clusters empty at the checkpoint."""
+
+        dropped = None
+        if state is not None and self.empty_cluster == 'drop':
+            labels = state['labels']
+            dropped = np.where(np.bincount(labels[labels >= 0], minlength=self.n_clusters) == 0)[0]
+
+        return EmptyClusters(self.empty_cluster, dropped)
+
+    def _alive(self):
+        """ Indices of the clusters that were not dropped by the fit, None if none were. """
+
+        dropped = np.asarray(getattr(self, 'dropped_clusters', []), dtype=int)
+        if len(dropped) == 0:
+            return None
+
+        return np.setdiff1d(np.arange(self._n_fitted), dropped)
+
+    def _collapse(self, W, sample_weight=None):
+        """Collapse duplicate rows of W if :code:`collapse_duplicates` is set. Returns the
+        matrix to fit, the row weights and the index mapping the fitted rows back to W. The
+        weight of a unique row is the sum of the sample weights of its duplicates. Raises a
+        ValueError if there are not more unique rows than data clusters."""
+
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight, dtype=float)
+
+        if self.collapse_duplicates:
+            W, weights, inverse = collapse_rows(W)
+            if W.shape[0] <= self.n_clusters:
+                raise ValueError("'n_clusters' must be less than the number of unique rows ({0}) when collapsing duplicates".format(W.shape[0]))
+            if sample_weight is not None:
+                weights = np.bincount(inverse, weights=sample_weight, minlength=len(weights))
+            return W, weights, inverse
+
+        return W, sample_weight, None
+
     @staticmethod
     def _get_labels(M):
 
+        if M.ndim == 1:
+            return np.array(M)
+
         labels = np.full(shape=(M.shape[0], ), fill_value=-1)
         outliers = M.sum(axis=1) < 1
         non_outlier_labels = M[~outliers, :].argmax(axis=1)
@@ -31,7 +565,7 @@ class _BMD:
 
 class blockdiagonalBMD(_BMD):
 
-    def __init__(self, n_clusters, max_iter=100, use_bootstrap=False, b=None, init_ratio=1.0, seed=None):
+    def __init__(self, n_clusters, max_iter=100, use_bootstrap=False, b=None, init_ratio=1.0, seed=None, init='random', collapse_duplicates=False, max_memory=None, column_copy=False, accelerate=False, index_tables=None, index_bits=16, cache_size=None, fit_mode='full', sample_size=None, n_samples=4, validation_size=None, n_jobs=1, max_time=None, checkpoint_dir=None, checkpoint_every=None, checkpoint_seconds=None, fit_cache_dir=None, fit_cache_bytes=None, empty_cluster='keep'):
         """Run the block-diagonal form of the BMD algorithm. 
         
         Parameters
@@ -48,11 +582,93 @@ class blockdiagonalBMD(_BMD):
             fraction of points to randomly initialize, by default 1.0
         seed : int, optional
             random initialization seed, by default None
+        init : str, optional
+            initialization of the data clusters when not bootstrapping, either 'random' or 'kmeans++', by default 'random'.
+            :code:`init_ratio` is ignored when using 'kmeans++'.
+        collapse_duplicates : bool, optional
+            fit on the unique rows of the data weighted by their multiplicities, by default False.
+            Initialization is done on the unique rows, so duplicate points always start in the same cluster.
+        max_memory : int, optional
+            fit out-of-core, streaming the data through memory in blocks of rows that use at most this many bytes, 
+            by default None. Data read with :code:`bmdcluster.loaders.read_packed` is always fit out-of-core, data given as an
+            :code:`np.memmap` is fit out-of-core unless another option needs it in memory. Only random initialization without
+            bootstrapping or collapsing is supported out-of-core and the data cluster matrix is stored as a
+            vector of labels.
+        column_copy : bool, optional
+            hold a column-major float copy of the data, made once at the start of the fit, for the feature cluster
+            updates, by default False. Trades 8 bytes of memory per entry for faster iterations, especially for
+            compact :code:`uint8` data. Ignored when fitting out-of-core.
+        accelerate : bool, optional
+            skip distance computations between points and clusters using triangle inequality bounds, by default False.
+            The result is the same, but fits with many clusters or features run faster. The bounds take memory for
+            one distance per point and cluster. Ignored when fitting out-of-core.
+        index_tables : int, optional
+            number of hash tables of an approximate nearest-cluster index built at the end of the fit and used by 
+            :code:`.predict` and :code:`.transform`, by default None which compares every point to every cluster. 
+            Speeds up prediction for many clusters. More tables find the closest cluster more reliably, points for 
+            which no cluster is found are compared to every cluster. See :code:`bmdcluster.index.HammingLSH`.
+        index_bits : int, optional
+            number of features sampled by each hash table of the index, by default 16
+        cache_size : int, optional
+            number of distinct data rows whose predicted clusters are cached by :code:`.predict` and :code:`.transform`,
+            by default None which disables the cache. Repeated rows are then predicted with a dictionary lookup.
+            The least recently used rows are evicted first and the cache is cleared when the model is refit.
+            The cache assumes binary data.
+        fit_mode : str, optional
+            'full' to fit on all rows or 'sample' to fit copies of the model on :code:`n_samples` random samples of 
+            :code:`sample_size` rows in parallel, keep the feature clusters of the copy with the lowest cost on a 
+            validation sample and assign every row to its data clusters in one pass, by default 'full'. The 
+            validation costs are stored in :code:`.validation_costs` and the data clusters as a vector of labels.
+        sample_size : int, optional
+            number of rows of each sample with :code:`fit_mode='sample'`, by default None
+        n_samples : int, optional
+            number of samples fit with :code:`fit_mode='sample'`, by default 4
+        validation_size : int, optional
+            number of rows of the validation sample, by default :code:`sample_size`
+        n_jobs : int, optional
+            number of worker processes, by default 1. With :code:`fit_mode='sample'` the samples are fit in parallel,
+            otherwise the rows are split into :code:`n_jobs` partitions held in shared memory and each iteration is
+            run on the partitions in parallel, with the same result. The data is copied into shared memory once, so 
+            data on disk must fit in memory. :code:`column_copy` and :code:`accelerate` are ignored.
+        max_time : float, optional
+            time budget of the fit in seconds, by default None. It is checked between the updates of each
+            iteration and once it runs out the fit stops with the best solution found so far and sets 
+            :code:`.truncated`. With :code:`fit_mode='sample'` the budget is shared by the fits of the samples,
+            the final assignment of the rows takes additional time.
+        checkpoint_dir : str, optional
+            directory a checkpoint of the fit is saved to periodically, by default None. A fit interrupted after a
+            checkpoint continues exactly where it stopped with :code:`.fit(W, resume_from=checkpoint_dir)`. Not
+            used with :code:`fit_mode='sample'`.
+        checkpoint_every : int, optional
+            number of iterations between checkpoints, by default every iteration unless :code:`checkpoint_seconds`
+            is set
+        checkpoint_seconds : float, optional
+            number of seconds between checkpoints, by default None
+        fit_cache_dir : str, optional
+            directory of an on-disk cache of fit results, by default None which disables it. A fit of data whose
+            bit-packed rows, sample weights and model parameters match a cached fit loads its clusters and cost
+            instead of running again, and is stored otherwise. The key includes the library version. Fits with
+            :code:`seed=None`, truncated by :code:`max_time` or stopped by a callback are not cached.
+        fit_cache_bytes : int, optional
+            maximum total size of the fit cache in bytes, the least recently used fits are removed first, by
+            default None for no limit
+        empty_cluster : str, optional
+            what to do with data clusters left empty by an iteration, one of 'keep', 'reseed' or 'drop', by 
+            default 'keep'. 'keep' leaves them in the fit with a centroid of 0's, 'reseed' moves the points with
+            the highest cost into them and 'drop' leaves them out of the rest of the fit and of predictions. The
+            number of such events is reported in :code:`.empty_cluster_stats` and the dropped clusters in
+            :code:`.dropped_clusters`. Only 'keep' is supported when fitting out-of-core or with :code:`n_jobs` > 1.
         
         Raises
         ------
         ValueError
             If :code:`use_bootstrap` is set to True but and :code:`b` is not specified
+        ValueError
+            If :code:`init` is not one of 'random' or 'kmeans++' or is 'kmeans++' and :code:`use_bootstrap` is set
+        ValueError
+            If :code:`fit_mode` is not one of 'full' or 'sample' or is 'sample' and :code:`sample_size` is not specified
+        ValueError
+            If :code:`empty_cluster` is not one of 'keep', 'reseed' or 'drop', or is not 'keep' and :code:`n_jobs` > 1
         ValueError
             If both :code:`B_ident` and :code:`f_clusters` are not specified
             
@@ -62,82 +678,159 @@ class blockdiagonalBMD(_BMD):
         if use_bootstrap and not b:
             raise ValueError("Must specify keyword argument 'b' when using bootstrapping.")
 
+        _check_init(init, use_bootstrap)
+        _check_fit_mode(fit_mode, sample_size)
+        _check_empty_cluster(empty_cluster, n_jobs, fit_mode)
+
         self.n_clusters = n_clusters
         self.use_bootstrap = use_bootstrap
         self.b = b
         self.init_ratio = init_ratio
         self.seed = seed
         self.max_iter = max_iter
+        self.init = init
+        self.collapse_duplicates = collapse_duplicates
+        self.max_memory = max_memory
+        self.column_copy = column_copy
+        self.accelerate = accelerate
+        self.index_tables = index_tables
+        self.index_bits = index_bits
+        self.index = None
+        self.cache_size = cache_size
+        self.cache = PredictionCache(cache_size) if cache_size else None
+        self.fit_mode = fit_mode
+        self.sample_size = sample_size
+        self.n_samples = n_samples
+        self.validation_size = validation_size
+        self.n_jobs = n_jobs
+        self.max_time = max_time
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        self.fit_cache_dir = fit_cache_dir
+        self.fit_cache_bytes = fit_cache_bytes
+        self.empty_cluster = empty_cluster
+        self.empty_cluster_stats = None
+        self.dropped_clusters = np.zeros(0, dtype=int)
 
         super(blockdiagonalBMD, self).__init__()
 
-    def fit(self, W, verbose=False):
-        """Fit the model.
-        
-        Parameters
-        ----------
-        W : np.array
-            binary data matrix
-        verbose : bool, optional
-            print progress during optimization, by default False
-        
-        """
+    def _fit(self, W, verbose=False, sample_weight=None, callback=None, resume_from=None):
+        """ Fit the model without looking up the fit cache, see :code:`.fit`. """
 
         self.W = W
-
-        # Initialize cluster indicator matrices.
-        self.A = initialize_block_diagonal(W=self.W, 
-                                             n_clusters = self.n_clusters,
-                                             use_bootstrap = self.use_bootstrap,
-                                             b=self.b,
-                                             init_ratio=self.init_ratio,
-                                             seed=self.seed)
-
-        self.cost, self.A, self.B = run_bd_BMD(self.A, self.W, self.max_iter, verbose)
-
-
-    def predict(self, W):
-        """Predict cluster labels of new data. 
-        
-        Parameters
-        ----------
-        W : np.array
-            binary data matrix
+        self.empty_cluster_stats, self.dropped_clusters = None, np.zeros(0, dtype=int)
+
+        if self.fit_mode == 'sample':
+            if resume_from is not None:
+                raise ValueError("Cannot resume a fit with fit_mode='sample'")
+            self._fit_sample(W, verbose, sample_weight)
+            self._build_index()
+            return
+
+        deadline = Deadline(self.max_time)
+
+        if self._out_of_core(W):
+            data = self._data_fingerprint(W, sample_weight, resume_from)
+            state = self._resume(resume_from, W.shape, data)
+            max_iter, callback, checkpoint = self._run_options(state, callback, data)
+            if state is None:
+                labels = initialize_labels(W.shape[0], self.n_clusters, init_ratio=self.init_ratio, seed=self.seed)
+            else:
+                labels = state['labels']
+            if self.n_jobs > 1:
+                from bmdcluster.optimizers.parallel import run_bd_BMD_parallel
+                self.cost, self.A, self.B = run_bd_BMD_parallel(labels, W, self.n_clusters, max_iter, verbose, weights=sample_weight,
+                                                                 n_jobs=self.n_jobs, chunk_size=chunk_rows(W, self.n_clusters, self.max_memory),
+                                                                 callback=callback, deadline=deadline, checkpoint=checkpoint)
+            else:
+                self.cost, self.A, self.B = run_bd_BMD_chunked(labels, W, self.n_clusters, max_iter, verbose, weights=sample_weight,
+                                                                chunk_size=chunk_rows(W, self.n_clusters, self.max_memory), callback=callback, deadline=deadline, checkpoint=checkpoint)
+            self.truncated = deadline.truncated
+            self._build_index()
+            return
+
+        W, weights, inverse = self._collapse(W, sample_weight)
+        data = self._data_fingerprint(W, weights, resume_from)
+        state = self._resume(resume_from, W.shape, data)
+        max_iter, callback, checkpoint = self._run_options(state, callback, data)
+
+        if state is None:
+            # Initialize cluster indicator matrices.
+            A = initialize_block_diagonal(W=W, 
+                                            n_clusters = self.n_clusters,
+                                            use_bootstrap = self.use_bootstrap,
+                                            b=self.b,
+                                            init_ratio=self.init_ratio,
+                                            init=self.init,
+                                            weights=weights,
+                                            seed=self.seed)
+        else:
+            A = labels_to_indicator(state['labels'], self.n_clusters)
+
+        if self.n_jobs > 1:
+            from bmdcluster.optimizers.parallel import run_bd_BMD_parallel
+            self.cost, A, self.B = run_bd_BMD_parallel(self._get_labels(A), W, self.n_clusters, max_iter, verbose, weights=weights,
+                                                        n_jobs=self.n_jobs, chunk_size=chunk_rows(W, self.n_clusters, self.max_memory),
+                                                        callback=callback, deadline=deadline, checkpoint=checkpoint)
+        else:
+            W_cols = column_major(W) if self.column_copy else None
+            empty = self._empty_clusters(state)
+            self.cost, A, self.B = run_bd_BMD(A, W, max_iter, verbose, weights=weights, W_cols=W_cols, accelerate=self.accelerate,
+                                                  callback=callback, deadline=deadline, checkpoint=checkpoint, empty_cluster=empty)
+            self.empty_cluster_stats, self.dropped_clusters = empty.stats(), np.array(sorted(empty.dropped), dtype=int)
+        self.A = A if inverse is None else A[inverse]
+        self.truncated = deadline.truncated
+        self._build_index()
+
+    def _build_index(self):
+        """ Build the nearest-cluster index over the centroids if :code:`index_tables` is set. """
+
+        if self.index_tables:
+            self.index = HammingLSH(select_columns(self.B, self._alive()).T, self.index_tables, self.index_bits, seed=self.seed)
+        else:
+            self.index = None
+
+
+    def freeze(self):
+        """Return a frozen copy of the fitted model for prediction only, holding the cluster centroids as
+        bits packed into 64-bit words. It predicts the same clusters without converting the data to float.
         
         Returns
         -------
-        np.array
-            predicted cluster labels
+        bmdcluster.serving.PackedBMD
+            frozen model
         """
-        
-        n = W.shape[0]
-        A_dummy = np.zeros((n, self.n_clusters))
+        return PackedBMD(self.B, exclude=self.dropped_clusters)
 
-        A_pred = _bd_updateA(A_dummy, self.B, W)
+    def _scores(self, W):
+        """ Squared distance between every point of W and every cluster centroid, inf for dropped clusters. """
 
-        return self._get_labels(A_pred)
+        D = _bd_distances(self.B, W)
+        D[:, np.asarray(self.dropped_clusters, dtype=int)] = np.inf
 
+        return D
 
-    def transform(self, W):
-        """Predict cluster assignment matrx of new data
-        
-        Parameters
-        ----------
-        W : np.array
-            binary data matrix
-        
-        Returns
-        -------
-        np.array
-            predicted cluster assignment matrix
-        """
-        
-        n = W.shape[0]
-        A_dummy = np.zeros((n, self.n_clusters))
+    def _cost(self, A, W):
+        """ Value of the objective function for the points of W assigned by A. """
+        return _bd_objective(A, self.B, np.asarray(W, dtype=float))
+
+    def _assign(self, W):
+        """ Assign the points of W to the closest data cluster, using the index if there is one. """
+
+        if self.index_tables and self.index is None:
+            # loaded models build the index on first use
+            self._build_index()
+
+        alive = self._alive()
+
+        if self.index is not None:
+            labels = self.index.query(W)
+            return labels_to_indicator(labels if alive is None else alive[labels], self._n_fitted)
 
-        A_pred = _bd_updateA(A_dummy, self.B, W)
+        A_dummy = np.zeros((W.shape[0], self._n_fitted))
 
-        return A_pred
+        return expand_columns(_bd_updateA(select_columns(A_dummy, alive), select_columns(self.B, alive), W), alive, self._n_fitted)
 
 
     def get_feature_labels(self):
@@ -159,7 +852,7 @@ class blockdiagonalBMD(_BMD):
         np.array
             data cluster labels
         """
-        return self._get_labels(self.A)
+        return self._get_labels(self._A)
 
 
     def fit_predict(self, W, verbose=False):
@@ -186,7 +879,7 @@ class blockdiagonalBMD(_BMD):
 
         self.fit(W, verbose)
 
-        return self.cost, self._get_labels(self.A), self._get_labels(self.B)
+        return self.cost, self._get_labels(self._A), self._get_labels(self.B)
 
 
     def fit_transform(self, W, verbose=False):
@@ -221,7 +914,9 @@ class blockdiagonalBMD(_BMD):
 
 class generalBMD(_BMD):
 
-    def __init__(self, n_clusters, f_clusters=None, B_ident=True, max_iter=100, use_bootstrap=False, b=None, init_ratio=1.0, seed=None):
+    _inference_arrays = ('_B', 'X')
+
+    def __init__(self, n_clusters, f_clusters=None, B_ident=True, max_iter=100, use_bootstrap=False, b=None, init_ratio=1.0, seed=None, init='random', collapse_duplicates=False, collapse_features=False, max_memory=None, column_copy=False, cache_size=None, fit_mode='full', sample_size=None, n_samples=4, validation_size=None, n_jobs=1, max_time=None, checkpoint_dir=None, checkpoint_every=None, checkpoint_seconds=None, fit_cache_dir=None, fit_cache_bytes=None, empty_cluster='keep'):
         """Run the general form of the BMD algorithm.
         
         Parameters
@@ -242,15 +937,92 @@ class generalBMD(_BMD):
             fraction of points to randomly initialize, by default 1.0
         seed : int, optional
             random initialization seed, by default None
+        init : str, optional
+            initialization of the data clusters when not bootstrapping, either 'random' or 'kmeans++', by default 'random'.
+            :code:`init_ratio` is ignored when using 'kmeans++'.
+        collapse_duplicates : bool, optional
+            fit on the unique rows of the data weighted by their multiplicities, by default False.
+            Initialization is done on the unique rows, so duplicate points always start in the same cluster.
+        collapse_features : bool, optional
+            fit on the unique non-constant columns of the data weighted by their multiplicities, by default False.
+            Constant features are labeled as outliers. With :code:`B_ident=True` the number of feature clusters
+            is the number of unique non-constant features.
+        max_memory : int, optional
+            fit out-of-core, streaming the data through memory in blocks of rows that use at most this many bytes, 
+            by default None. Data read with :code:`bmdcluster.loaders.read_packed` is always fit out-of-core, data given as an
+            :code:`np.memmap` is fit out-of-core unless another option needs it in memory. Only random initialization without
+            bootstrapping or collapsing is supported out-of-core and the data cluster matrix is stored as a
+            vector of labels.
+        column_copy : bool, optional
+            hold a column-major float copy of the data, made once at the start of the fit, for the feature cluster
+            updates, by default False. Trades 8 bytes of memory per entry for faster iterations, especially for
+            compact :code:`uint8` data. Ignored when fitting out-of-core.
+        cache_size : int, optional
+            number of distinct data rows whose predicted clusters are cached by :code:`.predict` and :code:`.transform`,
+            by default None which disables the cache. Repeated rows are then predicted with a dictionary lookup.
+            The least recently used rows are evicted first and the cache is cleared when the model is refit.
+            The cache assumes binary data.
+        fit_mode : str, optional
+            'full' to fit on all rows or 'sample' to fit copies of the model on :code:`n_samples` random samples of 
+            :code:`sample_size` rows in parallel, keep the feature clusters of the copy with the lowest cost on a 
+            validation sample and assign every row to its data clusters in one pass, by default 'full'. The 
+            validation costs are stored in :code:`.validation_costs` and the data clusters as a vector of labels.
+        sample_size : int, optional
+            number of rows of each sample with :code:`fit_mode='sample'`, by default None
+        n_samples : int, optional
+            number of samples fit with :code:`fit_mode='sample'`, by default 4
+        validation_size : int, optional
+            number of rows of the validation sample, by default :code:`sample_size`
+        n_jobs : int, optional
+            number of worker processes, by default 1. With :code:`fit_mode='sample'` the samples are fit in parallel,
+            otherwise the rows are split into :code:`n_jobs` partitions held in shared memory and each iteration is
+            run on the partitions in parallel, with the same result up to floating point round-off. The data is copied
+            into shared memory once, so data on disk must fit in memory. :code:`column_copy` is ignored.
+        max_time : float, optional
+            time budget of the fit in seconds, by default None. It is checked between the updates of each
+            iteration and once it runs out the fit stops with the best solution found so far and sets 
+            :code:`.truncated`. With :code:`fit_mode='sample'` the budget is shared by the fits of the samples,
+            the final assignment of the rows takes additional time.
+        checkpoint_dir : str, optional
+            directory a checkpoint of the fit is saved to periodically, by default None. A fit interrupted after a
+            checkpoint continues exactly where it stopped with :code:`.fit(W, resume_from=checkpoint_dir)`. Not
+            used with :code:`fit_mode='sample'`.
+        checkpoint_every : int, optional
+            number of iterations between checkpoints, by default every iteration unless :code:`checkpoint_seconds`
+            is set
+        checkpoint_seconds : float, optional
+            number of seconds between checkpoints, by default None
+        fit_cache_dir : str, optional
+            directory of an on-disk cache of fit results, by default None which disables it. A fit of data whose
+            bit-packed rows, sample weights and model parameters match a cached fit loads its clusters and cost
+            instead of running again, and is stored otherwise. The key includes the library version. Fits with
+            :code:`seed=None`, truncated by :code:`max_time` or stopped by a callback are not cached.
+        fit_cache_bytes : int, optional
+            maximum total size of the fit cache in bytes, the least recently used fits are removed first, by
+            default None for no limit
+        empty_cluster : str, optional
+            what to do with data clusters left empty by an iteration, one of 'keep', 'reseed' or 'drop', by 
+            default 'keep'. 'keep' leaves them in the fit with a centroid of 0's, 'reseed' moves the points with
+            the highest cost into them and 'drop' leaves them out of the rest of the fit and of predictions. The
+            number of such events is reported in :code:`.empty_cluster_stats` and the dropped clusters in
+            :code:`.dropped_clusters`. Only 'keep' is supported when fitting out-of-core or with :code:`n_jobs` > 1.
         
         Raises
         ------
         ValueError
             If :code:`use_bootstrap` is set to True but and :code:`b` is not specified
+        ValueError
+            If :code:`init` is not one of 'random' or 'kmeans++' or is 'kmeans++' and :code:`use_bootstrap` is set
+        ValueError
+            If :code:`fit_mode` is not one of 'full' or 'sample' or is 'sample' and :code:`sample_size` is not specified
+        ValueError
+            If :code:`empty_cluster` is not one of 'keep', 'reseed' or 'drop', or is not 'keep' and :code:`n_jobs` > 1
         ValueError
             If both :code:`B_ident` and :code:`f_clusters` are not specified
         ValueError
             If both :code:`B_ident=True` and :code:`f_clusters` is set
+        ValueError
+            If :code:`collapse_features` is set and the rows are fit in parallel with :code:`n_jobs`
 
         Caution
         -------
@@ -262,12 +1034,19 @@ class generalBMD(_BMD):
         if use_bootstrap and not b:
             raise ValueError("Must specify keyword argument 'b' when using bootstrapping.")
 
+        _check_init(init, use_bootstrap)
+        _check_fit_mode(fit_mode, sample_size)
+        _check_empty_cluster(empty_cluster, n_jobs, fit_mode)
+
         if not B_ident and not f_clusters:
             raise ValueError("You must one of either 'B_ident' or 'f_clusters'")
 
         if B_ident and f_clusters is not None:
             raise ValueError("Cannot set B_ident to True and set f_clusters")
 
+        if collapse_features and n_jobs > 1 and fit_mode == 'full':
+            raise ValueError("Collapsing features is not supported when fitting in parallel with 'n_jobs'")
+
         self.n_clusters = n_clusters
         self.B_ident = B_ident
         self.use_bootstrap = use_bootstrap
@@ -276,78 +1055,144 @@ class generalBMD(_BMD):
         self.f_clusters = f_clusters
         self.seed = seed
         self.max_iter = max_iter
+        self.init = init
+        self.collapse_duplicates = collapse_duplicates
+        self.max_memory = max_memory
+        self.column_copy = column_copy
+        self.collapse_features = collapse_features
+        self.cache_size = cache_size
+        self.cache = PredictionCache(cache_size) if cache_size else None
+        self.fit_mode = fit_mode
+        self.sample_size = sample_size
+        self.n_samples = n_samples
+        self.validation_size = validation_size
+        self.n_jobs = n_jobs
+        self.max_time = max_time
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        self.fit_cache_dir = fit_cache_dir
+        self.fit_cache_bytes = fit_cache_bytes
+        self.empty_cluster = empty_cluster
+        self.empty_cluster_stats = None
+        self.dropped_clusters = np.zeros(0, dtype=int)
 
 
         super(generalBMD, self).__init__()
 
-    def fit(self, W, verbose=False):
-        """Fit the model.
-        
-        Parameters
-        ----------
-        W : np.array
-            binary data matrix
-        verbose : bool, optional
-            print progress during optimization, by default False
-        
-        """
-        self.W = W
-
-        # Initialize cluster indicator matrices.
-        self.A, self.B = initialize_general(W=self.W, 
-                                             n_clusters = self.n_clusters,
-                                             use_bootstrap = self.use_bootstrap,
-                                             B_ident = self.B_ident,
-                                             b=self.b,
-                                             init_ratio=self.init_ratio,
-                                             seed=self.seed,
-                                             f_clusters=self.f_clusters)
-
-        self.cost, self.A, self.B, self.X = run_BMD(self.A, self.B, self.W, self.max_iter, verbose)
-
-
-    def predict(self, W):
-        """Predict cluster labels of new data. 
-        
-        Parameters
-        ----------
-        W : np.array
-            binary data matrix
-        
-        Returns
-        -------
-        np.array
-            predicted cluster labels
-        """
-
-        n = W.shape[0]
-        A_dummy = np.zeros((n, self.n_clusters))
+    def _fit(self, W, verbose=False, sample_weight=None, callback=None, resume_from=None):
+        """ Fit the model without looking up the fit cache, see :code:`.fit`. """
 
-        A_pred = _updateA(A_dummy, self.B, self.X, W)
-
-        return self._get_labels(A_pred)
-
-
-    def transform(self, W):
-        """Predict cluster assignment matrx of new data
-        
-        Parameters
-        ----------
-        W : np.array
-            binary data matrix
-        
-        Returns
-        -------
-        np.array
-            predicted cluster assignment matrix
-        """
-        
-        n = W.shape[0]
-        A_dummy = np.zeros((n, self.n_clusters))
-
-        A_pred = _updateA(A_dummy, self.B, self.X, W)
-
-        return A_pred
+        self.W = W
+        self.empty_cluster_stats, self.dropped_clusters = None, np.zeros(0, dtype=int)
+
+        if self.fit_mode == 'sample':
+            if resume_from is not None:
+                raise ValueError("Cannot resume a fit with fit_mode='sample'")
+            self._fit_sample(W, verbose, sample_weight)
+            return
+
+        deadline = Deadline(self.max_time)
+
+        if self._out_of_core(W):
+            data = self._data_fingerprint(W, sample_weight, resume_from)
+            state = self._resume(resume_from, W.shape, data)
+            max_iter, callback, checkpoint = self._run_options(state, callback, data)
+            if state is None:
+                labels = initialize_labels(W.shape[0], self.n_clusters, init_ratio=self.init_ratio, seed=self.seed)
+                B = initialize_B(W.shape[1], B_ident=self.B_ident, f_clusters=self.f_clusters, as_labels=self.B_ident, seed=self.seed)
+            else:
+                labels, B = state['labels'], state['B']
+            if self.n_jobs > 1:
+                from bmdcluster.optimizers.parallel import run_BMD_parallel
+                self.cost, self.A, self.B, self.X = run_BMD_parallel(labels, B, W, self.n_clusters, max_iter, verbose, weights=sample_weight,
+                                                                      n_jobs=self.n_jobs, chunk_size=chunk_rows(W, self.n_clusters, self.max_memory),
+                                                                      callback=callback, deadline=deadline, checkpoint=checkpoint)
+            else:
+                self.cost, self.A, self.B, self.X = run_BMD_chunked(labels, B, W, self.n_clusters, max_iter, verbose, weights=sample_weight,
+                                                                     chunk_size=chunk_rows(W, self.n_clusters, self.max_memory), callback=callback, deadline=deadline, checkpoint=checkpoint)
+            self.truncated = deadline.truncated
+            return
+
+        W, weights, inverse = self._collapse(W, sample_weight)
+
+        if self.collapse_features:
+            W, feature_weights, feature_inverse = collapse_columns(W)
+            if self.f_clusters is not None and self.f_clusters > W.shape[1]:
+                raise ValueError("'f_clusters' must be at most the number of unique non-constant features ({0}) when collapsing features".format(W.shape[1]))
+        else:
+            feature_weights = None
+
+        data = self._data_fingerprint(W, weights, resume_from)
+        state = self._resume(resume_from, W.shape, data)
+        max_iter, callback, checkpoint = self._run_options(state, callback, data)
+
+        if state is None:
+            # Initialize cluster indicator matrices.
+            A, B = initialize_general(W=W, 
+                                        n_clusters = self.n_clusters,
+                                        use_bootstrap = self.use_bootstrap,
+                                        B_ident = self.B_ident,
+                                        b=self.b,
+                                        init_ratio=self.init_ratio,
+                                        init=self.init,
+                                        weights=weights,
+                                        B_as_labels=self.B_ident,
+                                        seed=self.seed,
+                                        f_clusters=self.f_clusters)
+        else:
+            A, B = labels_to_indicator(state['labels'], self.n_clusters), state['B']
+
+        if self.n_jobs > 1:
+            from bmdcluster.optimizers.parallel import run_BMD_parallel
+            self.cost, A, B, self.X = run_BMD_parallel(self._get_labels(A), B, W, self.n_clusters, max_iter, verbose, weights=weights,
+                                                        n_jobs=self.n_jobs, chunk_size=chunk_rows(W, self.n_clusters, self.max_memory),
+                                                        callback=callback, deadline=deadline, checkpoint=checkpoint)
+        else:
+            W_cols = column_major(W) if self.column_copy else None
+            empty = self._empty_clusters(state)
+            self.cost, A, B, self.X = run_BMD(A, B, W, max_iter, verbose, weights=weights, feature_weights=feature_weights,
+                                               W_cols=W_cols, callback=callback, deadline=deadline, checkpoint=checkpoint,
+                                               empty_cluster=empty)
+            self.empty_cluster_stats, self.dropped_clusters = empty.stats(), np.array(sorted(empty.dropped), dtype=int)
+        self.A = A if inverse is None else A[inverse]
+        self.truncated = deadline.truncated
+
+        if self.collapse_features:
+            # Map the representative features back, dropped constant features become outliers.
+            kept = feature_inverse >= 0
+            if B.ndim == 1:
+                self.B = np.full(len(feature_inverse), -1)
+            else:
+                self.B = np.zeros((len(feature_inverse), B.shape[1]))
+            self._B[kept] = B[feature_inverse[kept]]
+            self.cost = _objective(self.A, self._B, self.X, self.W)
+        else:
+            self.B = B
+
+
+    def _scores(self, W):
+        """ Affiliation score of every point of W and every data cluster, see :code:`_affiliation_scores`, inf for 
+        dropped clusters. """
+
+        W = np.asarray(W, dtype=float)
+        M = _affiliation_scores(self._B, self.X, W) + np.dot(np.square(W), _feature_mask(self._B)).reshape((-1,1))
+        M[:, np.asarray(self.dropped_clusters, dtype=int)] = np.inf
+
+        return M
+
+    def _cost(self, A, W):
+        """ Value of the objective function for the points of W assigned by A. """
+        return _objective(A, self._B, self.X, np.asarray(W, dtype=float))
+
+    def _assign(self, W):
+        """ Assign the points of W to data clusters by affiliation score. """
+
+        alive = self._alive()
+        A_dummy = np.zeros((W.shape[0], self._n_fitted))
+        X = self.X if alive is None else self.X[alive]
+
+        return expand_columns(_updateA(select_columns(A_dummy, alive), self._B, X, W), alive, self._n_fitted)
 
 
     def get_feature_labels(self):
@@ -358,7 +1203,7 @@ class generalBMD(_BMD):
         np.array
             feature cluster labels
         """
-        return self._get_labels(self.B)
+        return self._get_labels(self._B)
 
     
     def get_data_labels(self):
@@ -369,7 +1214,7 @@ class generalBMD(_BMD):
         np.array
             data cluster labels
         """
-        return self._get_labels(self.A)
+        return self._get_labels(self._A)
 
 
     def fit_predict(self, W, verbose=False):
@@ -395,7 +1240,7 @@ class generalBMD(_BMD):
 
         self.fit(W, verbose)
 
-        return self.cost, self._get_labels(self.A), self._get_labels(self.B)
+        return self.cost, self._get_labels(self._A), self._get_labels(self._B)
 
 
     def fit_transform(self, W, verbose):
@@ -422,4 +1267,114 @@ class generalBMD(_BMD):
 
         self.fit(W, verbose)
 
-        return self.cost, self.A, self.B
\ No newline at end of file
+        return self.cost, self.A, self.B
+
+
+# maximum number of problems fit together by one task of fit_many()
+BATCH_SIZE = 128
+
+
+def _unfitted(model, deadline=None):
+    """ Returns an unfitted copy of model with the same parameters, with at most the time left until the deadline. """
+
+    params = model._get_params()
+    if 'max_time' in params and deadline is not None and deadline.end is not None:
+        remaining = deadline.remaining()
+        params['max_time'] = remaining if params['max_time'] is None else min(params['max_time'], remaining)
+
+    return type(model)(**params)
+
+
+def _is_batchable(model, W):
+    """ Determine if model can be fit to W by the batched block diagonal algorithm. """
+
+    return (type(model) is blockdiagonalBMD and model.max_memory is None and model._in_memory(W)
+            and not model.use_bootstrap and model.init == 'random' and not model.collapse_duplicates
+            and getattr(model, 'max_time', None) is None and getattr(model, 'fit_cache_dir', None) is None
+            and getattr(model, 'empty_cluster', 'keep') == 'keep')
+
+
+def _fit_group(model, Ws, batched, deadline=None):
+    """Fits a copy of model to each matrix of Ws. Same-shaped Ws are fit together by run_bd_BMD_batched()
+    if batched. The fits stop at the deadline. Returns the fitted models with their data cluster matrices,
+    which are not pickled."""
+
+    if not batched:
+        fitted = []
+        for W in Ws:
+            m = _unfitted(model, deadline)
+            m.fit(W)
+            fitted.append((m, m._A))
+        return fitted
+
+    # Initialize each problem as .fit() does so the results are the same.
+    A = np.stack([initialize_block_diagonal(W=W, n_clusters=model.n_clusters, init_ratio=model.init_ratio, seed=model.seed)
+                  for W in Ws])
+    costs, A, B = run_bd_BMD_batched(A, np.stack(Ws), model.max_iter, deadline=deadline)
+
+    fitted = []
+    for p in range(len(Ws)):
+        m = _unfitted(model)
+        m.cost, m.A, m.B = costs[p], A[p], B[p]
+        m.truncated = deadline is not None and deadline.truncated
+        m._build_index()
+        fitted.append((m, m._A))
+
+    return fitted
+
+
+def fit_many(Ws, model, n_jobs=1, batch_size=BATCH_SIZE, max_time=None):
+    """Fit a copy of a model to each of many small independent data matrices. Matrices of the same shape
+    are stacked and fit together by batched array operations when the model is a blockdiagonalBMD with
+    'random' initialization and no collapsing or out-of-core options, which removes the per-call overhead
+    for small matrices. Other models and matrices are fit one by one. The results are the same as calling
+    .fit() on each matrix.
+    
+    Parameters
+    ----------
+    Ws : list
+        binary data matrices
+    model : blockdiagonalBMD or generalBMD
+        unfitted model whose parameters are used for every fit
+    n_jobs : int, optional
+        number of worker processes the batches are distributed over, by default 1
+    batch_size : int, optional
+        maximum number of matrices fit together, by default BATCH_SIZE
+    max_time : float, optional
+        time budget in seconds shared by all the fits, by default None. Fits still running when it runs out
+        stop with the best solution found so far and fits started after it do no iterations, see the 
+        :code:`max_time` of the model. The fitted models have :code:`.truncated` set accordingly.
+    
+    Returns
+    -------
+    list
+        fitted models, in the order of Ws
+    """
+
+    # Group the matrices into tasks of at most batch_size matrices of the same shape.
+    groups = {}
+    for i, W in enumerate(Ws):
+        batched = _is_batchable(model, W)
+        groups.setdefault((batched, np.shape(W) if batched else None), []).append(i)
+
+    tasks = [(batched, idx[start:start+batch_size]) for (batched, _), idx in groups.items()
+             for start in range(0, len(idx), batch_size)]
+    deadline = None if max_time is None else Deadline(max_time)
+    args = [(model, [Ws[i] for i in idx], batched, deadline) for batched, idx in tasks]
+
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(_fit_group, *zip(*args)))
+    else:
+        results = [_fit_group(*a) for a in args]
+
+    models = [None]*len(Ws)
+    for (_, idx), fitted in zip(tasks, results):
+        for i, (m, A) in zip(idx, fitted):
+            m.W, m.A = Ws[i], A
+            models[i] = m
+
+    return models
+
+
+from bmdcluster.bisecting import bisectingBMD, Split
\ No newline at end of file
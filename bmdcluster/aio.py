@@ -0,0 +1,173 @@
+"""
+asyncio interface to fitting and prediction.
+
+:code:`AsyncBMD` runs the fit and the predictions of a model on an executor so that they do not block the event
+loop. Fitting checks for cancellation at the end of every iteration through the :code:`callback` of
+:code:`.fit`, so a cancelled fit stops within one iteration instead of running to convergence.
+
+Small prediction requests arriving together are coalesced: the rows of the requests made within
+:code:`batch_window` seconds of the first one are stacked and predicted in one vectorized call, and each
+request gets back the labels of its rows. A batch is sent as soon as it holds :code:`max_batch_size` rows.
+Requests with different numbers of columns are predicted separately, so a malformed request only fails itself.
+"""
+
+import asyncio
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class _Cancelled(Exception):
+    """ Raised inside a fit whose task was cancelled. """
+
+
+class AsyncBMD:
+    """Wraps a model for use from asyncio code.
+
+    Parameters
+    ----------
+    model : blockdiagonalBMD or generalBMD
+        model to fit or fitted model
+    executor : concurrent.futures.Executor, optional
+        thread pool the fits and predictions run on, by default a pool with a single thread, which also keeps
+        predictions from running while the model is being fit
+    batch_window : float, optional
+        number of seconds prediction requests are collected for before they are predicted together, by default 0.005
+    max_batch_size : int, optional
+        number of rows at which a batch of prediction requests is predicted without waiting, by default 4096
+    """
+
+    def __init__(self, model, executor=None, batch_window=0.005, max_batch_size=4096):
+
+        self.model = model
+        self.executor = ThreadPoolExecutor(max_workers=1) if executor is None else executor
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+
+        self.n_requests = 0
+        self.n_batches = 0
+
+        self._pending = []
+        self._pending_rows = 0
+        self._timer = None
+        self._batches = set()
+
+    async def fit(self, W, verbose=False, sample_weight=None, callback=None):
+        """Fit the model on the executor. If the calling task is cancelled, the fit stops at the end of its
+        current iteration and the cancellation is raised once it has stopped.
+
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix
+        verbose : bool, optional
+            print progress during optimization, by default False
+        sample_weight : np.array, optional
+            weight of each row of W, by default None
+        callback : callable, optional
+            function called with the number of iterations and the cost after every iteration, see :code:`.fit`,
+            by default None
+
+        Returns
+        -------
+        blockdiagonalBMD or generalBMD
+            the fitted model
+        """
+
+        cancelled = threading.Event()
+
+        def check(n_iter, cost):
+            stop = callback is not None and callback(n_iter, cost)
+            if cancelled.is_set():
+                raise _Cancelled()
+            return stop
+
+        future = self.executor.submit(self.model.fit, W, verbose, sample_weight, check)
+        try:
+            await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            cancelled.set()
+            # the model must not be used while the fit is still running
+            with contextlib.suppress(BaseException):
+                await asyncio.wrap_future(future)
+            raise
+
+        return self.model
+
+    async def predict(self, W):
+        """Predict the data cluster labels of the rows of W, together with the other requests made within
+        :code:`batch_window` seconds.
+
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix
+
+        Returns
+        -------
+        np.array
+            data cluster label of each row of W
+        """
+
+        W = np.atleast_2d(W)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self.n_requests += 1
+        self._pending.append((W, future))
+        self._pending_rows += W.shape[0]
+
+        if self._pending_rows >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """ Start the prediction of the pending requests. """
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending = [(W, future) for W, future in self._pending if not future.cancelled()]
+        self._pending, self._pending_rows = [], 0
+
+        if pending:
+            # keep a reference to the task until it is done
+            task = asyncio.get_running_loop().create_task(self._predict_batch(pending))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _predict_batch(self, pending):
+        """ Predict the stacked rows of a batch of requests and return each request its labels. """
+
+        self.n_batches += 1
+
+        groups = {}
+        for W, future in pending:
+            groups.setdefault(W.shape[1], []).append((W, future))
+
+        for group in groups.values():
+            await self._predict_group(group)
+
+    async def _predict_group(self, pending):
+        """ Predict the stacked rows of requests with the same number of columns. """
+
+        loop = asyncio.get_running_loop()
+
+        try:
+            labels = await loop.run_in_executor(self.executor, self.model.predict, np.vstack([W for W, _ in pending]))
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        splits = np.cumsum([W.shape[0] for W, _ in pending])[:-1]
+        for (_, future), l in zip(pending, np.split(labels, splits)):
+            if not future.done():
+                future.set_result(l)
@@ -0,0 +1,267 @@
+"""
+Top-down clustering with the block-diagonal model.
+
+:code:`bisectingBMD` grows a binary tree of clusters by repeatedly splitting the cluster whose split most
+lowers the cost in two with a 2-cluster BMD run on its rows only. The runs of the splits of different
+clusters are independent and run in parallel on worker processes.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from bmdcluster import blockdiagonalBMD
+from bmdcluster.optimizers.blockdiagonalBMD import run_bd_BMD, _bd_updateB, _bd_objective
+from bmdcluster.utils import labels_to_indicator, sq_distances, Deadline, expired
+
+
+Split = namedtuple('Split', ['parent', 'left', 'right', 'gain'])
+
+
+def _bisect(W, max_iter=100, n_init=1, seed=None, deadline=None):
+    """Splits the rows of W in two with 2-cluster block diagonal BMD runs and returns the cluster of each row. Each 
+    run starts from the centroid of all rows and a seed row, drawn with probability proportional to its squared 
+    distance to the centroid, with each row in the cluster of the closer of the two. The seed rows are drawn from
+    a generator of its own seeded with seed. The split with the lowest cost of :code:`n_init` runs is kept. Rows 
+    that are all equal are not split. The runs stop at the deadline."""
+
+    W = np.asarray(W, dtype=float)
+    d = sq_distances(W, (W.mean(axis=0) >= 0.5).reshape((1, -1)))[:, 0]
+
+    if d.sum() == 0:
+        return np.zeros(len(W), dtype=int)
+
+    rng = np.random.RandomState(seed)
+    seeds = rng.choice(len(W), size=min(n_init, np.count_nonzero(d)), replace=False, p=d / d.sum())
+
+    best, best_cost = None, np.inf
+    for s in seeds:
+        A = labels_to_indicator((sq_distances(W, W[[s]])[:, 0] < d).astype(int), 2)
+        _, A, _ = run_bd_BMD(A, W, max_iter, deadline=deadline)
+        labels = A.argmax(axis=1)
+
+        cost = _cluster_cost(W[labels == 0]) + _cluster_cost(W[labels == 1])
+        if cost < best_cost:
+            best, best_cost = labels, cost
+
+    return best
+
+
+def _cluster_cost(W):
+    """ Squared cost of the rows of W around their binary centroid, the features present in at least half of them. """
+
+    W = np.asarray(W, dtype=float)
+    return np.square(W - (W.mean(axis=0) >= 0.5)).sum()
+
+
+class bisectingBMD(blockdiagonalBMD):
+
+    # arrays needed for inference, written by .save(), with the leaves of the tree
+    _inference_arrays = ('_B', 'leaves')
+
+    def __init__(self, n_clusters, max_iter=100, max_cost=None, refine=True, n_init=3, seed=None, n_jobs=1, index_tables=None, index_bits=16, max_time=None, fit_cache_dir=None, fit_cache_bytes=None):
+        """Run the block-diagonal form of the BMD algorithm top-down. Starting from a single cluster, the cluster
+        whose split most lowers the cost is repeatedly split in two with a 2-cluster BMD run on its rows only, until 
+        there are :code:`n_clusters` clusters. Each run is cheap and its result does not depend on the initialization
+        of the other clusters, which makes this suited to large numbers of clusters. The splits form a binary tree
+        of clusters stored in :code:`.hierarchy` as named tuples (parent, left, right, gain) of tree nodes, where
+        node 0 is the root, split i creates nodes 2i+1 and 2i+2 and gain is the decrease of the squared cost. The
+        data clusters are the leaves, :code:`.leaves`, and :code:`.cut` gives the clusters at any level of the tree.
+        
+        Parameters
+        ----------
+        n_clusters : int
+            number of data clusters
+        max_iter : int, optional
+            maximum number of optimization iterations of each split, by default 100
+        max_cost : float, optional
+            clusters whose squared cost around their centroid is at most this are not split, by default None. The
+            model has fewer than :code:`n_clusters` clusters if no cluster can be split, see :code:`.leaves`.
+        refine : bool, optional
+            refine the clusters by running the algorithm on all rows starting from the leaves of the tree, by default
+            True. A split can only move the rows of its cluster, refining reassigns rows split early into the wrong
+            branch. The leaves keep their place in the tree, which then records the lineage of the clusters.
+        n_init : int, optional
+            number of 2-cluster runs of each split starting from different seed rows, the best is kept, by default 3
+        seed : int, optional
+            randomization seed of the splits, by default None. Each split draws from its own generator seeded with
+            the seed and the node it splits.
+        n_jobs : int, optional
+            number of worker processes running the splits of different clusters, by default 1
+        index_tables : int, optional
+            number of hash tables of an approximate nearest-cluster index, see :code:`blockdiagonalBMD`, by default None
+        index_bits : int, optional
+            number of features sampled by each hash table of the index, by default 16
+        max_time : float, optional
+            time budget of the fit in seconds, by default None. Once it runs out no more clusters are split, the 
+            refinement stops with the best solution found so far and :code:`.truncated` is set.
+        fit_cache_dir : str, optional
+            directory of an on-disk cache of fit results including the tree of clusters, see :code:`blockdiagonalBMD`,
+            by default None which disables it
+        fit_cache_bytes : int, optional
+            maximum total size of the fit cache in bytes, by default None for no limit
+        """
+
+        super(bisectingBMD, self).__init__(n_clusters, max_iter=max_iter, seed=seed, index_tables=index_tables, index_bits=index_bits,
+                                           max_time=max_time, fit_cache_dir=fit_cache_dir, fit_cache_bytes=fit_cache_bytes)
+
+        self.max_cost = max_cost
+        self.refine = refine
+        self.n_init = n_init
+        self.n_jobs = n_jobs
+        self.hierarchy = []
+        self.leaves = None
+
+    @property
+    def _n_fitted(self):
+        """ Number of data clusters of the fitted model, fewer than n_clusters if no more clusters could be split. """
+        return len(self.leaves)
+
+    def _fit(self, W, verbose=False, sample_weight=None, callback=None, resume_from=None):
+        """Fit the model without looking up the fit cache, see :code:`.fit`. The callback is called by the 
+        refinement only."""
+
+        if sample_weight is not None:
+            raise ValueError("bisectingBMD does not support 'sample_weight'")
+        if resume_from is not None:
+            raise ValueError("bisectingBMD does not support 'resume_from'")
+
+        self.W = W
+        self.empty_cluster_stats, self.dropped_clusters = None, np.zeros(0, dtype=int)
+        W = np.asarray(W)
+        deadline = Deadline(self.max_time)
+
+        if self.n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                nodes = self._grow(W, executor.map, verbose, deadline)
+        else:
+            nodes = self._grow(W, map, verbose, deadline)
+
+        # Data clusters are the leaves of the tree in order of creation.
+        self.leaves = np.unique(nodes)
+        A = labels_to_indicator(np.searchsorted(self.leaves, nodes), len(self.leaves))
+
+        if self.refine:
+            self.cost, self.A, self.B = run_bd_BMD(A, W, self.max_iter, verbose, callback=callback, deadline=deadline)
+        else:
+            self.B = _bd_updateB(A, W)
+            self.A = A
+            self.cost = _bd_objective(A, self.B, W)
+
+        self.truncated = deadline.truncated
+        self._build_index()
+
+    def _fit_arrays(self):
+        """ Arrays of the fitted model stored in the fit cache, with the tree of clusters. """
+
+        arrays = super(bisectingBMD, self)._fit_arrays()
+        arrays.update(hierarchy=np.array(self.hierarchy, dtype=float).reshape((-1, 4)), leaves=self.leaves)
+        return arrays
+
+    def _restore_fit(self, arrays):
+        """ Set the fitted model and its tree of clusters from arrays stored in the fit cache. """
+
+        self.hierarchy = [Split(int(parent), int(left), int(right), float(gain)) for parent, left, right, gain in arrays['hierarchy']]
+        self.leaves = arrays['leaves'].astype(int)
+        super(bisectingBMD, self)._restore_fit(arrays)
+
+    def _save_attributes(self):
+        """ Attributes written by .save(), with the splits of the tree of clusters. """
+
+        attributes = super(bisectingBMD, self)._save_attributes()
+        attributes['hierarchy'] = [[int(parent), int(left), int(right), float(gain)] for parent, left, right, gain in self.hierarchy]
+        return attributes
+
+    def _load_attributes(self, attributes):
+        """ Set the attributes written by .save() on a loaded model, with the splits as named tuples. """
+
+        super(bisectingBMD, self)._load_attributes(attributes)
+        self.hierarchy = [Split(*split) for split in self.hierarchy]
+
+    def _grow(self, W, map_splits, verbose, deadline=None):
+        """Grows the tree of clusters, running the splits of new leaves with map_splits. Node 0 is the root and 
+        split i creates nodes 2i+1 and 2i+2. No more splits are started once the deadline expires. Returns the
+        leaf node of each row of W."""
+
+        nodes = np.zeros(W.shape[0], dtype=int)
+        # cost of each leaf and best split of the leaves split so far, None if a leaf cannot be split
+        costs = {0: _cluster_cost(W)}
+        splits = {}
+        self.hierarchy = []
+
+        while len(self.hierarchy) < self.n_clusters - 1 and not expired(deadline):
+
+            pending = [node for node in costs if node not in splits]
+            members = [np.where(nodes == node)[0] for node in pending]
+
+            # a 2-cluster run needs at least 3 rows
+            runs = [(node, rows) for node, rows in zip(pending, members) 
+                    if len(rows) > 2 and (self.max_cost is None or costs[node] > self.max_cost)]
+            splits.update({node: None for node in pending})
+
+            seeds = [None if self.seed is None else [self.seed, node] for node, _ in runs]
+            labels = map_splits(_bisect, [W[rows] for _, rows in runs], repeat(self.max_iter), repeat(self.n_init), seeds, repeat(deadline))
+            for (node, rows), l in zip(runs, labels):
+                left, right = rows[l == 0], rows[l == 1]
+                if len(left) > 0 and len(right) > 0:
+                    cost_left, cost_right = _cluster_cost(W[left]), _cluster_cost(W[right])
+                    splits[node] = (costs[node] - cost_left - cost_right, left, right, cost_left, cost_right)
+
+            candidates = [node for node in costs if splits[node] is not None and splits[node][0] > 0]
+            if not candidates:
+                break
+
+            parent = max(candidates, key=lambda node: splits[node][0])
+            gain, left, right, cost_left, cost_right = splits.pop(parent)
+            del costs[parent]
+
+            split = Split(parent, 2*len(self.hierarchy) + 1, 2*len(self.hierarchy) + 2, float(gain))
+            nodes[left], nodes[right] = split.left, split.right
+            costs[split.left], costs[split.right] = cost_left, cost_right
+            self.hierarchy.append(split)
+
+            if verbose:
+                print("Split {0} into {1} and {2}, cost reduced by {3}".format(*split))
+
+        return nodes
+
+    def cut(self, n_clusters, labels=None):
+        """Return the data cluster labels of the training data with the tree cut at :code:`n_clusters` clusters,
+        the clusters before all later splits.
+        
+        Parameters
+        ----------
+        n_clusters : int
+            number of data clusters, at most the number of clusters of the model
+        labels : np.array, optional
+            data cluster labels to cut, such as returned by :code:`.predict`, by default the labels of the training
+            data, which are not stored by :code:`.save`
+        
+        Returns
+        -------
+        np.array
+            data cluster labels
+        
+        Raises
+        ------
+        ValueError
+            If :code:`n_clusters` is larger than the number of clusters of the model
+        """
+
+        if not 0 < n_clusters <= len(self.leaves):
+            raise ValueError("'n_clusters' must be between 1 and {0}".format(len(self.leaves)))
+
+        parent = np.zeros(2*len(self.hierarchy) + 1, dtype=int)
+        for split in self.hierarchy:
+            parent[[split.left, split.right]] = split.parent
+
+        # Replace each leaf by its ancestor present after the first n_clusters - 1 splits.
+        nodes = self.leaves.copy()
+        later = (nodes - 1) // 2 >= n_clusters - 1
+        while later.any():
+            nodes[later] = parent[nodes[later]]
+            later = (nodes - 1) // 2 >= n_clusters - 1
+
+        return np.searchsorted(np.unique(nodes), nodes)[self.get_data_labels() if labels is None else labels]
@@ -0,0 +1,319 @@
+"""
+A bounded least-recently-used cache of predicted cluster labels, keyed by the bytes of the bit-packed data
+rows. Repeated rows are then predicted with a dictionary lookup instead of computing their distances to
+every cluster. Data that is not binary is keyed by the raw bytes and dtype of its rows instead.
+
+It also holds an on-disk cache of fit results. A fit is keyed by a hash of the model parameters and library
+version and a fingerprint of the data, a BLAKE2 hash of its rows streamed in blocks, so refitting
+the same data with the same parameters loads the stored clusters instead of running the optimizer. Each
+result is one .npz file holding a hash of its arrays, checked when it is loaded, and the least recently used
+results are removed once the files exceed a size budget.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from bmdcluster.optimizers.chunked import iter_chunks
+from bmdcluster.persistence import _to_builtin
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def _is_binary(W):
+    """ Determine if all entries of W are 0 or 1. """
+    return W.dtype == bool or bool(np.all((W == 0) | (W == 1)))
+
+
+def _row_keys(W):
+    """Returns the bytes of each row of W bit-packed if W is binary, otherwise its dtype followed by the raw 
+    bytes of the row, which are longer than the packed bytes of a row of the same length."""
+
+    W = np.asarray(W)
+    if _is_binary(W):
+        return [row.tobytes() for row in np.packbits(W != 0, axis=1)]
+
+    dtype = W.dtype.str.encode()
+    return [dtype + row.tobytes() for row in np.ascontiguousarray(W)]
+
+
+class PredictionCache:
+    """LRU cache mapping binary data rows to predicted cluster labels.
+
+    Parameters
+    ----------
+    maxsize : int
+        maximum number of rows held, the least recently used rows are evicted first
+    """
+
+    def __init__(self, maxsize):
+
+        self.maxsize = maxsize
+        self.clear()
+
+    def clear(self):
+        """ Remove all rows and reset the hit and miss counters. """
+
+        self.labels = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """ Return the hit and miss counters and the size of the cache. """
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.labels))
+
+    def predict(self, W, assign):
+        """Predict the cluster labels of the rows of W, calling assign() on the rows that are not cached.
+
+        Parameters
+        ----------
+        W : np.array
+            data matrix, rows are looked up by their packed bits if it is binary and by their raw bytes otherwise
+        assign : callable
+            function returning the cluster labels of a data matrix
+
+        Returns
+        -------
+        np.array
+            cluster labels
+        """
+
+        keys = _row_keys(W)
+        labels = np.empty(len(keys), dtype=int)
+
+        # first row of each distinct key that is not cached, and the rows sharing it
+        missing = OrderedDict()
+        for i, key in enumerate(keys):
+            if key in self.labels:
+                self.labels.move_to_end(key)
+                labels[i] = self.labels[key]
+                self.hits += 1
+            elif key in missing:
+                # repeated within W, computed once
+                missing[key].append(i)
+                self.hits += 1
+            else:
+                missing[key] = [i]
+                self.misses += 1
+
+        if missing:
+            rows = [i[0] for i in missing.values()]
+            for key, label, i in zip(missing, assign(W[rows]), missing.values()):
+                labels[i] = label
+                self.labels[key] = label
+            while len(self.labels) > self.maxsize:
+                self.labels.popitem(last=False)
+
+        return labels
+
+
+def fingerprint(W, weights=None):
+    """Hash of the rows of a data matrix and the row weights, read in blocks of rows. Blocks of binary rows
+    are hashed bit-packed, so the same binary data has the same fingerprint whatever its dtype, and other blocks
+    by their dtype and raw bytes.
+
+    Parameters
+    ----------
+    W : np.array
+        data matrix, or data on disk such as returned by :code:`bmdcluster.loaders.read_packed`
+    weights : np.array, optional
+        weight of each row of W, by default None
+
+    Returns
+    -------
+    str
+        hexadecimal digest
+    """
+
+    h = hashlib.blake2b(digest_size=20)
+    h.update(np.array(W.shape, dtype=np.int64).tobytes())
+
+    prefetch = not (isinstance(W, np.ndarray) and not isinstance(W, np.memmap))
+    for _, W_chunk in iter_chunks(W, prefetch=prefetch):
+        if _is_binary(W_chunk):
+            h.update(b'\x00' + np.packbits(W_chunk != 0, axis=1).tobytes())
+        else:
+            h.update(b'\x01' + W_chunk.dtype.str.encode() + np.ascontiguousarray(W_chunk).tobytes())
+
+    if weights is not None:
+        h.update(np.ascontiguousarray(weights, dtype=float).tobytes())
+
+    return h.hexdigest()
+
+
+def _digest(key, arrays):
+    """ Hash of a key and named arrays, stored with them to verify them when they are loaded. """
+
+    h = hashlib.blake2b(key.encode(), digest_size=20)
+    for name in sorted(arrays):
+        arr = np.ascontiguousarray(arrays[name])
+        h.update('{0}:{1}:{2}'.format(name, arr.dtype.str, arr.shape).encode())
+        h.update(arr.tobytes())
+
+    return h.hexdigest()
+
+
+class FitCache:
+    """On-disk cache of the arrays of fitted models, keyed by the model parameters and the data.
+
+    Parameters
+    ----------
+    path : str
+        directory holding the cached fits, created when the first fit is stored
+    max_bytes : int, optional
+        maximum total size of the cached fits in bytes, the least recently used fits are removed first, by
+        default None for no limit
+    """
+
+    def __init__(self, path, max_bytes=None):
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, W, params, weights=None):
+        """Key of a fit of the data W.
+
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix, or data on disk such as returned by :code:`bmdcluster.loaders.read_packed`
+        params : dict
+            JSON serializable parameters the fit depends on, such as the model class, its parameters and the
+            library version
+        weights : np.array, optional
+            weight of each row of W, by default None
+
+        Returns
+        -------
+        str
+            hexadecimal key
+        """
+
+        h = hashlib.blake2b(digest_size=20)
+        h.update(json.dumps(params, sort_keys=True, default=_to_builtin).encode())
+        h.update(fingerprint(W, weights).encode())
+
+        return h.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def _entries(self):
+        """ Path, size and last use of each cached fit. """
+
+        if not os.path.isdir(self.path):
+            return []
+
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith('.npz'):
+                path = os.path.join(self.path, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # removed by another process
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime_ns))
+
+        return entries
+
+    def get(self, key):
+        """Load the arrays of a cached fit. A fit that cannot be read or fails verification is removed.
+
+        Parameters
+        ----------
+        key : str
+            key of the fit, see :code:`key`
+
+        Returns
+        -------
+        dict
+            named arrays, None if the fit is not cached
+        """
+
+        path = self._file(key)
+
+        try:
+            with np.load(path) as f:
+                arrays = {name: f[name] for name in f.files}
+            digest = str(arrays.pop('__digest__'))
+            if digest != _digest(key, arrays):
+                raise ValueError("Cached fit {0} is corrupted".format(key))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            self.misses += 1
+            return None
+
+        # the modification time orders the fits by last use
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path)
+        self.hits += 1
+
+        return arrays
+
+    def put(self, key, arrays):
+        """Store the arrays of a fit, then remove the least recently used fits over :code:`max_bytes`.
+
+        Parameters
+        ----------
+        key : str
+            key of the fit, see :code:`key`
+        arrays : dict
+            named arrays
+        """
+
+        os.makedirs(self.path, exist_ok=True)
+
+        arrays = {name: np.asarray(arr) for name, arr in arrays.items()}
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, __digest__=_digest(key, arrays), **arrays)
+            os.replace(tmp, self._file(key))
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp)
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        """ Remove the least recently used fits until the total size is within :code:`max_bytes`. """
+
+        if self.max_bytes is None:
+            return
+
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+
+    def clear(self):
+        """ Remove all cached fits and reset the hit and miss counters. """
+
+        for path, _, _ in self._entries():
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """ Return the hit and miss counters, the size budget and the total size of the cached fits in bytes. """
+        return CacheInfo(self.hits, self.misses, self.max_bytes, sum(size for _, size, _ in self._entries()))
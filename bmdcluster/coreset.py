@@ -0,0 +1,224 @@
+"""
+Coresets: small weighted sets of rows whose BMD cost approximates that of the full data for any clustering, so
+that a model fit to the coreset with :code:`.fit(W_c, sample_weight=w_c)` is close to one fit to all the data.
+
+Rows are drawn by sensitivity sampling around a cheap initial solution, K binary centroids found by k-means++
+seeding on the first block of rows. The sensitivity of a row bounds its share of the cost of any clustering and
+is approximated by
+
+    s_i = d_i / D + 1 / n_k(i),
+
+where d_i is the squared distance of the row to its nearest centroid, D the sum of these distances and n_k(i) the
+number of rows nearest to the same centroid. Rows far from every centroid and rows of small clusters are kept with
+higher probability and given lower weights. Half of the coreset is sampled in proportion to d_i and half uniformly
+within each cluster, each with a weighted reservoir, so neither D nor the cluster sizes need to be known in
+advance and the coreset is built in one pass over the data. Each kept row is weighted by the inverse of its
+approximate probability of being kept.
+
+The union of coresets of disjoint shards is a coreset of their union, so shards can be reduced independently and
+merged with :code:`merge_coresets`, which can reduce the union to a bounded size again.
+"""
+
+import numpy as np
+
+from bmdcluster.initializers.cluster_initializers import initialize_A_kmeanspp
+from bmdcluster.optimizers.blockdiagonalBMD import _bd_updateB, _bd_distances
+from bmdcluster.optimizers.chunked import iter_chunks, chunk_rows
+
+
+class CoresetBuilder:
+    """Builds a coreset from blocks of rows passed to :code:`.add`. The initial solution needs more rows than
+    clusters, so rows are held until enough of them have been added.
+
+    Parameters
+    ----------
+    n_clusters : int
+        number of clusters of the initial solution
+    size : int
+        approximate number of rows of the coreset
+    seed : int, optional
+        randomization seed, by default None. The builder draws from its own random state so that other
+        calls between blocks do not change the coreset.
+
+    Raises
+    ------
+    ValueError
+        If :code:`n_clusters` is less than 2
+    """
+
+    def __init__(self, n_clusters, size, seed=None):
+
+        if n_clusters < 2:
+            raise ValueError("'n_clusters' must be at least 2")
+
+        self.n_clusters = n_clusters
+        self.size = size
+        self.seed = seed
+        self.random_state = np.random.RandomState(seed)
+        # rows drawn in proportion to their distance, and per cluster
+        self.distance_size = size // 2
+        self.cluster_size = -(-(size - self.distance_size) // n_clusters)
+
+        self.B = None
+        self.total_distance = 0.0
+        self.cluster_weights = np.zeros(n_clusters)
+        self.rows = None
+        self.keys = None
+        # rows added before the initial solution is found, and their weights
+        self.pending = None
+
+    def add(self, W, weights=None):
+        """Add a block of rows. The initial solution is found on the first rows, once more than 
+        :code:`n_clusters` rows have been added.
+
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix
+        weights : np.array, optional
+            multiplicity of each row of W, e.g. the weights of a coreset being reduced, by default None
+        """
+
+        W = np.asarray(W)
+        w = np.ones(W.shape[0]) if weights is None else np.asarray(weights, dtype=float)
+
+        if self.B is None:
+            if self.pending is not None:
+                W, w = np.vstack([self.pending[0], W]), np.concatenate([self.pending[1], w])
+            if W.shape[0] <= self.n_clusters:
+                self.pending = (W, w)
+                return
+            self.pending = None
+            A = initialize_A_kmeanspp(W, self.n_clusters, weights=w, seed=self.seed)
+            self.B = _bd_updateB(A, W, w)
+
+        D = _bd_distances(self.B, W)
+        labels = D.argmin(axis=1)
+        d = D[np.arange(len(labels)), labels]
+
+        self.total_distance += np.dot(w, d)
+        self.cluster_weights += np.bincount(labels, weights=w, minlength=self.n_clusters)
+
+        # Weighted reservoir keys log(u)/weight, the largest keys are kept. Rows at distance 0 have no distance key.
+        u = self.random_state.random_sample((2, len(w)))
+        with np.errstate(divide='ignore'):
+            keys = np.log(u) / np.vstack([w*d, w])
+
+        rows = {'W': W, 'weights': w, 'distances': d, 'labels': labels}
+        if self.rows is not None:
+            rows = {name: np.concatenate([self.rows[name], value]) for name, value in rows.items()}
+            keys = np.hstack([self.keys, keys])
+
+        kept = self._kept(keys, rows['labels'])
+        self.rows = {name: value[kept] for name, value in rows.items()}
+        self.keys = keys[:, kept]
+
+    def _kept(self, keys, labels):
+        """ Mask of the rows with one of the largest distance keys or cluster keys of their cluster. """
+
+        kept = np.zeros(len(labels), dtype=bool)
+        top = np.argsort(-keys[0], kind='stable')[:self.distance_size]
+        kept[top[keys[0, top] > -np.inf]] = True
+
+        # rank of each row by cluster key within its cluster
+        order = np.lexsort((-keys[1], labels))
+        starts = np.searchsorted(labels[order], np.arange(self.n_clusters))
+        rank = np.arange(len(order)) - starts[labels[order]]
+        kept[order[(rank < self.cluster_size) & (keys[1, order] > -np.inf)]] = True
+
+        return kept
+
+    def coreset(self):
+        """Return the coreset of the rows added so far. Until more than :code:`n_clusters` rows have been
+        added, these are all the rows with their weights.
+
+        Returns
+        -------
+        np.array
+            rows of the coreset
+        np.array
+            weight of each row
+
+        Raises
+        ------
+        ValueError
+            If no rows have been added
+        """
+
+        if self.rows is None:
+            if self.pending is None:
+                raise ValueError("No rows have been added to the coreset")
+            return self.pending
+
+        r = self.rows
+        distance = self.distance_size*r['weights']*r['distances'] / self.total_distance if self.total_distance > 0 else 0
+        cluster = self.cluster_size*r['weights'] / self.cluster_weights[r['labels']]
+        p = np.minimum(1, distance + cluster)
+
+        return r['W'], r['weights'] / p
+
+
+def build_coreset(W, n_clusters, size, max_memory=None, seed=None):
+    """Build a coreset of W in one pass over blocks of rows.
+
+    Parameters
+    ----------
+    W : np.array
+        binary data matrix, or data on disk such as returned by :code:`bmdcluster.loaders.read_packed`
+    n_clusters : int
+        number of clusters of the initial solution, usually the number of clusters to fit
+    size : int
+        approximate number of rows of the coreset
+    max_memory : int, optional
+        maximum number of bytes used by a block of rows, see :code:`chunk_rows`, by default None
+    seed : int, optional
+        randomization seed, by default None
+
+    Returns
+    -------
+    np.array
+        rows of the coreset
+    np.array
+        weight of each row
+    """
+
+    builder = CoresetBuilder(n_clusters, size, seed=seed)
+    for _, W_chunk in iter_chunks(W, chunk_rows(W, n_clusters, max_memory)):
+        builder.add(W_chunk)
+
+    return builder.coreset()
+
+
+def merge_coresets(coresets, n_clusters=None, size=None, seed=None):
+    """Merge coresets of disjoint shards of the data into a coreset of all the data. The union of the coresets is
+    reduced to a coreset of about :code:`size` rows if :code:`size` is given.
+
+    Parameters
+    ----------
+    coresets : list
+        (rows, weights) tuples returned by :code:`build_coreset` or :code:`CoresetBuilder.coreset`
+    n_clusters : int, optional
+        number of clusters of the initial solution of the reduction, needed with :code:`size`, by default None
+    size : int, optional
+        approximate number of rows of the merged coreset, by default None which keeps every row
+    seed : int, optional
+        randomization seed of the reduction, by default None
+
+    Returns
+    -------
+    np.array
+        rows of the coreset
+    np.array
+        weight of each row
+    """
+
+    W = np.vstack([W_c for W_c, _ in coresets])
+    weights = np.concatenate([w_c for _, w_c in coresets])
+
+    if size is None:
+        return W, weights
+
+    builder = CoresetBuilder(n_clusters, size, seed=seed)
+    builder.add(W, weights)
+
+    return builder.coreset()
@@ -0,0 +1,369 @@
+"""
+Distributed fitting of BMD models to data sharded by rows across machines.
+
+Each shard of W is held by a worker, which keeps the data cluster labels of its rows. The coordinator runs each
+iteration of the block diagonal or general algorithm as a round: it broadcasts B (and X), every worker assigns
+the points of its shard and replies with the sufficient statistics of its shard
+
+ S: the K x m count matrix A'W
+ p: the number of points in each data cluster
+
+and the sum of squares of its entries, and the coordinator adds them up to update B, X and the objective
+function, see bmdcluster.optimizers.parallel. A round moves O(Km) numbers per worker regardless of the number
+of rows, and the labels of all rows are only collected once at the end of the fit.
+
+Coordinator and workers exchange messages through a Transport, which can be implemented for any messaging
+system. :code:`ConnectionTransport` sends pickled messages over a :code:`multiprocessing.connection`
+connection, a pipe or a socket. Workers on other machines connect to a coordinator listening with
+:code:`accept_workers` by calling :code:`serve`. Unpickling a message can run arbitrary code, so both ends
+must authenticate the connection with a shared key, and :code:`LocalCluster` runs workers in local processes
+connected over localhost sockets as a stand-in for a cluster of machines. The bytes sent and received and the
+latency of every round are recorded in :code:`Coordinator.rounds`.
+"""
+
+import os
+import pickle
+import time
+from collections import namedtuple
+from multiprocessing import Process
+from multiprocessing.connection import Listener, Client
+
+import numpy as np
+
+from bmdcluster import generalBMD
+from bmdcluster.initializers.cluster_initializers import initialize_labels, initialize_B
+from bmdcluster.optimizers.chunked import _pass, DEFAULT_CHUNK_ROWS
+from bmdcluster.optimizers.parallel import _state_assign, _add_stats, _run_bd, _run_general
+from bmdcluster.utils import Deadline
+
+
+RoundStats = namedtuple('RoundStats', ['name', 'bytes_sent', 'bytes_received', 'latency'])
+
+
+class Transport:
+    """Interface of a two-way message channel between the coordinator and a worker. Implementations send and
+    receive Python objects, numpy arrays and tuples of them, and count the bytes they move in
+    :code:`bytes_sent` and :code:`bytes_received`."""
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def send(self, message):
+        """ Send a message to the other end. """
+        raise NotImplementedError
+
+    def recv(self):
+        """ Wait for and return the next message from the other end. """
+        raise NotImplementedError
+
+    def close(self):
+        """ Close the channel. """
+        pass
+
+
+class ConnectionTransport(Transport):
+    """Transport over a :code:`multiprocessing.connection.Connection`, such as a pipe or a socket returned by
+    :code:`Listener.accept` or :code:`Client`. Messages are pickled.
+
+    Parameters
+    ----------
+    connection : multiprocessing.connection.Connection
+        open connection
+    """
+
+    def __init__(self, connection):
+        super(ConnectionTransport, self).__init__()
+        self.connection = connection
+
+    def send(self, message):
+        data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        self.connection.send_bytes(data)
+        self.bytes_sent += len(data)
+
+    def recv(self):
+        data = self.connection.recv_bytes()
+        self.bytes_received += len(data)
+        return pickle.loads(data)
+
+    def close(self):
+        self.connection.close()
+
+
+def _serve(transport, W, weights=None, chunk_size=DEFAULT_CHUNK_ROWS):
+    """ Answers the messages of a coordinator about the shard W until told to stop. """
+
+    labels = None
+    in_memory = isinstance(W, np.ndarray) and not isinstance(W, np.memmap)
+
+    while True:
+        message = transport.recv()
+        command = message[0]
+
+        if command == 'stop':
+            break
+
+        try:
+            if command == 'init':
+                n_clusters, init_ratio, seed = message[1:]
+                if not 1 < n_clusters < W.shape[0]:
+                    raise ValueError("A shard of {0} rows cannot be initialized with {1} clusters, every shard needs more "
+                                     "rows than clusters and there must be at least 2 clusters".format(W.shape[0], n_clusters))
+                labels = initialize_labels(W.shape[0], n_clusters, init_ratio=init_ratio, seed=seed)
+                reply = W.shape
+            elif command == 'pass':
+                n_clusters, state = message[1:]
+                labels, S, p, total = _pass(W, labels, n_clusters, assign=_state_assign(state), weights=weights,
+                                            chunk_size=chunk_size, prefetch=not in_memory)
+                reply = (S, p, total)
+            elif command == 'labels':
+                reply = labels
+            else:
+                raise ValueError("Unknown command '{0}'".format(command))
+        except Exception as e:
+            reply = e
+
+        transport.send(reply)
+
+
+def _check_authkey(authkey):
+    """ Raises a ValueError unless authkey is a non-empty bytes key. """
+
+    if not isinstance(authkey, bytes) or not authkey:
+        raise ValueError("'authkey' must be a non-empty bytes key, messages are unpickled and an unauthenticated "
+                         "connection would run the code of anyone able to connect")
+
+
+def serve(address, W, weights=None, chunk_size=DEFAULT_CHUNK_ROWS, *, authkey):
+    """Connect a worker holding the shard W to a coordinator listening at address, see :code:`accept_workers`,
+    and answer its messages until it is stopped.
+
+    Parameters
+    ----------
+    address : tuple
+        (host, port) of the coordinator
+    W : np.array
+        binary data matrix of the shard, or data on disk such as returned by :code:`bmdcluster.loaders.read_packed`
+    weights : np.array, optional
+        multiplicity of each row of W, by default None
+    chunk_size : int, optional
+        number of rows per block processed at once, by default DEFAULT_CHUNK_ROWS
+    authkey : bytes
+        authentication key shared with the coordinator
+
+    Raises
+    ------
+    ValueError
+        If :code:`authkey` is not a non-empty bytes key
+    """
+
+    _check_authkey(authkey)
+    transport = ConnectionTransport(Client(address, authkey=authkey))
+    try:
+        _serve(transport, W, weights, chunk_size)
+    finally:
+        transport.close()
+
+
+def accept_workers(address, n_workers, *, authkey):
+    """Listen at address until n_workers workers have connected with :code:`serve`. The shards are ordered
+    by the time their workers connected.
+
+    Parameters
+    ----------
+    address : tuple
+        (host, port) to listen at
+    n_workers : int
+        number of workers
+    authkey : bytes
+        authentication key shared with the workers
+
+    Returns
+    -------
+    list
+        ConnectionTransport to each worker
+
+    Raises
+    ------
+    ValueError
+        If :code:`authkey` is not a non-empty bytes key
+    """
+
+    _check_authkey(authkey)
+
+    with Listener(address, authkey=authkey) as listener:
+        return [ConnectionTransport(listener.accept()) for _ in range(n_workers)]
+
+
+class Coordinator:
+    """Runs rounds of messages with a set of workers, each holding a shard of the rows of W, and records the
+    bytes sent and received and the latency of each round in :code:`rounds`.
+
+    Parameters
+    ----------
+    transports : list
+        Transport to each worker, in the order of the shards
+    """
+
+    def __init__(self, transports):
+        self.transports = list(transports)
+        self.rounds = []
+        self.shape = None
+
+    def _round(self, name, messages):
+        """ Sends one message to each worker and returns their replies. """
+
+        sent = sum(t.bytes_sent for t in self.transports)
+        received = sum(t.bytes_received for t in self.transports)
+        start = time.perf_counter()
+
+        for transport, message in zip(self.transports, messages):
+            transport.send(message)
+        replies = [transport.recv() for transport in self.transports]
+
+        self.rounds.append(RoundStats(name, sum(t.bytes_sent for t in self.transports) - sent,
+                                      sum(t.bytes_received for t in self.transports) - received,
+                                      time.perf_counter() - start))
+
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+
+        return replies
+
+    def init_labels(self, n_clusters, init_ratio=1.0, seed=None):
+        """ Randomly initialize the data cluster labels of the shards, shard i with seed + i. """
+
+        seeds = [None if seed is None else seed + i for i in range(len(self.transports))]
+        shapes = self._round('init', [('init', n_clusters, init_ratio, s) for s in seeds])
+        self.shape = (sum(n for n, _ in shapes), shapes[0][1])
+
+    def reduce(self, n_clusters, state=None):
+        """Runs a pass over every shard, reassigning the points if state is given, and returns the sum of the
+        sufficient statistics of the shards, see :code:`bmdcluster.optimizers.parallel`."""
+
+        return _add_stats(self._round('pass', [('pass', n_clusters, state)]*len(self.transports)))
+
+    def labels(self):
+        """ Collect the data cluster labels of all shards. """
+        return np.concatenate(self._round('labels', [('labels',)]*len(self.transports)))
+
+    def stop(self):
+        """ Stop the workers and close the transports. """
+
+        for transport in self.transports:
+            transport.send(('stop',))
+            transport.close()
+
+
+class LocalCluster:
+    """Runs one worker process per shard on this machine, connected over localhost sockets, as a stand-in for
+    workers on other machines.
+
+    Parameters
+    ----------
+    shards : list
+        binary data matrix of each shard
+    weights : list, optional
+        multiplicities of the rows of each shard, by default None
+    chunk_size : int, optional
+        number of rows per block processed at once by a worker, by default DEFAULT_CHUNK_ROWS
+    """
+
+    def __init__(self, shards, weights=None, chunk_size=DEFAULT_CHUNK_ROWS):
+
+        authkey = os.urandom(16)
+        weights = [None]*len(shards) if weights is None else weights
+        self.processes = []
+        self.transports = []
+
+        with Listener(('localhost', 0), authkey=authkey) as listener:
+            # workers are started one at a time so that the transports are in the order of the shards
+            for W, w in zip(shards, weights):
+                process = Process(target=serve, args=(listener.address, W, w, chunk_size), kwargs={'authkey': authkey}, daemon=True)
+                process.start()
+                self.processes.append(process)
+                self.transports.append(ConnectionTransport(listener.accept()))
+
+    def close(self):
+        """ Stop the workers and wait for them to exit. """
+
+        Coordinator(self.transports).stop()
+        for process in self.processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def fit_distributed(model, transports, verbose=False, callback=None):
+    """Fit a model to the shards of the data held by the workers at the other end of the transports. The data
+    clusters are initialized randomly by the workers and stored as a vector of labels. The data stays with the
+    workers, so the model's :code:`.W` is None. The fit stops at the model's :code:`max_time` and sets 
+    :code:`.truncated`.
+
+    Parameters
+    ----------
+    model : blockdiagonalBMD or generalBMD
+        model to fit
+    transports : list
+        Transport to each worker, in the order of the shards, e.g. :code:`LocalCluster.transports` or the
+        result of :code:`accept_workers`
+    verbose : bool, optional
+        print progress during optimization, by default False
+    callback : callable, optional
+        function called with the number of iterations and the cost after every iteration, by default None.
+        The fit stops early if it returns True, and is aborted if it raises an exception.
+
+    Returns
+    -------
+    blockdiagonalBMD or generalBMD
+        the fitted model, with the statistics of each round in :code:`.rounds`
+
+    Raises
+    ------
+    ValueError
+        If the model uses an option that needs all of the data, bootstrap or 'kmeans++' initialization, collapsing
+        rows or features, :code:`fit_mode='sample'` or reseeding or dropping empty clusters
+    ValueError
+        If the model saves checkpoints or caches fits, which need the data in one place
+    ValueError
+        If a shard does not have more rows than the model has clusters
+    """
+
+    if model.use_bootstrap or model.init != 'random':
+        raise ValueError("Only 'random' initialization is supported when fitting distributed")
+
+    if model.collapse_duplicates or getattr(model, 'collapse_features', False) or model.fit_mode != 'full':
+        raise ValueError("Collapsing rows or features and sampling are not supported when fitting distributed")
+
+    if getattr(model, 'empty_cluster', 'keep') != 'keep':
+        raise ValueError("Only empty_cluster='keep' is supported when fitting distributed")
+
+    if getattr(model, 'checkpoint_dir', None) is not None or getattr(model, 'fit_cache_dir', None) is not None:
+        raise ValueError("Checkpoints and the fit cache are not supported when fitting distributed")
+
+    model.W = None
+    model.empty_cluster_stats, model.dropped_clusters = None, np.zeros(0, dtype=int)
+    deadline = Deadline(getattr(model, 'max_time', None))
+
+    coordinator = Coordinator(transports)
+    coordinator.init_labels(model.n_clusters, model.init_ratio, model.seed)
+
+    if isinstance(model, generalBMD):
+        B = initialize_B(coordinator.shape[1], B_ident=model.B_ident, f_clusters=model.f_clusters, as_labels=model.B_ident,
+                         seed=model.seed)
+        model.cost, model.A, model.B, model.X = _run_general(coordinator, B, model.n_clusters, model.max_iter, verbose,
+                                                             callback=callback, deadline=deadline)
+    else:
+        model.cost, model.A, model.B = _run_bd(coordinator, model.n_clusters, model.max_iter, verbose,
+                                               callback=callback, deadline=deadline)
+        model._build_index()
+
+    model.truncated = deadline.truncated
+    model.rounds = coordinator.rounds
+
+    return model
@@ -0,0 +1,164 @@
+"""
+An approximate nearest-cluster index for predicting the clusters of the block-diagonal model when the
+number of clusters K is large.
+
+The cluster centroids, the rows of B', are binary, so the closest cluster to a point is the one at the
+smallest Hamming distance. The index uses bit-sampling locality sensitive hashing: each of several hash
+tables samples a fixed random subset of the features and buckets the centroids by their values on those
+features. A point that differs from a centroid in a fraction f of the features lands in its bucket with
+probability (1-f)^n_bits in each table, so close centroids are found with high probability by looking up
+the point's bucket in every table. Only the centroids in these buckets, the candidates, are scored exactly.
+More tables raise the recall at the cost of more candidates, more bits per table lower the number of
+candidates at the cost of recall. Points without any candidate are scored against all clusters.
+
+Sparse centroids, like those of block-diagonal models, mostly agree on the sampled features and share
+the all-zero bucket. Buckets holding more than a fraction :code:`max_candidates` of the clusters carry
+no information and are skipped, and points with more candidates than that fraction in total are scored
+against all clusters, which bounds the work per point by the exact scan.
+"""
+
+import numpy as np
+
+from bmdcluster.utils import sq_distances
+
+
+# number of query points scored at a time
+QUERY_BLOCK_SIZE = 2**12
+
+
+class HammingLSH:
+    """Bit-sampling LSH index over binary cluster centroids.
+
+    Parameters
+    ----------
+    C : np.array
+        K x m matrix of binary cluster centroids
+    n_tables : int, optional
+        number of hash tables, by default 16
+    n_bits : int, optional
+        number of features sampled by each hash table, at most 63, by default 16
+    max_candidates : float, optional
+        largest fraction of the clusters in a bucket, or among the candidates of a point, before they are
+        scored exactly instead, by default 0.1
+    seed : int, optional
+        randomization seed, by default None
+
+    Raises
+    ------
+    ValueError
+        If :code:`n_bits` is not between 1 and 63
+    """
+
+    def __init__(self, C, n_tables=16, n_bits=16, max_candidates=0.1, seed=None):
+
+        if not 0 < n_bits < 64:
+            raise ValueError("'n_bits' must be between 1 and 63")
+
+        self.C = np.asarray(C, dtype=float)
+        self.n_tables = n_tables
+        self.n_bits = min(n_bits, self.C.shape[1])
+        self.max_candidates = max(1, int(max_candidates*self.C.shape[0]))
+
+        if seed:
+            np.random.seed(seed)
+
+        self.features = np.array([np.random.choice(self.C.shape[1], size=self.n_bits, replace=False) for _ in range(n_tables)])
+
+        np.random.seed(None)
+
+        # Sort the centroids of each table by key so a bucket is a contiguous run.
+        keys = self._keys(self.C)
+        self.order = np.argsort(keys, axis=1, kind='stable')
+        self.sorted_keys = np.take_along_axis(keys, self.order, axis=1)
+
+    def _keys(self, W):
+        """ Computes the hash key of each row of W in every table, an n_tables x n matrix. """
+
+        powers = np.left_shift(1, np.arange(self.n_bits, dtype=np.int64))
+        bits = (np.asarray(W)[:, self.features] != 0).astype(np.int64)    # n x n_tables x n_bits
+
+        return np.dot(bits, powers).T
+
+    def candidates(self, W):
+        """Finds the candidate clusters of each point of W. Buckets with more than :code:`max_candidates`
+        clusters are skipped, as are points with more than :code:`max_candidates` candidates.
+
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix
+
+        Returns
+        -------
+        np.array
+            index of the point of each (point, cluster) candidate pair
+        np.array
+            cluster of each candidate pair
+        """
+
+        keys = self._keys(W)
+        points, clusters = [], []
+
+        for t in range(self.n_tables):
+            start = np.searchsorted(self.sorted_keys[t], keys[t], side='left')
+            stop = np.searchsorted(self.sorted_keys[t], keys[t], side='right')
+            counts = np.where(stop - start > self.max_candidates, 0, stop - start)
+            # Expand the bucket of each point into its members.
+            points.append(np.repeat(np.arange(len(counts)), counts))
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            clusters.append(self.order[t][np.repeat(start, counts) + offsets])
+
+        pairs = np.unique(np.concatenate(points)*self.C.shape[0] + np.concatenate(clusters))
+        points, clusters = pairs // self.C.shape[0], pairs % self.C.shape[0]
+
+        keep = np.bincount(points, minlength=W.shape[0])[points] <= self.max_candidates
+
+        return points[keep], clusters[keep]
+
+    def query(self, W):
+        """Finds the closest cluster of each point of W among its candidates. Ties are broken by the
+        lowest cluster index like np.argmin(). Points without candidates are compared to all clusters.
+
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix
+
+        Returns
+        -------
+        np.array
+            closest cluster of each point
+        """
+
+        labels = np.empty(W.shape[0], dtype=int)
+        for start in range(0, W.shape[0], QUERY_BLOCK_SIZE):
+            labels[start:start+QUERY_BLOCK_SIZE] = self._query_block(np.asarray(W[start:start+QUERY_BLOCK_SIZE], dtype=float))
+
+        return labels
+
+    def _query_block(self, W):
+
+        points, clusters = self.candidates(W)
+
+        # Dot product of each candidate pair, one cluster at a time; the pairs are sorted by point so the
+        # points of a cluster are found with a stable sort by cluster.
+        dots = np.empty(len(points))
+        by_cluster = np.argsort(clusters, kind='stable')
+        bounds = np.r_[np.unique(clusters[by_cluster], return_index=True)[1], len(points)]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            pairs = by_cluster[lo:hi]
+            dots[pairs] = np.dot(W[points[pairs]], self.C[clusters[pairs[0]]])
+
+        # Squared distance of each candidate pair, sorted by point, then distance, then cluster.
+        d = np.square(W).sum(axis=1)[points] - 2*dots + np.square(self.C).sum(axis=1)[clusters]
+        order = np.lexsort((clusters, d, points))
+        first = order[np.r_[True, points[order][1:] != points[order][:-1]]] if len(order) > 0 else order
+
+        labels = np.full(W.shape[0], -1)
+        labels[points[first]] = clusters[first]
+
+        missing = np.where(labels < 0)[0]
+        if len(missing) > 0:
+            labels[missing] = sq_distances(W[missing], self.C).argmin(axis=1)
+
+        return labels
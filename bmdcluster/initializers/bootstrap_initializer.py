@@ -65,6 +65,43 @@ def bootstrap_data(N, b, seed=None):
     return x_samp, x_rep
 
 
+def sample_data(N, b, seed=None):
+    """
+    This function chooses the indices of a random subset of size b from a set of indices ranging 
+    from 0 to N-1, without replacement.
+
+    Parameters
+    ----------
+    N: int
+        size of data set
+    b: int
+        size of subset
+    seed: int, optional
+        randomization seed
+
+    Returns
+    -------
+    np.array
+        sorted array containing the indices of the subset
+
+    Raises
+    ------
+    AssertionError: 
+        raises assertion error if b > N
+
+    """
+    assert b <= N
+
+    if seed:
+        np.random.seed(seed)
+
+    x_samp = np.random.choice(N, size=b, replace = False)
+
+    np.random.seed(None)
+
+    return np.sort(x_samp)
+
+
 def assign_bootstrapped_clusters(A_boot, x_rep, x_samp):
 
     """Returns the original indices of a bootstrapped sample point. 
@@ -155,7 +192,7 @@ def initialize_bootstrapped_clusters_general(W, n_clusters, f_clusters, B_ident,
     n, m = W.shape
     x_samp, x_rep = bootstrap_data(n, b=b, seed=seed)
     A_init = initialize_A(n=n, n_clusters=n_clusters, seed=seed)
-    B_init = initialize_B(m=m, B_ident=B_ident, f_clusters=f_clusters, seed=seed)
+    B_init = initialize_B(m=m, B_ident=B_ident, f_clusters=f_clusters, as_labels=True, seed=seed)
     _, A_boot, _, _ = run_BMD(A_init, B_init, W[x_rep,:], verbose=0)
 
     seed_points = assign_bootstrapped_clusters(A_boot, x_rep, x_samp)
@@ -2,8 +2,10 @@
 
 import numpy as np
 
+from bmdcluster.utils import sq_distances
 
-def initialize_B(m, B_ident=False, f_clusters=None, seed=None):
+
+def initialize_B(m, B_ident=False, f_clusters=None, as_labels=False, seed=None):
     """This function initializes the feature cluster indicator matrix B. There are two initialization options.
     The first option places each each feature in its own cluster, so B is initialized to the identity matrix.
     The second option randomly assigns features to clusters uniformly.
@@ -16,13 +18,15 @@ def initialize_B(m, B_ident=False, f_clusters=None, seed=None):
         initialize to the identity matrix, by default False
     f_clusters : int, optional
         the numberof feature clusters, must be set if B_ident is False, by default None
+    as_labels : bool, optional
+        return the identity as a vector of feature labels instead of an m x m matrix, by default False
     seed : int, optional
         randomiazation seed, by default None
     
     Returns
     -------
     np.array
-        initialized feature indicator matrix B
+        initialized feature indicator matrix B, or vector of feature labels if as_labels is set
     
     Raises
     ------
@@ -31,7 +35,9 @@ def initialize_B(m, B_ident=False, f_clusters=None, seed=None):
     """
 
 
-    if B_ident:
+    if B_ident and as_labels:
+        B_init = np.arange(m)
+    elif B_ident:
         B_init = np.identity(m)
     else:
 
@@ -95,11 +101,107 @@ def initialize_A(n, n_clusters, init_ratio=1.0, bootstrap=None, seed=None):
         assert 0 < init_ratio <= 1
         if init_ratio < 1:
             # Select a random fraction of points of size init_ratio.
-            for j in np.random.choice(range(n), size = int(n*init_ratio), replace = False):
-                A_init[j, np.random.randint(n_clusters)] = 1
+            rows = np.random.choice(range(n), size = int(n*init_ratio), replace = False)
+        else:
+            rows = np.arange(n)
+
+        # Drawing all clusters at once gives the same random stream as drawing them one point at a time.
+        A_init[rows, np.random.randint(n_clusters, size = len(rows))] = 1
+
+    return A_init
+
+
+def initialize_A_kmeanspp(W, n_clusters, weights=None, seed=None):
+    """Initialize data cluster indicator matrix A using k-means++ style seeding. The first seed
+    point is chosen uniformly at random and each following seed is drawn with probability
+    proportional to its squared distance to the nearest seed already chosen (for binary data
+    this is the Hamming distance). Every point is then assigned to the cluster of its nearest seed.
+    
+    Parameters
+    ----------
+    W : np.array
+        binary data matrix
+    n_clusters : int
+        number of data clusters
+    weights : np.array, optional
+        multiplicity of each row of W, scales the sampling probabilities, by default None
+    seed : int, optional
+        randomization seed, by default None
+    
+    Returns
+    -------
+    A_init: np.array
+        initialized data indicator matrix
+    """
+
+    n = W.shape[0]
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=float)
+
+    assert 1 < n_clusters < n
+
+    if seed:
+        np.random.seed(seed)
+
+    seeds = [np.random.choice(n, p=w/w.sum()) if weights is not None else np.random.randint(n)]
+    # squared distance from each point to its nearest seed
+    D = sq_distances(W, W[seeds, :])[:, 0]
+
+    for _ in range(1, n_clusters):
+        total = np.dot(D, w)
+        if total > 0:
+            s = np.random.choice(n, p=D*w/total)
         else:
+            # every point coincides with a seed, fall back to uniform sampling
+            s = np.random.randint(n)
+        seeds.append(s)
+        D = np.minimum(D, sq_distances(W, W[[s], :])[:, 0])
+
+    np.random.seed(None)
+
+    A_init = np.zeros((n, n_clusters))
+    A_init[np.arange(n), sq_distances(W, W[seeds, :]).argmin(axis=1)] = 1
+
+    return A_init
+
+
+def initialize_labels(n, n_clusters, init_ratio=1.0, seed=None):
+    """Initialize the data clusters as a vector of cluster labels rather than an indicator matrix,
+    for data too large to hold an n x K matrix. Points are assigned to clusters uniformly at random.
+    If init_ratio is less than 1, only a random subset of points is assigned and the rest are
+    labeled -1.
+    
+    Parameters
+    ----------
+    n : int
+        number of data points
+    n_clusters : int
+        number of data clusters
+    init_ratio : float, optional
+        fraction of points to initialize, by default 1.0
+    seed : int, optional
+        randomization seed, by default None
+    
+    Returns
+    -------
+    np.array
+        vector of data cluster labels
+    """
+
+    assert 1 < n_clusters < n
+    assert 0 < init_ratio <= 1
+
+    if seed:
+        np.random.seed(seed)
+
+    labels = np.full(n, -1)
+
+    if init_ratio < 1:
+        assigned = np.random.choice(n, size=int(n*init_ratio), replace=False)
+    else:
+        assigned = np.arange(n)
+
+    labels[assigned] = np.random.randint(n_clusters, size=len(assigned))
 
-            for j in range(n): 
-                A_init[j, np.random.randint(n_clusters)] = 1
+    np.random.seed(None)
 
-    return A_init
\ No newline at end of file
+    return labels
@@ -1,10 +1,10 @@
 import numpy as np
 
-from .cluster_initializers import initialize_A, initialize_B
+from .cluster_initializers import initialize_A, initialize_B, initialize_A_kmeanspp
 from .bootstrap_initializer import initialize_bootstrapped_clusters_block_diagonal
 from .bootstrap_initializer import initialize_bootstrapped_clusters_general
 
-def initialize_block_diagonal(W, n_clusters, b=None, init_ratio=1.0, use_bootstrap=False, seed=None):
+def initialize_block_diagonal(W, n_clusters, b=None, init_ratio=1.0, use_bootstrap=False, init='random', weights=None, seed=None):
     """Wrapper function for cluster initialization functions and methods to initialize 
     the data cluster matrix.
     
@@ -20,6 +20,10 @@ def initialize_block_diagonal(W, n_clusters, b=None, init_ratio=1.0, use_bootstr
         fraction of points in data matrix to initialize, by default 1.0
     use_bootstrap : bool, optional
         use bootstrapping to initialize data clusters, by default False
+    init : str, optional
+        'random' or 'kmeans++' initialization of the data clusters when not bootstrapping, by default 'random'
+    weights : np.array, optional
+        multiplicity of each row of W, used by 'kmeans++' initialization, by default None
     seed : int, optional
         randomization seed, by default None
     
@@ -43,6 +47,13 @@ def initialize_block_diagonal(W, n_clusters, b=None, init_ratio=1.0, use_bootstr
                                 bootstrap=boot, 
                                 init_ratio=init_ratio)
 
+    elif init == 'kmeans++':
+
+        A_init = initialize_A_kmeanspp(W=W, 
+                                        n_clusters=n_clusters, 
+                                        weights=weights,
+                                        seed=seed)
+
     else:
 
         A_init = initialize_A(n=n, 
@@ -53,7 +64,7 @@ def initialize_block_diagonal(W, n_clusters, b=None, init_ratio=1.0, use_bootstr
     return A_init
 
 
-def initialize_general(W, n_clusters, b=None, f_clusters=None, init_ratio=1.0, B_ident=False, use_bootstrap=False, seed=None):
+def initialize_general(W, n_clusters, b=None, f_clusters=None, init_ratio=1.0, B_ident=False, use_bootstrap=False, init='random', weights=None, B_as_labels=False, seed=None):
     """Wrapper function for cluster initialization functions and methods to initialize 
     the data cluster matrix and feature cluster matrix
     
@@ -73,6 +84,12 @@ def initialize_general(W, n_clusters, b=None, f_clusters=None, init_ratio=1.0, B
         initialize feature cluster matrix to the identity, by default False
     use_bootstrap : bool, optional
         use bootstrapping to initialize data clusters, by default False
+    init : str, optional
+        'random' or 'kmeans++' initialization of the data clusters when not bootstrapping, by default 'random'
+    weights : np.array, optional
+        multiplicity of each row of W, used by 'kmeans++' initialization, by default None
+    B_as_labels : bool, optional
+        return the identity feature cluster matrix as a vector of feature labels, by default False
     seed : int, optional
         randomization seed, by default None
     
@@ -101,10 +118,14 @@ def initialize_general(W, n_clusters, b=None, f_clusters=None, init_ratio=1.0, B
         B_init = initialize_B(m=m, 
                                 f_clusters=f_clusters,
                                 B_ident=B_ident, 
+                                as_labels=B_as_labels,
                                 seed=seed)
 
     else:
-        A_init = initialize_A(n=n, n_clusters=n_clusters, init_ratio=init_ratio, seed=seed)
-        B_init = initialize_B(m=m, B_ident=B_ident, seed=seed)
+        if init == 'kmeans++':
+            A_init = initialize_A_kmeanspp(W=W, n_clusters=n_clusters, weights=weights, seed=seed)
+        else:
+            A_init = initialize_A(n=n, n_clusters=n_clusters, init_ratio=init_ratio, seed=seed)
+        B_init = initialize_B(m=m, f_clusters=f_clusters, B_ident=B_ident, as_labels=B_as_labels, seed=seed)
 
     return A_init, B_init
\ No newline at end of file
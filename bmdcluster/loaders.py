@@ -0,0 +1,291 @@
+"""
+Functions for reading binary data matrices from files without first parsing them into dense float arrays.
+
+Three formats are supported:
+
+ CSV: 0/1 values separated by a delimiter. The file is read in blocks of lines that are parsed in
+      parallel into uint8 arrays. Single character fields are parsed directly from the raw bytes.
+ NPY: numpy's .npy format, which is memory-mapped rather than read.
+ packed: a binary format storing each row as bits, 8 features per byte. The file starts with a
+      HEADER_SIZE byte header holding the magic string and the number of rows and columns, so that
+      the rows are aligned for memory-mapping.
+
+read_npy() and read_packed() return arrays whose rows are read from disk as they are sliced, so they
+can be passed to .fit(), which then streams them in blocks of rows, and to .predict() and .transform().
+"""
+
+import io
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+MAGIC = b'BMDPACK1'
+HEADER_SIZE = 64
+
+# number of bytes of a CSV file read and parsed at a time
+DEFAULT_BLOCK_SIZE = 2**24
+
+
+class PackedMatrix:
+    """A binary matrix stored as packed bits in a file written by write_packed(). The packed rows
+    are memory-mapped and unpacked to uint8 rows when sliced, so the matrix can be used in place
+    of an array by .fit(), .predict() and .transform(). It is indexed like a 2D array, by rows as
+    in :code:`M[i]` and :code:`M[rows]` or by rows and columns as in :code:`M[i, j]` and :code:`M[:, cols]`,
+    the selected rows are unpacked in full before the columns are taken from them.
+
+    Parameters
+    ----------
+    path : str
+        path of the packed file
+    """
+
+    dtype = np.dtype(np.uint8)
+    ndim = 2
+
+    def __init__(self, path):
+
+        with open(path, 'rb') as f:
+            n, m = _read_header(f)
+
+        self.path = path
+        self.shape = (n, m)
+        self.packed = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER_SIZE, shape=(n, (m + 7) // 8))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+
+        if isinstance(index, tuple):
+            if len(index) > 2 or any(i is Ellipsis or i is None for i in index):
+                raise IndexError("A PackedMatrix is indexed by rows, or by rows and columns")
+            if len(index) == 2:
+                W = self[index[0]]
+                return W[:, index[1]] if W.ndim == 2 else W[index[1]]
+            index = index[0] if index else slice(None)
+
+        rows = np.asarray(self.packed[index])
+        return np.unpackbits(rows, axis=-1, count=self.shape[1])
+
+    def __array__(self, dtype=None, copy=None):
+
+        W = self[:]
+        return W if dtype is None else W.astype(dtype)
+
+
+def _read_header(f):
+
+    header = f.read(HEADER_SIZE)
+    if header[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a packed binary matrix file")
+
+    return struct.unpack('<QQ', header[len(MAGIC):len(MAGIC) + 16])
+
+
+def _write_header(f, n, m):
+
+    header = MAGIC + struct.pack('<QQ', n, m)
+    f.seek(0)
+    f.write(header + b'\0'*(HEADER_SIZE - len(header)))
+
+
+def write_packed(path, W):
+    """Writes a binary matrix to a file in the packed format.
+
+    Parameters
+    ----------
+    path : str
+        path of the file to write
+    W : np.array or iterable
+        binary data matrix, or an iterable of blocks of rows such as returned by iter_csv()
+    """
+
+    blocks = [W] if isinstance(W, np.ndarray) else W
+    n, m = 0, None
+
+    with open(path, 'wb') as f:
+        _write_header(f, 0, 0)
+        for block in blocks:
+            block = np.asarray(block)
+            m = block.shape[1]
+            f.write(np.packbits(block != 0, axis=1).tobytes())
+            n += block.shape[0]
+        _write_header(f, n, m or 0)
+
+
+def read_packed(path):
+    """Opens a file in the packed format.
+
+    Parameters
+    ----------
+    path : str
+        path of the packed file
+
+    Returns
+    -------
+    PackedMatrix
+        memory-mapped binary matrix
+    """
+    return PackedMatrix(path)
+
+
+def read_npy(path, mmap=True):
+    """Reads a binary matrix saved with np.save().
+
+    Parameters
+    ----------
+    path : str
+        path of the .npy file
+    mmap : bool, optional
+        memory-map the file read-only rather than reading it, by default True
+
+    Returns
+    -------
+    np.array
+        binary data matrix, an np.memmap if mmap is set
+    """
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+
+def _parse_block(block, delimiter):
+    """Parses a block of complete lines of a 0/1 CSV file into a uint8 array. Lines of single
+    character fields are parsed directly from the bytes, other formats such as '1.0' with
+    np.loadtxt()."""
+
+    stripped = block.replace(b'\r', b'')
+    data = np.frombuffer(stripped, dtype=np.uint8)
+    n_cols = (stripped.find(b'\n') + 1) // 2
+
+    # In lines of single character fields, every second byte is a value followed by a delimiter
+    # or the line's newline.
+    if n_cols > 0 and len(data) % (2*n_cols) == 0:
+        values, seps = data[0::2].reshape((-1, n_cols)), data[1::2].reshape((-1, n_cols))
+        if (np.all((values == ord('0')) | (values == ord('1')))
+                and np.all(seps[:, :-1] == ord(delimiter)) and np.all(seps[:, -1] == ord('\n'))):
+            return values - ord('0')
+
+    return np.loadtxt(io.BytesIO(block), delimiter=delimiter, ndmin=2).astype(np.uint8)
+
+
+def _read_blocks(path, skiprows, block_size):
+    """Reads a file in blocks of about block_size bytes that end at a line break. Blocks of blank lines
+    are skipped."""
+
+    with open(path, 'rb') as f:
+        for _ in range(skiprows):
+            f.readline()
+
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            block += f.readline()
+            if not block.endswith(b'\n'):
+                block += b'\n'
+            if block.strip():
+                yield block
+
+
+def iter_csv(path, delimiter=',', skiprows=0, block_size=DEFAULT_BLOCK_SIZE, n_jobs=1):
+    """Iterates over a 0/1 CSV file in blocks of rows. Blocks are parsed in parallel by n_jobs threads.
+
+    Parameters
+    ----------
+    path : str
+        path of the CSV file
+    delimiter : str, optional
+        field delimiter, by default ','
+    skiprows : int, optional
+        number of header lines to skip, by default 0
+    block_size : int, optional
+        number of bytes parsed at a time, by default DEFAULT_BLOCK_SIZE
+    n_jobs : int, optional
+        number of threads parsing blocks, by default 1
+
+    Yields
+    ------
+    np.array
+        block of rows as a uint8 array
+    """
+
+    blocks = _read_blocks(path, skiprows, block_size)
+
+    if n_jobs == 1:
+        for block in blocks:
+            yield _parse_block(block, delimiter)
+        return
+
+    # Keep at most 2*n_jobs blocks in flight so memory stays bounded.
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        pending = list()
+        for block in blocks:
+            pending.append(executor.submit(_parse_block, block, delimiter))
+            if len(pending) >= 2*n_jobs:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def read_csv(path, delimiter=',', skiprows=0, block_size=DEFAULT_BLOCK_SIZE, n_jobs=1):
+    """Reads a 0/1 CSV file into a uint8 array, see iter_csv().
+
+    Parameters
+    ----------
+    path : str
+        path of the CSV file
+    delimiter : str, optional
+        field delimiter, by default ','
+    skiprows : int, optional
+        number of header lines to skip, by default 0
+    block_size : int, optional
+        number of bytes parsed at a time, by default DEFAULT_BLOCK_SIZE
+    n_jobs : int, optional
+        number of threads parsing blocks, by default 1
+
+    Returns
+    -------
+    np.array
+        binary data matrix
+
+    Raises
+    ------
+    ValueError
+        If the file has no data rows, from which the number of columns would be read
+    """
+
+    blocks = list(iter_csv(path, delimiter, skiprows, block_size, n_jobs))
+    if not blocks:
+        raise ValueError("{0} has no data rows".format(path))
+
+    return np.vstack(blocks)
+
+
+def csv_to_packed(csv_path, packed_path, delimiter=',', skiprows=0, block_size=DEFAULT_BLOCK_SIZE, n_jobs=1):
+    """Converts a 0/1 CSV file to the packed format one block at a time, without reading the whole
+    file into memory.
+
+    Parameters
+    ----------
+    csv_path : str
+        path of the CSV file
+    packed_path : str
+        path of the packed file to write
+    delimiter : str, optional
+        field delimiter, by default ','
+    skiprows : int, optional
+        number of header lines to skip, by default 0
+    block_size : int, optional
+        number of bytes parsed at a time, by default DEFAULT_BLOCK_SIZE
+    n_jobs : int, optional
+        number of threads parsing blocks, by default 1
+
+    Returns
+    -------
+    PackedMatrix
+        memory-mapped binary matrix
+    """
+
+    write_packed(packed_path, iter_csv(csv_path, delimiter, skiprows, block_size, n_jobs))
+    return read_packed(packed_path)
@@ -0,0 +1,115 @@
+import numpy as np
+
+from bmdcluster.utils import expired
+
+"""
+This module contains a batched variant of the block diagonal BMD algorithm (Algorithm 2 from Li (2005)) that
+fits many independent problems of the same shape at once. The problems are stacked along a leading batch
+axis,
+
+ W: P x n x m stack of binary data matrices
+ A: P x n x K stack of data cluster indicator matrices
+ B: P x m x K stack of feature cluster indicator matrices
+
+and every update step is a single batched matrix product (np.matmul) over all problems that have not
+converged yet. For small problems this removes the per-call overhead of running them one by one. Each
+problem stops as soon as its objective function does not improve, exactly like run_bd_BMD(), and the
+results are the same as running run_bd_BMD() on each problem.
+"""
+
+
+def _batch_updateB(A, W):
+    """Updates the feature cluster matrices of a stack of problems, see _bd_updateB(). Also returns the
+    feature counts S = A'W and cluster sizes, which give the objective function without the residuals."""
+
+    n_k = A.sum(axis = 1)
+    S = np.matmul(A.transpose((0, 2, 1)), W)
+
+    # reciprocals of empty clusters are set to zero as in _normalize_counts()
+    r = n_k.copy()
+    r[r == 0] = np.inf
+    B = np.greater_equal(S*(1 / r)[:, :, None], 0.5).transpose((0, 2, 1))
+
+    # features associated with all clusters are outliers (see _is_bd_outlier())
+    B[B.all(axis = 2)] = False
+
+    return B, S, n_k
+
+
+def _batch_updateA(B, W, W_sq):
+    """Updates the data cluster matrices of a stack of problems, see _bd_updateA(). W_sq holds the
+    squared norms of the rows of W."""
+
+    B = B.astype(float)
+    D = W_sq[:, :, None] - 2*np.matmul(W, B) + np.square(B).sum(axis = 1)[:, None, :]
+
+    A = np.zeros(D.shape)
+    np.put_along_axis(A, D.argmin(axis = 2)[:, :, None], 1, axis = 2)
+
+    return A
+
+
+def _batch_objective(B, S, n_k, W_sq):
+    """Computes the objective function of each problem, see _bd_objective(). Each point belongs to at
+    most one cluster, so ||W - AB'||^2 = ||W||^2 - 2<A'W, B'> + sum_k n_k ||b_k||^2. The terms are
+    integers and the sums are exact."""
+
+    B = B.astype(float)
+    cross = (S*B.transpose((0, 2, 1))).sum(axis = (1, 2))
+    size = (n_k*B.sum(axis = 1)).sum(axis = 1)
+
+    return np.sqrt(W_sq.sum(axis = 1) - 2*cross + size)
+
+
+def run_bd_BMD_batched(A, W, max_iter=100, deadline=None):
+    """Executes clustering Algorithm 2 from Li (2005) on a stack of independent problems of the same
+    shape. Gives the same results as run_bd_BMD() on each problem.
+
+    Parameters
+    ----------
+    A : np.array
+        P x n x K stack of initial data cluster matrices
+    W : np.array
+        P x n x m stack of binary data matrices
+    max_iter : int, optional
+        maximum number of algorithm iterations, by default 100
+    deadline : bmdcluster.utils.Deadline, optional
+        time budget checked before each iteration, the problems that have not converged keep their last
+        completed iteration once it expires, by default None
+
+    Returns
+    -------
+    np.array
+        final value of the objective function of each problem
+    np.array
+        final data cluster matrices
+    np.array
+        final feature cluster matrices
+    """
+
+    W = np.asarray(W, dtype = float)
+    A = np.array(A, dtype = float)
+    W_sq = np.square(W).sum(axis = 2)
+
+    B, S, n_k = _batch_updateB(A, W)
+    O_old = _batch_objective(B, S, n_k, W_sq)
+    O_final = O_old.copy()
+
+    # problems that are still improving, and their data
+    active = np.arange(W.shape[0])
+    n_iter = 0
+
+    while n_iter < max_iter and len(active) > 0 and not expired(deadline):
+        A_new = _batch_updateA(B[active], W, W_sq)
+        B_new, S, n_k = _batch_updateB(A_new, W)
+        O_new = _batch_objective(B_new, S, n_k, W_sq)
+
+        # Like run_bd_BMD(), a problem that stops keeps the state of its last, non-improving, iteration.
+        A[active], B[active], O_final[active] = A_new, B_new, O_new
+        improved = O_new < O_old[active]
+        O_old[active[improved]] = O_new[improved]
+        if not improved.all():
+            active, W, W_sq = active[improved], W[improved], W_sq[improved]
+        n_iter += 1
+
+    return O_final, A, B
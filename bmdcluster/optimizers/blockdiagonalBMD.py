@@ -1,5 +1,7 @@
 import numpy as np
 
+from bmdcluster.utils import sq_distances, labels_to_indicator, expired, select_columns, expand_columns
+
 """
 This module contains a variant of the Binary Matrix Decomposition (BMD) algorithm for clustering binary data
 as presented in "A General Model for Clustering Binary Data" (Tao Li, 2005) and "On Clustering Binary Data"
@@ -28,9 +30,18 @@ General Nomenclature:
 
 ITER_MESSAGE = "Iteration: {0} ............. Cost: {1:.3f}"
 
-def _bd_objective(A,B,W):
-    """ Objective function for block diagonal variation of BMD."""
-    return np.linalg.norm(W - np.dot(A, B.T))
+def _bd_objective(A,B,W, weights=None):
+    """ Objective function for block diagonal variation of BMD. Rows are weighted by :code:`weights` if given."""
+    R = W - np.dot(A, B.T)
+    if weights is not None:
+        R = R*np.sqrt(weights).reshape((-1,1))
+    return np.linalg.norm(R)
+
+
+def _bd_point_costs(A, B, W, weights=None):
+    """ Squared distance of every point to the centroid of its cluster, its term of the objective function. """
+    c = np.square(W - np.dot(A, B.T)).sum(axis=1)
+    return c if weights is None else c*weights
 
 
 def _is_bd_outlier(B):
@@ -121,13 +132,146 @@ def _bd_updateA(A,B,W):
     n, K = A.shape
     A_new = np.zeros((n,K))
     
-    for i in range(n): 
-        A_new[i,:], A_new[i, _d_ik(i, W, B)] = 0, 1
+    # Assign each point to the closest cluster, computing formula 10 for all points at once.
+    A_new[np.arange(n), _bd_distances(B, W).argmin(axis = 1)] = 1
     
     return A_new
 
 
-def _Y(A, W):
+def _bd_distances(B, W):
+    """ Computes the squared distance of formula 10 between every point and every cluster, 
+    d[i,k] = SUM_{j in features} (W[i,j] - B[j,k])^2 (see _d_ik()).
+    
+    Parameters
+    ----------
+    B : np.array
+        feature cluster assignment matrix
+    W : np.array
+        binary data matrix
+    
+    Returns
+    -------
+    np.array
+        n x K matrix of squared distances
+    """
+
+    return sq_distances(W, B.T)
+
+
+# relative slack on the distance bounds, so that round-off never skips a point that is tied with another cluster
+BOUND_TOL = 1e-9
+# fraction of the n x K distances above which _bd_updateA_bounded() recomputes all of them
+BOUND_MAX_FRACTION = 0.5
+
+
+def _bd_updateA_bounded(A, B, W, bounds=None):
+    """Update data cluster assignment matrix A like _bd_updateA(), skipping the distance computations
+    that provably cannot change a point's cluster (Elkan's acceleration of k-means). 
+    
+    The Euclidean distance d[i,k] = sqrt(SUM_{j} (W[i,j] - B[j,k])^2) is a metric. If the centroid B[:,k]
+    moved by s[k] since the last update, the triangle inequality gives an upper bound u[i] + s[a[i]] on the
+    distance of point i to its old cluster a[i] and a lower bound l[i,k] - s[k] on its distance to every 
+    other cluster k. Cluster k can only take point i if its lower bound is not strictly above u[i]. For 
+    such points the upper bound is tightened to the exact distance and only the distances to the clusters
+    still in question are computed. If more than BOUND_MAX_FRACTION of the distances are in question, 
+    as in the first iterations when many centroids move, all of them are computed. For binary data the 
+    result is the same as _bd_updateA().
+    
+    The bounds take an n x K matrix, the same memory as the distances computed by _bd_updateA().
+    
+    Parameters
+    ----------
+    A : np.array
+        old data cluster matrix
+    B : np.array
+        old feature cluster matrix
+    W : np.array
+        binary data matrix
+    bounds : tuple, optional
+        bounds returned by the previous update, which are updated in place, by default None which computes 
+        all distances
+    
+    Returns
+    -------
+    np.array
+        updated data cluster matrix
+    tuple
+        data cluster labels, upper and lower distance bounds, whether the upper bounds are exact and the 
+        feature cluster matrix the bounds refer to
+    """
+
+    n, K = A.shape
+    B = np.asarray(B, dtype=float)
+
+    if bounds is None:
+        return _bd_exact_bounds(B, W)
+
+    labels, upper, lower, exact, B_old = bounds
+
+    # Move the bounds by the distance each centroid moved.
+    shift = np.sqrt(np.square(B - B_old).sum(axis = 0))
+    upper += shift[labels]
+    exact &= shift[labels] == 0
+    lower -= shift
+
+    candidates = lower <= (upper*(1 + BOUND_TOL)).reshape((-1,1))
+    check = np.where(candidates.any(axis = 1))[0]
+
+    # Tighten the upper bounds of the unsettled points to their exact distance.
+    loose = check[~exact[check]]
+    if len(loose) > 0:
+        W_loose, C = W[loose], B.T[labels[loose]]
+        upper[loose] = np.sqrt(np.maximum(np.einsum('ij,ij->i', W_loose, W_loose) 
+                                          - 2*np.einsum('ij,ij->i', W_loose, C) + np.einsum('ij,ij->i', C, C), 0))
+        exact[loose] = True
+        candidates[loose] = lower[loose] <= (upper[loose]*(1 + BOUND_TOL)).reshape((-1,1))
+        check = check[candidates[check].any(axis = 1)]
+
+    if len(check) == 0:
+        return labels_to_indicator(labels, K), (labels, upper, lower, exact, B)
+
+    cols = np.where(candidates[check].any(axis = 0))[0]
+    if len(check)*len(cols) > BOUND_MAX_FRACTION*n*K:
+        return _bd_exact_bounds(B, W)
+
+    # Compute the distances to the clusters that may still be closer for the points still in question.
+    block = np.ix_(check, cols)
+    D = np.sqrt(_bd_distances(B[:, cols], W[check]))
+    lower[block] = np.where(candidates[block], D, lower[block])
+
+    # The clusters that were not computed are strictly further than the old cluster, which wins ties
+    # with clusters of a higher index like in np.argmin().
+    D[~candidates[block]] = np.inf
+    closest = D.argmin(axis = 1)
+    d_closest = D[np.arange(len(check)), closest]
+    own = labels[check]
+    move = (d_closest < upper[check]) | ((d_closest == upper[check]) & (cols[closest] < own))
+
+    # Swap the old cluster's exact distance into the lower bounds of the points that move.
+    i, new = check[move], cols[closest[move]]
+    lower[i, own[move]] = upper[i]
+    lower[i, new] = np.inf
+    upper[i] = d_closest[move]
+    labels[i] = new
+
+    return labels_to_indicator(labels, K), (labels, upper, lower, exact, B)
+
+
+def _bd_exact_bounds(B, W):
+    """ Assigns every point to the closest cluster and sets the bounds of _bd_updateA_bounded() to the
+    exact distances. """
+
+    lower = np.sqrt(_bd_distances(B, W))
+    n, K = lower.shape
+    labels = lower.argmin(axis = 1)
+    upper = lower[np.arange(n), labels]
+    # The lower bound of a point's own cluster is not used.
+    lower[np.arange(n), labels] = np.inf
+
+    return labels_to_indicator(labels, K), (labels, upper, lower, np.ones(n, dtype=bool), B)
+
+
+def _Y(A, W, weights=None):
     """ The feature cluster matrix B is updated using formula 11 from Li (2005). This is done
     by computing a 'probability matrix' Y where the kj-th entry represents the probability
     feature j is in the k-th cluster. The updated matrix B is the same shape as Y and contains
@@ -147,6 +291,32 @@ def _Y(A, W):
         data cluster matrix
     W : np.array
         data matrix
+    weights : np.array, optional
+        multiplicity of each row of W, by default None
+    
+    Returns
+    -------
+    np.array
+        probability matrix
+    """
+
+    if weights is not None:
+        A = A*weights.reshape((-1,1))         # Count each point as many times as it is weighted.
+
+    # Compute Y matrix from the dot product matrix of rows of A and W and the number of points in each cluster.
+    return _normalize_counts(np.dot(A.T, W), A.sum(axis = 0))
+
+
+def _normalize_counts(S, n_k):
+    """ Computes the probability matrix Y of _Y() from the K x m matrix of counts S = A'W and
+    the number of points n_k in each cluster. Rows of empty clusters are set to zero. 
+    
+    Parameters
+    ----------
+    S : np.array
+        count matrix A'W
+    n_k : np.array
+        number of points in each cluster
     
     Returns
     -------
@@ -154,15 +324,15 @@ def _Y(A, W):
         probability matrix
     """
 
-    n_k = A.sum(axis = 0)                 # Compute number of points in each cluster.
+    n_k = np.array(n_k, dtype=float)
     n_k[np.where(n_k == 0)[0]] = np.inf   # Set zero entries to inf to zero out reciprocal. 
     r = 1 / n_k                           # Compute reciprocal. 
-    r.shape = (A.shape[1],1)              # Reshape for broadcasting. 
+    r.shape = (len(n_k),1)                # Reshape for broadcasting. 
 
-    return np.dot(A.T, W)*r                  # Compute Y matrix as dot product matrix of rows of A and W. 
+    return S*r
 
 
-def _bd_updateB(A,W):
+def _bd_updateB(A,W, weights=None):
     """ Updated feature cluster matrix B. Applies the _Y() and B set to the matrix the same shape
     as Y but with 1's in the entries corresponding to where Y[>=0.5] and 0's elsewhere.
     
@@ -176,6 +346,8 @@ def _bd_updateB(A,W):
         old data cluster matrix
     W : np.array
         data matrix
+    weights : np.array, optional
+        multiplicity of each row of W, by default None
     
     Returns
     -------
@@ -184,7 +356,12 @@ def _bd_updateB(A,W):
     """
 
     
-    Y = _Y(A, W)
+    return _Y_to_B(_Y(A, W, weights))
+
+
+def _Y_to_B(Y):
+    """ Computes the feature cluster matrix B from the probability matrix Y, see _bd_updateB(). """
+
     B_new = np.greater_equal(Y, 0.5).T    # Update B matrix. 
     
     #### setting all True rows to False ####
@@ -206,7 +383,7 @@ def _bd_updateB(A,W):
     return B_new
     
 
-def run_bd_BMD(A,W, max_iter=100, verbose=False):
+def run_bd_BMD(A,W, max_iter=100, verbose=False, weights=None, W_cols=None, accelerate=False, callback=None, deadline=None, checkpoint=None, empty_cluster=None):
     """Executes clustering Algorithm 2 from Li (2005). 
     
     Parameters
@@ -219,6 +396,25 @@ def run_bd_BMD(A,W, max_iter=100, verbose=False):
         maximum number of algorithm iterations, by default 100
     verbose : bool, optional
         print progress and objective function value, by default False
+    weights : np.array, optional
+        multiplicity of each row of W, e.g. the counts of collapsed duplicate rows, by default None
+    W_cols : np.array, optional
+        column-major float copy of W (see utils.column_major()) used by the B update and objective
+        function instead of W, by default None
+    accelerate : bool, optional
+        skip distance computations using triangle inequality bounds (see _bd_updateA_bounded()), by default False
+    callback : callable, optional
+        function called with the number of iterations and the objective function value after every iteration
+        that improves the objective, the optimization stops if it returns True, by default None
+    deadline : bmdcluster.utils.Deadline, optional
+        time budget checked before each update, the last completed iteration is returned once it expires,
+        by default None
+    checkpoint : bmdcluster.persistence.Checkpointer, optional
+        saves the state after every iteration that improves the objective when :code:`checkpoint.due()`,
+        by default None
+    empty_cluster : bmdcluster.utils.EmptyClusters, optional
+        policy applied to the data clusters left empty by each A update, by default None which keeps them. The 
+        A and B updates of later iterations skip the dropped clusters, which are empty columns of A and B.
     
     Returns
     -------
@@ -230,21 +426,45 @@ def run_bd_BMD(A,W, max_iter=100, verbose=False):
         final feature cluster matrix
     """
     
-    
-    B = _bd_updateB(A,W)
-    O_old = _bd_objective(A, B, W)
+    # The A update reads the rows of W, the B update and objective reduce over its columns.
+    W_B = W if W_cols is None else W_cols
 
+    K = A.shape[1]
+    alive = None if empty_cluster is None else empty_cluster.alive(K)
+
+    B = expand_columns(_bd_updateB(select_columns(A, alive),W_B, weights), alive, K)
+    O_old = _bd_objective(A, B, W_B, weights)
+
+    O_new = O_old
     n_iter = 0
+    bounds = None
 
-    while n_iter < max_iter:
-        A = _bd_updateA(A,B,W)
-        B = _bd_updateB(A,W)
-        O_new = _bd_objective(A,B,W)
+    while n_iter < max_iter and not expired(deadline):
+        A_k, B_k = select_columns(A, alive), select_columns(B, alive)
+        if accelerate:
+            A_new, bounds = _bd_updateA_bounded(A_k,B_k,W, bounds)
+        else:
+            A_new = _bd_updateA(A_k,B_k,W)
+        if expired(deadline):
+            break
+        if empty_cluster is not None:
+            n_events = empty_cluster.n_reseeded + len(empty_cluster.dropped)
+            A_new, alive = empty_cluster.update(A_new, alive, lambda A_k: _bd_point_costs(A_k, B_k, W, weights))
+            if empty_cluster.n_reseeded + len(empty_cluster.dropped) > n_events:
+                # the bounds no longer match the clusters
+                bounds = None
+        A = expand_columns(A_new, alive, K)
+        B = expand_columns(_bd_updateB(A_new,W_B, weights), alive, K)
+        O_new = _bd_objective(A,B,W_B, weights)
         if O_new < O_old:
             O_old = O_new
             if verbose:
                 print(ITER_MESSAGE.format(n_iter, O_new))
             n_iter += 1
+            if checkpoint is not None and checkpoint.due(n_iter):
+                checkpoint.save(n_iter, O_new, A, B)
+            if callback is not None and callback(n_iter, O_new):
+                break
         else:
             break
 
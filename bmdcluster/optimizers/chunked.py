@@ -0,0 +1,383 @@
+import queue
+import threading
+
+import numpy as np
+
+from bmdcluster.utils import labels_to_indicator, expired
+from .blockdiagonalBMD import _bd_distances, _normalize_counts, _Y_to_B, ITER_MESSAGE
+from .generalBMD import _affiliation_scores, _score_labels, _score_tol, _counts_to_X, _counts_to_feature_labels, _expand_X
+
+"""
+This module contains out-of-core variants of the block diagonal (Algorithm 2) and general (Algorithm 1)
+BMD algorithms for data matrices that do not fit in memory, such as an np.memmap of a file on disk.
+
+Each iteration makes a single pass over W in blocks of rows. The points in a block are assigned to data
+clusters using the current feature clusters and the block's contribution to the sufficient statistics
+
+ S: the K x m count matrix A'W
+ p: the number of points in each data cluster, A.sum(axis=0)
+
+is accumulated. B, X and the value of the objective function are computed from S and p alone, so only
+the vector of data cluster labels and O(Km) statistics are held in memory besides the current block.
+The objective uses
+
+ ||W - A.E||^2 = SUM W^2 - 2*SUM S*E + SUM_{k} p[k]*|E[k,:]|^2
+
+where E = B' (block diagonal) or E = X.B' (general), which holds because each point belongs to at most
+one cluster. While a block is being processed, the next one is read by a background thread.
+
+The data clusters are represented by a vector of labels with -1 marking unassigned points.
+"""
+
+# number of rows per block if no memory budget is given
+DEFAULT_CHUNK_ROWS = 2**14
+
+
+def chunk_rows(W, n_clusters, max_memory=None):
+    """Computes the number of rows per block so that the working memory of the blocks in flight
+    stays within max_memory bytes. Each row needs its raw values, a float copy and a row of
+    n_clusters distances, and two blocks are in memory at once when prefetching.
+
+    Parameters
+    ----------
+    W : array-like
+        n x m data matrix
+    n_clusters : int
+        number of data clusters
+    max_memory : int, optional
+        memory budget in bytes, by default None
+
+    Returns
+    -------
+    int
+        number of rows per block
+    """
+
+    if max_memory is None:
+        return DEFAULT_CHUNK_ROWS
+
+    m = W.shape[1]
+    row_bytes = m*np.dtype(W.dtype).itemsize + 8*(m + n_clusters)
+
+    return max(1, int(max_memory // (2*row_bytes)))
+
+
+def _put(q, item, stop):
+    """Puts an item on the queue unless the consumer has stopped, returns False if it has."""
+
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+
+    return False
+
+
+def _read_chunks(W, chunk_size, q, stop):
+    """Reads blocks of rows of W into memory and puts them on the queue. A None item marks
+    the end of W and an exception is passed on to the consumer. """
+
+    try:
+        for start in range(0, W.shape[0], chunk_size):
+            chunk = W[start:start+chunk_size]
+            # copy blocks of memory-mapped and other on-disk arrays to read them in this thread
+            chunk = chunk if type(chunk) is np.ndarray else np.array(chunk)
+            if not _put(q, (start, chunk), stop):
+                return
+        _put(q, None, stop)
+    except Exception as e:
+        _put(q, e, stop)
+
+
+def iter_chunks(W, chunk_size=DEFAULT_CHUNK_ROWS, prefetch=True):
+    """Iterates over blocks of rows of W. With prefetching, the next block is read by a
+    background thread while the current one is processed.
+
+    Parameters
+    ----------
+    W : array-like
+        n x m data matrix supporting slicing of rows, e.g. np.array or np.memmap
+    chunk_size : int, optional
+        number of rows per block, by default DEFAULT_CHUNK_ROWS
+    prefetch : bool, optional
+        read the next block in a background thread, by default True
+
+    Yields
+    ------
+    int
+        index of the first row of the block
+    np.array
+        block of rows
+    """
+
+    if not prefetch:
+        for start in range(0, W.shape[0], chunk_size):
+            yield start, np.asarray(W[start:start+chunk_size])
+        return
+
+    q = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    reader = threading.Thread(target=_read_chunks, args=(W, chunk_size, q, stop), daemon=True)
+    reader.start()
+
+    try:
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        reader.join()
+
+
+def _accumulate(W_chunk, labels, n_clusters, weights=None):
+    """Computes the contribution of a block of rows to the sufficient statistics.
+
+    Parameters
+    ----------
+    W_chunk : np.array
+        block of rows of W
+    labels : np.array
+        data cluster labels of the rows in the block
+    n_clusters : int
+        number of data clusters
+    weights : np.array, optional
+        multiplicity of each row in the block, by default None
+
+    Returns
+    -------
+    np.array
+        count matrix A'W of the block
+    np.array
+        number of points in each data cluster
+    float
+        sum of squares of the entries of the block
+    """
+
+    A = labels_to_indicator(labels, n_clusters)
+    W_sq = np.square(W_chunk, dtype=float).sum(axis=1)
+
+    if weights is not None:
+        A = A*weights.reshape((-1,1))
+        W_sq = W_sq*weights
+
+    return np.dot(A.T, W_chunk), A.sum(axis=0), W_sq.sum()
+
+
+def _pass(W, labels, n_clusters, assign=None, weights=None, chunk_size=DEFAULT_CHUNK_ROWS, prefetch=True, deadline=None):
+    """Makes one pass over W, optionally reassigning the points with assign(W_chunk), and
+    accumulates the sufficient statistics of the (new) labels. Returns None if the deadline
+    expires before the pass is complete. """
+
+    S = np.zeros((n_clusters, W.shape[1]))
+    p = np.zeros(n_clusters)
+    total = 0.0
+
+    for start, W_chunk in iter_chunks(W, chunk_size, prefetch):
+        if expired(deadline):
+            return None
+        stop = start + W_chunk.shape[0]
+        if assign is not None:
+            labels[start:stop] = assign(W_chunk)
+        w = None if weights is None else weights[start:stop]
+        S_chunk, p_chunk, total_chunk = _accumulate(W_chunk, labels[start:stop], n_clusters, w)
+        S += S_chunk
+        p += p_chunk
+        total += total_chunk
+
+    return labels, S, p, total
+
+
+def _counts_objective(S, p, E, total):
+    """ Computes the objective function ||W - A.E|| from the sufficient statistics. """
+
+    E = np.asarray(E, dtype=float)
+    O = total - 2*np.sum(S*E) + np.dot(p, np.square(E).sum(axis=1))
+    return np.sqrt(max(O, 0))
+
+
+def _bd_assign(B):
+    """ Returns a function assigning a block of rows to the closest cluster, see _bd_updateA(). """
+    return lambda W_chunk: _bd_distances(B, W_chunk).argmin(axis=1)
+
+
+def _assign(B, X):
+    """ Returns a function assigning a block of rows to clusters by affiliation score, see _updateA().
+    Outliers are labeled -1. """
+
+    tol = _score_tol(B)
+
+    def assign(W_chunk):
+        return _score_labels(_affiliation_scores(B, X, W_chunk), tol)
+
+    return assign
+
+
+def run_bd_BMD_chunked(labels, W, n_clusters, max_iter=100, verbose=False, weights=None, chunk_size=DEFAULT_CHUNK_ROWS, prefetch=True, callback=None, deadline=None, checkpoint=None):
+    """Executes clustering Algorithm 2 from Li (2005) streaming W in blocks of rows. Gives the same
+    result as run_bd_BMD().
+
+    Parameters
+    ----------
+    labels : np.array
+        initial data cluster labels, -1 for unassigned points
+    W : array-like
+        binary data matrix, e.g. np.memmap
+    n_clusters : int
+        number of data clusters
+    max_iter : int, optional
+        maximum number of algorithm iterations, by default 100
+    verbose : bool, optional
+        print progress and objective function value, by default False
+    weights : np.array, optional
+        multiplicity of each row of W, by default None
+    chunk_size : int, optional
+        number of rows per block, by default DEFAULT_CHUNK_ROWS
+    prefetch : bool, optional
+        read the next block in a background thread, by default True
+    callback : callable, optional
+        function called with the number of iterations and the objective function value after every iteration
+        that improves the objective, the optimization stops if it returns True, by default None
+    deadline : bmdcluster.utils.Deadline, optional
+        time budget checked before each update, the last completed iteration is returned once it expires,
+        by default None
+    checkpoint : bmdcluster.persistence.Checkpointer, optional
+        saves the state after every iteration that improves the objective when :code:`checkpoint.due()`,
+        by default None
+
+    Returns
+    -------
+    float
+        final value of objective function
+    np.array
+        final data cluster labels
+    np.array
+        final feature cluster matrix
+    """
+
+    labels = np.array(labels)
+    kwargs = dict(weights=weights, chunk_size=chunk_size, prefetch=prefetch)
+
+    _, S, p, total = _pass(W, labels, n_clusters, **kwargs)
+    B = _Y_to_B(_normalize_counts(S, p))
+    O_old = _counts_objective(S, p, B.T, total)
+
+    O_new = O_old
+    n_iter = 0
+
+    while n_iter < max_iter and not expired(deadline):
+        # the labels are reassigned in place, keep the last completed iteration in case the pass is cut short
+        labels_old = None if deadline is None else labels.copy()
+        result = _pass(W, labels, n_clusters, assign=_bd_assign(B), deadline=deadline, **kwargs)
+        if result is None:
+            labels = labels_old
+            break
+        labels, S, p, total = result
+        B = _Y_to_B(_normalize_counts(S, p))
+        O_new = _counts_objective(S, p, B.T, total)
+        if O_new < O_old:
+            O_old = O_new
+            if verbose:
+                print(ITER_MESSAGE.format(n_iter, O_new))
+            n_iter += 1
+            if checkpoint is not None and checkpoint.due(n_iter):
+                checkpoint.save(n_iter, O_new, labels, B)
+            if callback is not None and callback(n_iter, O_new):
+                break
+        else:
+            break
+
+    if verbose:
+        print("Convergence reached after {0} iterations".format(n_iter+1))
+
+    return O_new, labels, B
+
+
+def run_BMD_chunked(labels, B, W, n_clusters, max_iter=100, verbose=False, weights=None, chunk_size=DEFAULT_CHUNK_ROWS, prefetch=True, callback=None, deadline=None, checkpoint=None):
+    """Executes clustering Algorithm 1 from Li (2005) streaming W in blocks of rows. Gives the same
+    result as run_BMD() up to floating point round-off.
+
+    Parameters
+    ----------
+    labels : np.array
+        initial data cluster labels, -1 for unassigned points
+    B : np.array
+        initial feature cluster matrix or vector of feature labels
+    W : array-like
+        binary data matrix, e.g. np.memmap
+    n_clusters : int
+        number of data clusters
+    max_iter : int, optional
+        maximum number of algorithm iterations, by default 100
+    verbose : bool, optional
+        print progress and objective function value, by default False
+    weights : np.array, optional
+        multiplicity of each row of W, by default None
+    chunk_size : int, optional
+        number of rows per block, by default DEFAULT_CHUNK_ROWS
+    prefetch : bool, optional
+        read the next block in a background thread, by default True
+    callback : callable, optional
+        function called with the number of iterations and the objective function value after every iteration
+        that improves the objective, the optimization stops if it returns True, by default None
+    deadline : bmdcluster.utils.Deadline, optional
+        time budget checked before each update, the last completed iteration is returned once it expires,
+        by default None
+    checkpoint : bmdcluster.persistence.Checkpointer, optional
+        saves the state after every iteration that improves the objective when :code:`checkpoint.due()`,
+        by default None
+
+    Returns
+    -------
+    float
+        final value of objective function
+    np.array
+        final data cluster labels
+    np.array
+        final feature cluster matrix, a vector of feature labels if B is a vector
+    np.array
+        final cluster centroid matrix
+    """
+
+    labels = np.array(labels)
+    kwargs = dict(weights=weights, chunk_size=chunk_size, prefetch=prefetch)
+
+    _, S, p, total = _pass(W, labels, n_clusters, **kwargs)
+    X = _counts_to_X(S, p, B)
+    O_old = _counts_objective(S, p, _expand_X(X, B), total)
+
+    O_new = O_old
+    n_iter = 0
+
+    while n_iter < max_iter and not expired(deadline):
+        labels_old = None if deadline is None else labels.copy()
+        result = _pass(W, labels, n_clusters, assign=_assign(B, X), deadline=deadline, **kwargs)
+        if result is None:
+            labels = labels_old
+            break
+        labels, S, p, total = result
+        feature_labels = _counts_to_feature_labels(S, p, X)
+        B = feature_labels if B.ndim == 1 else labels_to_indicator(feature_labels, B.shape[1])
+        X = _counts_to_X(S, p, B)
+        O_new = _counts_objective(S, p, _expand_X(X, B), total)
+        if O_new < O_old:
+            O_old = O_new
+            if verbose:
+                print(ITER_MESSAGE.format(n_iter, O_new))
+            n_iter += 1
+            if checkpoint is not None and checkpoint.due(n_iter):
+                checkpoint.save(n_iter, O_new, labels, B)
+            if callback is not None and callback(n_iter, O_new):
+                break
+        else:
+            break
+
+    if verbose:
+        print("Convergence reached after {0} iterations".format(n_iter+1))
+
+    return O_new, labels, B, X
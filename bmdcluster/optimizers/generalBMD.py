@@ -1,5 +1,7 @@
 import numpy as np
 
+from bmdcluster.utils import expired, select_columns, expand_columns
+
 """
 This module contains functions that implement the general variant of the Binary Matrix Decomposition (BMD) method 
 for clustering binary data as presented by Tao Li in "A General Model for Clustering Binary Data" (2005). Two algorithms
@@ -24,6 +26,8 @@ General Nomenclature:
  B: feature cluster indicator matrix. 
     m x C binary indicator matrix encoding the cluster membership of the features. 
     Each feature can belong to exactly one cluster, so each row consists of zeros except for a single 1.  
+    B may also be given as a vector of m feature labels (-1 for outliers) standing for an m x m indicator 
+    matrix. This represents the identity initialization without allocating an m x m matrix. 
  X: a K x C matrix that encodes the relationship between data clusters and feature clusters.
 
 """
@@ -31,12 +35,110 @@ General Nomenclature:
 ITER_MESSAGE = "Iteration: {0} ............. Cost: {1:.3f}"
 
 
-def _objective(A,B,X,W):
-    """ Computes the objective function for the general BMD algorithm. """
-    return np.linalg.norm(W - np.dot(A, np.dot(X,B.T)))
+def _feature_sums(M, B, feature_weights=None):
+    """Computes the product M.B, which sums the columns of M over each feature cluster. 
+    
+    B is either an m x C feature cluster indicator matrix or a vector of m feature labels, 
+    where a label of -1 marks an outlier feature. A label vector stands for an indicator matrix
+    with C = m columns, which is how the identity initialization of B is represented without
+    allocating an m x m matrix. For a label vector the product is a selection and summation 
+    of columns rather than a matrix product.
+    
+    Parameters
+    ----------
+    M : np.array
+        matrix with m columns
+    B : np.array
+        feature cluster indicator matrix or vector of feature labels
+    feature_weights : np.array, optional
+        multiplicity of each feature, by default None
+    
+    Returns
+    -------
+    np.array
+        matrix with C columns
+    """
+
+    if B.ndim == 2:
+        if feature_weights is not None:
+            B = B*feature_weights.reshape((-1,1))   # Count each feature as many times as it is weighted.
+        return np.dot(M, B)
+
+    S = np.zeros((M.shape[0], len(B)))
+
+    keep = np.where(B >= 0)[0]
+    M = M[:, keep] if feature_weights is None else M[:, keep]*feature_weights[keep]
+
+    # Sort features by cluster and sum the columns of each contiguous run of labels.
+    order = np.argsort(B[keep], kind='stable')
+    labels = B[keep][order]
+    starts = np.where(np.r_[True, labels[1:] != labels[:-1]])[0]
+    if len(starts) > 0:
+        S[:, labels[starts]] = np.add.reduceat(M[:, order], starts, axis=1)
+
+    return S
+
+
+def _feature_counts(B, feature_weights=None):
+    """Computes the number of features in each feature cluster, B.sum(axis=0). B is an indicator
+    matrix or a vector of feature labels (see _feature_sums()). """
+
+    if B.ndim == 2:
+        if feature_weights is not None:
+            B = B*feature_weights.reshape((-1,1))
+        return B.sum(axis = 0)
+
+    keep = B >= 0
+    w = None if feature_weights is None else feature_weights[keep]
+    return np.bincount(B[keep], weights=w, minlength=len(B)).astype(float)
+
+
+def _feature_mask(B, feature_weights=None):
+    """Returns the weight of each feature in the affiliation scores: its multiplicity or 0 if 
+    the feature is an outlier that belongs to no cluster. """
+
+    v = (B.sum(axis = 1) if B.ndim == 2 else B >= 0).astype(float)
+    if feature_weights is not None:
+        v = v*feature_weights
+    return v
+
+
+def _expand_X(X, B):
+    """Computes X.B', the centroid of each data cluster on each feature. For a vector of
+    feature labels this is a selection of the columns of X, outlier features are set to 0. """
+
+    if B.ndim == 2:
+        return np.dot(X, B.T)
+
+    E = X[:, np.maximum(B, 0)]
+    E[:, B < 0] = 0
+    return E
+
+
+def _objective(A,B,X,W, weights=None, feature_weights=None):
+    """ Computes the objective function for the general BMD algorithm. Rows and columns are weighted 
+    by :code:`weights` and :code:`feature_weights` if given. """
+    R = W - np.dot(A, _expand_X(X, B))
+    if weights is not None:
+        R = R*np.sqrt(weights).reshape((-1,1))
+    if feature_weights is not None:
+        R = R*np.sqrt(feature_weights)
+    return np.linalg.norm(R)
+
+
+def _point_costs(A,B,X,W, weights=None, feature_weights=None):
+    """ Term of each point in the objective function, the squared distance to the centroid of its cluster
+    over the features that are not outliers. Points in no cluster are compared to 0. """
+    c = np.dot(np.square(W - np.dot(A, _expand_X(X, B))), _feature_mask(B, feature_weights))
+    return c if weights is None else c*weights
 
 
-def _is_outlier(M):
+# relative tolerance of the comparison of affiliation scores: scores within TIE_TOL times the scale of the scores
+# of the lowest score are tied, so that round-off in the expanded forms of the scores neither breaks nor creates ties
+TIE_TOL = 1e-10
+
+
+def _is_outlier(M, tol=0):
     """Determines if a point is an outlier if the affiliation scores between
     a feature/data point and a cluster are all the same. Done by checking
     if all entries in a row of the affiliation score matrix are equal. Returns
@@ -46,16 +148,43 @@ def _is_outlier(M):
     ----------
     M : np.array
         cluster affiliation matrix for features or data points
+    tol : float, optional
+        entries within tol of the smallest entry of their row are equal to it, by default 0
     
     Returns
     -------
     np.array
         1D boolean array
     """
-    return np.apply_along_axis(lambda x: len(x) == np.sum(x == np.min(x)), axis=1, arr=M)
+    return np.all(M <= M.min(axis = 1).reshape((-1,1)) + tol, axis = 1)
+
+
+def _score_labels(M, tol=0):
+    """Assigns each row of the affiliation score matrix M to the cluster with the lowest score. Scores within
+    tol of the lowest are tied with it and the lowest index among them wins, like np.argmin(). Rows whose 
+    scores are all tied are outliers labeled -1 (see _is_outlier()).
+    
+    Parameters
+    ----------
+    M : np.array
+        cluster affiliation matrix for features or data points
+    tol : float, optional
+        absolute tolerance of the comparison of the scores, by default 0
+    
+    Returns
+    -------
+    np.array
+        vector of cluster labels
+    """
+
+    tied = M <= M.min(axis = 1).reshape((-1,1)) + tol
+    labels = tied.argmax(axis = 1)
+    labels[tied.all(axis = 1)] = -1
+
+    return labels
 
 
-def _updateX(A,B,W):
+def _updateX(A,B,W, weights=None, feature_weights=None):
     """Updates the cluster centroid matrix X given A,B, and W according to Equation 5 in Li (2005).
     
     The kc-th entry of X is the sum of the entries of W in the kth data cluster and cth feature cluster 
@@ -67,9 +196,13 @@ def _updateX(A,B,W):
     A : np.array
         old data cluster assignment matrix
     B : np.array
-        old feature cluster assignment matrix
+        old feature cluster assignment matrix or vector of feature labels
     W : np.array
         data matrix
+    weights : np.array, optional
+        multiplicity of each row of W, by default None
+    feature_weights : np.array, optional
+        multiplicity of each column of W, by default None
     
     Returns
     -------
@@ -77,65 +210,88 @@ def _updateX(A,B,W):
         updated cluster correspondence matrix X
     """
 
+    if weights is not None:
+        A = A*weights.reshape((-1,1))   # Count each point as many times as it is weighted.
+
     # Compute number of points in each data cluster by summing the rows of A.
-    p = A.sum(axis = 0)
+    return _counts_to_X(np.dot(A.T, W), A.sum(axis = 0), B, feature_weights)
+
+
+def _counts_to_X(S, p, B, feature_weights=None):
+    """Computes the cluster centroid matrix X of _updateX() from the K x m matrix of counts 
+    S = A'W and the number of points p in each data cluster.
+    
+    Parameters
+    ----------
+    S : np.array
+        count matrix A'W
+    p : np.array
+        number of points in each data cluster
+    B : np.array
+        feature cluster assignment matrix or vector of feature labels
+    feature_weights : np.array, optional
+        multiplicity of each column of W, by default None
+    
+    Returns
+    -------
+    np.array
+        cluster centroid matrix X
+    """
+
     # Compute number of points in each feature cluster by rumming rows of B. 
-    q = B.sum(axis = 0) 
+    q = _feature_counts(B, feature_weights)
     
     # Create matrix of normalization entries as outer product of cluster size vectors. 
     denom = np.outer(p, q)
     
     # Compute updated X matrix by the formula (1/pq')*A'WB, setting nan's resulting from zero division to zero. 
-    X_new = np.divide(1, denom, out = np.zeros_like(denom), where = denom!=0)*np.dot(A.T, np.dot(W,B))
+    X_new = np.divide(1, denom, out = np.zeros_like(denom), where = denom!=0)*_feature_sums(S, B, feature_weights)
     return X_new
 
 
-def _m_ik(indices, W, X, B):
+def _affiliation_scores(B, X, W, feature_weights=None):
     """The data cluster indicator matrix A is updated using Formula 6 in Li (2005), which uses 
     an 'affiliation score' that can be thought of as a distance between the i-th point and
     the center of the k-th data cluster. The point is then assigned to the cluster with the
-    lowest score. 
-    
-    This function computes this score for a given data point i and data cluster k by summing
-    over the C feature clusters while holding k and i fixed using the following formula:
+    lowest score. The score for data point i and data cluster k sums over the C feature clusters:
     
         m[i,k] = SUM_{c} [ (W[i,:] - X[k,c])'B[:,c] ]^2
     
+    Since each feature belongs to at most one cluster this equals SUM_{j} v[j]*(W[i,j] - E[k,j])^2
+    where E = X.B' and v[j] is 1 for assigned features and 0 for outliers. Expanding the square,
+    the scores for all points and clusters are computed with one matrix product. The term 
+    SUM_{j} v[j]*W[i,j]^2 is the same for every cluster and is left out.
+    
     Parameters
     ----------
-    indices : tuple
-        (index of data point, index of data cluster)
-    W : np.array
-        data matrix
+    B : np.array
+        feature cluster assignment matrix or vector of feature labels
     X : np.array
         cluster centroid matrix
-    B : np.array
-        feature cluster assignment matrix
+    W : np.array
+        data matrix
+    feature_weights : np.array, optional
+        multiplicity of each column of W, by default None
     
     Returns
     -------
-    float
-        affiliation score between the ith data point and the kth cluster
+    np.array
+        n x K matrix of affiliation scores, up to a constant in each row
     """
 
-    
-    i, k = indices # get indices
+    v = _feature_mask(B, feature_weights)
+    E = _expand_X(X, B)
 
-    C = X.shape[1] # number of feature clusters
-    m_ik = 0
-    
-    # W[i,:] - ith row of W
-    # X[k,c] - kc-th entry of X (kc-th centriod)
-    # B[:,c] - cth column of B
-    
-    # sum over the feature clusters C
-    for c in range(C):  
-        m_ik += np.dot(np.square(W[i,:] - X[k,c]), B[:,c])
+    return np.dot(np.square(E), v) - 2*np.dot(W*v, E.T)
 
-    return m_ik
-    
 
-def _updateA(A,B,X,W):
+def _score_tol(B, feature_weights=None):
+    """ Tolerance of the comparison of the affiliation scores of the data points, TIE_TOL times the weight of
+    the features in the scores, which bounds the terms of the scores of binary data. """
+    return TIE_TOL*max(1.0, _feature_mask(B, feature_weights).sum())
+
+
+def _updateA(A,B,X,W, feature_weights=None):
     """Updates the matrix A by creating a matrix M of identical dimensions whose elements are 'affiliation scores'.
     For each row, a 1 is placed in the position of the smallest entry and the rest set to 0's. In the case
     of ties, the entire row is set to 0 following the convention set in Li and Zhu (2005) who term such 
@@ -146,11 +302,13 @@ def _updateA(A,B,X,W):
     A : np.array
         old data cluster assignment matrix
     B : np.array
-        old data feature assignment matrix
+        old data feature assignment matrix or vector of feature labels
     X : np.array
         old cluster centroid matrix
     W : np.array
         data matrix
+    feature_weights : np.array, optional
+        multiplicity of each column of W, by default None
     
     Returns
     -------
@@ -158,119 +316,109 @@ def _updateA(A,B,X,W):
         new data cluster assignment matrix
     """
 
-    
     n, K = A.shape
-    A_new = np.zeros((n,K))
-    
-    for i in range(n):                   # iterate over data (rows)
-        for k in range(K):               # iterate over features (columns)
-            A_new[i,k] = _m_ik((i,k), W,X,B)     
+    M = _affiliation_scores(B, X, W, feature_weights)
     
+    # Compute cluster assignments by taking argmin of each row, outliers are labeled -1. 
+    labels = _score_labels(M, _score_tol(B, feature_weights))
     
-    # Compute cluster assignments by taking argmin of each row. 
-    cluster_assignments = A_new.argmin(axis = 1)
-    # find outliers
-    is_outlier = _is_outlier(A_new)
-    
-    # Fill in new cluster indicator matrix A. 
-    for i, q in enumerate(cluster_assignments):
-        
-        if is_outlier[i]:          # Set row to 0's if outlier. 
-            A_new[i,:] = 0
-        else:                      # Set new cluster assignment otherwise. 
-            A_new[i,:], A_new[i,q] = 0,1
+    # Fill in new cluster indicator matrix A, leaving rows of outliers set to 0's. 
+    A_new = np.zeros((n,K))
+    A_new[np.where(labels >= 0)[0], labels[labels >= 0]] = 1
     
     return A_new
 
 
-def _r_jc(indices, W, X, A):
-    """ The feature cluster indicator matrix B is updated according to Formula 7 in Li (2005), which 
-    uses an 'affiliation score' of the same form as that used to update A. The feature is assigned
-    to the cluster with the lowest score. 
+# maximum number of feature affiliation scores held in memory at once by _updateB
+FEATURE_BLOCK_SIZE = 2**22
+
+
+def _updateB(A,B,X,W, weights=None):
+    """Updates the matrix B by creating a matrix M of identical dimensions whose elements are 'affiliation scores'.
+    For each row, a 1 is placed in the position of the smallest entry and the rest set to 0's. In the case
+    of ties, the entire row is set to 0 following the convention set in Li and Zhu (2005) who term such 
+    cases 'outliers'. 
     
-    This function computes this score for a given feature j and feature cluster c by summing
-    over the K data clusters while holding c and j fixed using the following formula:
+    The scores follow Formula 7 in Li (2005). The score for feature j and feature cluster c sums over 
+    the K data clusters:
     
         r[j,c] = SUM_{k} [ A[:,k]'(W[:,j] - X[k,c]) ]^2
     
+    Expanding the square and leaving out SUM_{k} A[:,k]'W[:,j]^2, which is the same for every 
+    cluster, gives r[j,c] = SUM_{k} p[k]*X[k,c]^2 - 2*(W'A.X)[j,c] where p[k] is the size of data 
+    cluster k. The scores are computed for blocks of features so that at most FEATURE_BLOCK_SIZE
+    scores are held in memory.
+    
     Parameters
     ----------
-    indices : tuple
-        (index of feature, index of feature cluster)
+    A : np.array
+        old data cluster indicator matrix
+    B : np.array
+        old feature cluster indicator matrix or vector of feature labels
+    X : np.array
+        old cluster centroid matrix
     W : np.array
         data matrix
-    X : np.array
-        cluster centroid matrix
-    A : np.array
-        data cluster indicator matrix
+    weights : np.array, optional
+        multiplicity of each row of W, by default None
     
     Returns
     -------
-    float
-        affiliation score for the jth feature in the cth cluster
+    np.array
+        new feature cluster assignment matrix B, or vector of feature labels if B is a vector
     """
 
-    j, c = indices
-    
-    K = X.shape[0]
-    
-    r_jc = 0
-    
-    # W[:,j] - jth column of W
-    # X[k,c] - kc-th entry of X (kc-th centriod)
-    # A[:,k] - kth column of A
-    
-    for k in range(K): 
-        r_jc += np.dot(A[:,k].T, np.square(W[:,j] - X[k,c]))
+    if weights is not None:
+        A = A*weights.reshape((-1,1))   # Count each point as many times as it is weighted.
+
+    labels = _counts_to_feature_labels(np.dot(A.T, W), A.sum(axis = 0), X)
+
+    if B.ndim == 1:
+        return labels
+
+    B_new = np.zeros((len(B), X.shape[1]))
+    B_new[np.where(labels >= 0)[0], labels[labels >= 0]] = 1
         
-    return r_jc
+    return B_new
 
 
-def _updateB(A,B,X,W):
-    """Updates the matrix B by creating a matrix M of identical dimensions whose elements are 'affiliation scores'.
-    For each row, a 1 is placed in the position of the smallest entry and the rest set to 0's. In the case
-    of ties, the entire row is set to 0 following the convention set in Li and Zhu (2005) who term such 
-    cases 'outliers'. 
+def _counts_to_feature_labels(S, p, X):
+    """Computes the feature labels of _updateB() from the K x m matrix of counts S = A'W and
+    the number of points p in each data cluster. Outliers are labeled -1.
     
     Parameters
     ----------
-    A : np.array
-        old data cluster indicator matrix
-    B : np.array
-        old feature cluster indicator matrix
+    S : np.array
+        count matrix A'W
+    p : np.array
+        number of points in each data cluster
     X : np.array
         old cluster centroid matrix
-    W : np.array
-        data matrix
     
     Returns
     -------
     np.array
-        new feature cluster assignment matrix B
+        vector of feature labels
     """
 
-    m, C = B.shape
-    B_new = np.zeros((m,C))
-
-    for j in range(m):                   # iteration over rows (features)
-        for c in range(C):               # iterate over columns (clusters)
-            B_new[j,c] = _r_jc((j,c), W,X,A)
-            
-    # Compute cluster assignments by taking argmin of each row. 
-    cluster_assignments = B_new.argmin(axis = 1)
-    # find outliers
-    is_outlier = _is_outlier(B_new)
-    
-    for i, q in enumerate(cluster_assignments):
-        if is_outlier[i]:                  # Set row to 0's if outlier. 
-            B_new[i,:] = 0                 
-        else:                              # Set new cluster assignment otherwise.
-            B_new[i,:], B_new[i,q] = 0, 1
-        
-    return B_new
+    m, C = S.shape[1], X.shape[1]
+    c_term = np.dot(p, np.square(X))        # SUM_{k} p[k]*X[k,c]^2
+
+    # The terms of the scores of binary data are bounded by the number of points.
+    tol = TIE_TOL*max(1.0, np.sum(p))
 
+    labels = np.full(m, -1)
+    step = max(1, FEATURE_BLOCK_SIZE // C)
 
-def run_BMD(A,B,W, max_iter=100, verbose = 1):
+    for j in range(0, m, step):
+        R = c_term - 2*np.dot(S[:, j:j+step].T, X)
+        # Compute cluster assignments by taking argmin of each row, outliers are labeled -1.
+        labels[j:j+step] = _score_labels(R, tol)
+
+    return labels
+
+
+def run_BMD(A,B,W, max_iter=100, verbose = 1, weights=None, feature_weights=None, W_cols=None, callback=None, deadline=None, checkpoint=None, empty_cluster=None):
     """Executes clustering Algorithm 1 from Li (2005). 
     
     Parameters
@@ -278,13 +426,32 @@ def run_BMD(A,B,W, max_iter=100, verbose = 1):
     A : np.array
         initial data cluster matrix
     B : np.array
-        initial feature cluster matrix
+        initial feature cluster matrix or vector of feature labels
     W : np.array
         binary data matrix
     max_iter : int, optional
         maximum number of algorithm iterations, by default 100
     verbose : int, optional
         print loss function and progress, by default 1
+    weights : np.array, optional
+        multiplicity of each row of W, e.g. the counts of collapsed duplicate rows, by default None
+    feature_weights : np.array, optional
+        multiplicity of each column of W, e.g. the counts of collapsed duplicate columns, by default None
+    W_cols : np.array, optional
+        column-major float copy of W (see utils.column_major()) used by the B and X updates and 
+        objective function instead of W, by default None
+    callback : callable, optional
+        function called with the number of iterations and the objective function value after every iteration
+        that improves the objective, the optimization stops if it returns True, by default None
+    deadline : bmdcluster.utils.Deadline, optional
+        time budget checked before each update, the last completed iteration is returned once it expires,
+        by default None
+    checkpoint : bmdcluster.persistence.Checkpointer, optional
+        saves the state after every iteration that improves the objective when :code:`checkpoint.due()`,
+        by default None
+    empty_cluster : bmdcluster.utils.EmptyClusters, optional
+        policy applied to the data clusters left empty by each A update, by default None which keeps them. The 
+        A updates of later iterations skip the dropped clusters, which are empty columns of A and rows of 0's of X.
     
     Returns
     -------
@@ -293,25 +460,46 @@ def run_BMD(A,B,W, max_iter=100, verbose = 1):
     np.array
         final data cluster matrix
     np.array
-        final feature cluster matrix
+        final feature cluster matrix, a vector of feature labels if B is a vector
+    np.array
+        final cluster centroid matrix
     """
 
-    
-    X = _updateX(A,B,W)
-    O_old = _objective(A, B, X, W)
+    # The A update reads the rows of W, the B and X updates and objective reduce over its columns.
+    W_B = W if W_cols is None else W_cols
+
+    X = _updateX(A,B,W_B, weights, feature_weights)
+    O_old = _objective(A, B, X, W_B, weights, feature_weights)
 
+    O_new = O_old
     n_iter = 0
+    K = A.shape[1]
+    alive = None if empty_cluster is None else empty_cluster.alive(K)
 
-    while n_iter < max_iter:
-        A = _updateA(A,B,X,W)
-        B = _updateB(A,B,X,W)
-        X = _updateX(A,B,W)
-        O_new = _objective(A,B,X,W)
+    while n_iter < max_iter and not expired(deadline):
+        X_k = X if alive is None else X[alive]
+        A_new = _updateA(select_columns(A, alive),B,X_k,W, feature_weights)
+        if expired(deadline):
+            break
+        if empty_cluster is not None:
+            A_new, alive = empty_cluster.update(A_new, alive, lambda A_k: _point_costs(A_k,B,X_k,W, weights, feature_weights))
+        # Dropped clusters have no points and do not change the B update.
+        A_new = expand_columns(A_new, alive, K)
+        B_new = _updateB(A_new,B,X,W_B, weights)
+        if expired(deadline):
+            break
+        A, B = A_new, B_new
+        X = _updateX(A,B,W_B, weights, feature_weights)
+        O_new = _objective(A,B,X,W_B, weights, feature_weights)
         if O_new < O_old:
             O_old = O_new
             if verbose:
                 print(ITER_MESSAGE.format(n_iter, O_new))
             n_iter += 1
+            if checkpoint is not None and checkpoint.due(n_iter):
+                checkpoint.save(n_iter, O_new, A, B)
+            if callback is not None and callback(n_iter, O_new):
+                break
         else:
             break
 
@@ -0,0 +1,382 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from bmdcluster.utils import labels_to_indicator, expired
+from .blockdiagonalBMD import _normalize_counts, _Y_to_B, ITER_MESSAGE
+from .generalBMD import _counts_to_X, _counts_to_feature_labels, _expand_X
+from .chunked import _pass, _counts_objective, _bd_assign, _assign, iter_chunks, DEFAULT_CHUNK_ROWS
+
+"""
+This module contains data-parallel variants of the block diagonal (Algorithm 2) and general (Algorithm 1)
+BMD algorithms that spread each iteration over worker processes.
+
+The rows of W are split into one contiguous partition per worker and each partition, its data cluster labels
+and row weights are copied once into multiprocessing.shared_memory segments that the workers attach to when
+they start. An iteration is a map-reduce over the partitions: the coordinator sends B (and X) to the workers,
+each worker reassigns the points of its partition in place and returns the partial sufficient statistics
+
+ S_p: the K x m count matrix A_p'W_p
+ p_p: the number of points in each data cluster
+
+and the sum of squares of its entries, see bmdcluster.optimizers.chunked. The coordinator adds them up in
+partition order and updates B, X and the objective function exactly like the out-of-core algorithms, so only
+O(Km) numbers per worker cross process boundaries each iteration.
+"""
+
+# partitions attached by a worker process, see _attach()
+_partitions = []
+
+
+def _create(shape, dtype):
+    """ Creates a shared memory segment holding an array of the given shape and type. """
+
+    dtype = np.dtype(dtype)
+    segment = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape))*dtype.itemsize, 1))
+    return segment, np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+
+def _open(name):
+    """Opens an existing shared memory segment without registering it with the resource tracker. Only the 
+    process creating a segment tracks and unlinks it: workers share its tracker, and a worker's registration
+    cannot be undone without also removing the creator's."""
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _attach(specs):
+    """ Attaches a process to the shared memory segments of the partitions, see _SharedPartitions. """
+
+    for spec in specs:
+        arrays = {}
+        for name, (segment_name, shape, dtype) in spec.items():
+            segment = _open(segment_name)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+            # the segment must outlive the array
+            arrays[name + '_segment'] = segment
+        _partitions.append(arrays)
+
+
+def _state_assign(state):
+    """ Returns the function assigning a block of rows with B (state = (B,)) or B and X (state = (B, X)), or None. """
+
+    if state is None:
+        return None
+    if len(state) == 1:
+        return _bd_assign(*state)
+    return _assign(*state)
+
+
+def _partition_pass(i, n_clusters, chunk_size, state=None):
+    """Reassigns the points of partition i with the state, if given, see _state_assign(), and returns the
+    sufficient statistics of the partition, see bmdcluster.optimizers.chunked._pass()."""
+
+    partition = _partitions[i]
+    _, S, p, total = _pass(partition['W'], partition['labels'], n_clusters, assign=_state_assign(state),
+                           weights=partition.get('weights'), chunk_size=chunk_size, prefetch=False)
+
+    return S, p, total
+
+
+def _add_stats(results):
+    """ Adds up the sufficient statistics (S, p, total) of the partitions in partition order. """
+
+    S, p, total = (np.array(value, dtype=float) for value in results[0])
+    for S_p, p_p, total_p in results[1:]:
+        S += S_p
+        p += p_p
+        total += total_p
+
+    return S, p, float(total)
+
+
+class _SharedPartitions:
+    """Copies W, the data cluster labels and the row weights into shared memory, one segment each per partition
+    of rows, and runs passes over the partitions in a pool of worker processes.
+
+    Parameters
+    ----------
+    W : array-like
+        binary data matrix, data on disk is copied in blocks of chunk_size rows
+    labels : np.array
+        initial data cluster labels, -1 for unassigned points
+    weights : np.array
+        multiplicity of each row of W, or None
+    n_jobs : int
+        number of partitions and worker processes, passes run in the calling process if 1
+    chunk_size : int
+        number of rows per block
+    """
+
+    def __init__(self, W, labels, weights, n_jobs, chunk_size):
+
+        n = W.shape[0]
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.bounds = np.linspace(0, n, n_jobs + 1).astype(int)
+        self.segments = []
+        self.arrays = []
+
+        try:
+            specs = [self._share_partition(W, labels, weights, lo, hi) for lo, hi in zip(self.bounds[:-1], self.bounds[1:])]
+            self._copy_rows(W)
+        except BaseException:
+            self.close()
+            raise
+
+        if n_jobs > 1:
+            self.executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach, initargs=(specs,))
+        else:
+            self.executor = None
+            _partitions.extend(self.arrays)
+
+    def _share_partition(self, W, labels, weights, lo, hi):
+        """ Creates the segments of the partition of rows lo:hi and returns their description. """
+
+        arrays, spec = {}, {}
+        values = {'W': ((hi - lo, W.shape[1]), W.dtype), 'labels': ((hi - lo,), np.int64)}
+        if weights is not None:
+            values['weights'] = ((hi - lo,), float)
+
+        for name, (shape, dtype) in values.items():
+            segment, arrays[name] = _create(shape, dtype)
+            self.segments.append(segment)
+            spec[name] = (segment.name, shape, np.dtype(dtype).str)
+
+        arrays['labels'][:] = labels[lo:hi]
+        if weights is not None:
+            arrays['weights'][:] = weights[lo:hi]
+        self.arrays.append(arrays)
+
+        return spec
+
+    def _copy_rows(self, W):
+        """ Copies the rows of W into the partitions one block at a time. """
+
+        for start, W_chunk in iter_chunks(W, self.chunk_size, prefetch=False):
+            stop = start + W_chunk.shape[0]
+            for (lo, hi), arrays in zip(zip(self.bounds[:-1], self.bounds[1:]), self.arrays):
+                if lo < stop and start < hi:
+                    a, b = max(lo, start), min(hi, stop)
+                    arrays['W'][a-lo:b-lo] = W_chunk[a-start:b-start]
+
+    def reduce(self, n_clusters, state=None):
+        """Runs a pass over every partition, reassigning the points if state is given, and returns the sum of
+        the sufficient statistics of the partitions.
+
+        Returns
+        -------
+        np.array
+            count matrix A'W
+        np.array
+            number of points in each data cluster
+        float
+            sum of squares of the entries of W
+        """
+
+        args = (range(self.n_jobs), [n_clusters]*self.n_jobs, [self.chunk_size]*self.n_jobs, [state]*self.n_jobs)
+        if self.executor is not None:
+            results = list(self.executor.map(_partition_pass, *args))
+        else:
+            results = list(map(_partition_pass, *args))
+
+        return _add_stats(results)
+
+    def labels(self):
+        """ Returns a copy of the data cluster labels of all partitions. """
+        return np.concatenate([arrays['labels'] for arrays in self.arrays])
+
+    def close(self):
+        """ Stops the workers and frees the shared memory segments. """
+
+        if getattr(self, 'executor', None) is not None:
+            self.executor.shutdown()
+        else:
+            _partitions.clear()
+
+        # the arrays must be released before their segments are closed
+        self.arrays = []
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _run_bd(partitions, n_clusters, max_iter, verbose, callback=None, deadline=None, checkpoint=None):
+    """Runs Algorithm 2 on partitions of the rows, any object with the reduce() and labels() methods of
+    _SharedPartitions, and returns the objective function value, the data cluster labels and B."""
+
+    S, p, total = partitions.reduce(n_clusters)
+    B = _Y_to_B(_normalize_counts(S, p))
+    O_old = _counts_objective(S, p, B.T, total)
+
+    O_new = O_old
+    n_iter = 0
+
+    while n_iter < max_iter and not expired(deadline):
+        S, p, total = partitions.reduce(n_clusters, (B,))
+        B = _Y_to_B(_normalize_counts(S, p))
+        O_new = _counts_objective(S, p, B.T, total)
+        if O_new < O_old:
+            O_old = O_new
+            if verbose:
+                print(ITER_MESSAGE.format(n_iter, O_new))
+            n_iter += 1
+            if checkpoint is not None and checkpoint.due(n_iter):
+                checkpoint.save(n_iter, O_new, partitions.labels(), B)
+            if callback is not None and callback(n_iter, O_new):
+                break
+        else:
+            break
+
+    if verbose:
+        print("Convergence reached after {0} iterations".format(n_iter+1))
+
+    return O_new, partitions.labels(), B
+
+
+def _run_general(partitions, B, n_clusters, max_iter, verbose, callback=None, deadline=None, checkpoint=None):
+    """Runs Algorithm 1 on partitions of the rows, see _run_bd(), and returns the objective function value,
+    the data cluster labels, B and X."""
+
+    S, p, total = partitions.reduce(n_clusters)
+    X = _counts_to_X(S, p, B)
+    O_old = _counts_objective(S, p, _expand_X(X, B), total)
+
+    O_new = O_old
+    n_iter = 0
+
+    while n_iter < max_iter and not expired(deadline):
+        S, p, total = partitions.reduce(n_clusters, (B, X))
+        feature_labels = _counts_to_feature_labels(S, p, X)
+        B = feature_labels if B.ndim == 1 else labels_to_indicator(feature_labels, B.shape[1])
+        X = _counts_to_X(S, p, B)
+        O_new = _counts_objective(S, p, _expand_X(X, B), total)
+        if O_new < O_old:
+            O_old = O_new
+            if verbose:
+                print(ITER_MESSAGE.format(n_iter, O_new))
+            n_iter += 1
+            if checkpoint is not None and checkpoint.due(n_iter):
+                checkpoint.save(n_iter, O_new, partitions.labels(), B)
+            if callback is not None and callback(n_iter, O_new):
+                break
+        else:
+            break
+
+    if verbose:
+        print("Convergence reached after {0} iterations".format(n_iter+1))
+
+    return O_new, partitions.labels(), B, X
+
+
+def run_bd_BMD_parallel(labels, W, n_clusters, max_iter=100, verbose=False, weights=None, n_jobs=2, chunk_size=DEFAULT_CHUNK_ROWS, callback=None, deadline=None, checkpoint=None):
+    """Executes clustering Algorithm 2 from Li (2005) with the rows of W partitioned over worker processes.
+    Gives the same result as run_bd_BMD().
+
+    Parameters
+    ----------
+    labels : np.array
+        initial data cluster labels, -1 for unassigned points
+    W : array-like
+        binary data matrix, e.g. np.memmap
+    n_clusters : int
+        number of data clusters
+    max_iter : int, optional
+        maximum number of algorithm iterations, by default 100
+    verbose : bool, optional
+        print progress and objective function value, by default False
+    weights : np.array, optional
+        multiplicity of each row of W, by default None
+    n_jobs : int, optional
+        number of worker processes, by default 2
+    chunk_size : int, optional
+        number of rows per block processed at once by a worker, by default DEFAULT_CHUNK_ROWS
+    callback : callable, optional
+        function called with the number of iterations and the objective function value after every iteration
+        that improves the objective, the optimization stops if it returns True, by default None
+    deadline : bmdcluster.utils.Deadline, optional
+        time budget checked before each iteration, the last completed iteration is returned once it expires,
+        by default None
+    checkpoint : bmdcluster.persistence.Checkpointer, optional
+        saves the state after every iteration that improves the objective when :code:`checkpoint.due()`,
+        by default None
+
+    Returns
+    -------
+    float
+        final value of objective function
+    np.array
+        final data cluster labels
+    np.array
+        final feature cluster matrix
+    """
+
+    with _SharedPartitions(W, labels, weights, n_jobs, chunk_size) as partitions:
+        return _run_bd(partitions, n_clusters, max_iter, verbose, callback, deadline, checkpoint)
+
+
+def run_BMD_parallel(labels, B, W, n_clusters, max_iter=100, verbose=False, weights=None, n_jobs=2, chunk_size=DEFAULT_CHUNK_ROWS, callback=None, deadline=None, checkpoint=None):
+    """Executes clustering Algorithm 1 from Li (2005) with the rows of W partitioned over worker processes.
+    Gives the same result as run_BMD() up to floating point round-off.
+
+    Parameters
+    ----------
+    labels : np.array
+        initial data cluster labels, -1 for unassigned points
+    B : np.array
+        initial feature cluster matrix or vector of feature labels
+    W : array-like
+        binary data matrix, e.g. np.memmap
+    n_clusters : int
+        number of data clusters
+    max_iter : int, optional
+        maximum number of algorithm iterations, by default 100
+    verbose : bool, optional
+        print progress and objective function value, by default False
+    weights : np.array, optional
+        multiplicity of each row of W, by default None
+    n_jobs : int, optional
+        number of worker processes, by default 2
+    chunk_size : int, optional
+        number of rows per block processed at once by a worker, by default DEFAULT_CHUNK_ROWS
+    callback : callable, optional
+        function called with the number of iterations and the objective function value after every iteration
+        that improves the objective, the optimization stops if it returns True, by default None
+    deadline : bmdcluster.utils.Deadline, optional
+        time budget checked before each iteration, the last completed iteration is returned once it expires,
+        by default None
+    checkpoint : bmdcluster.persistence.Checkpointer, optional
+        saves the state after every iteration that improves the objective when :code:`checkpoint.due()`,
+        by default None
+
+    Returns
+    -------
+    float
+        final value of objective function
+    np.array
+        final data cluster labels
+    np.array
+        final feature cluster matrix, a vector of feature labels if B is a vector
+    np.array
+        final cluster centroid matrix
+    """
+
+    with _SharedPartitions(W, labels, weights, n_jobs, chunk_size) as partitions:
+        return _run_general(partitions, B, n_clusters, max_iter, verbose, callback, deadline, checkpoint)
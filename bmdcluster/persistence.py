@@ -0,0 +1,244 @@
+"""
+Functions for saving fitted models in a compact on-disk format. A model is stored as a directory
+containing a JSON file with the model's class, parameters and library version, and one .npy file
+per array needed for inference. The .npy format keeps the array data aligned after a small header,
+so the arrays can be memory-mapped read-only and shared between many processes.
+
+This module also saves checkpoints of fits in progress. The values the optimizers compute at the start
+of an iteration, X and the objective function, are functions of A and B alone, so a checkpoint holds the
+data cluster labels, B (bit-packed if it is a matrix), the number of iterations, the state of the
+random number generator and a fingerprint of the data, and a fit resumed from it continues exactly as the
+interrupted fit would have.
+A checkpoint is a single .npz file, written to a temporary file and renamed so that an interrupted write
+never leaves a partial checkpoint.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+META_FILE = 'model.json'
+CHECKPOINT_FILE = 'checkpoint.npz'
+
+
+def _to_builtin(obj):
+    """Convert numpy scalars to builtin types for JSON serialization."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError("Object of type {0} is not JSON serializable".format(type(obj).__name__))
+
+
+def save_model(path, model_name, params, arrays, attributes=None, version=None):
+    """Save the arrays and metadata of a fitted model to a directory.
+
+    Parameters
+    ----------
+    path : str
+        directory to write the model to, created if it does not exist
+    model_name : str
+        name of the model class
+    params : dict
+        keyword arguments used to construct the model
+    arrays : dict
+        named arrays needed for inference
+    attributes : dict, optional
+        additional JSON serializable attributes of the fitted model, by default None
+    version : str, optional
+        version of the library that fitted the model, by default None
+    """
+
+    os.makedirs(path, exist_ok=True)
+
+    dtypes = dict()
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        np.save(os.path.join(path, name + '.npy'), arr)
+        dtypes[name] = arr.dtype.str
+
+    meta = {'format_version': FORMAT_VERSION,
+            'version': version,
+            'model': model_name,
+            'params': params,
+            'dtypes': dtypes,
+            'attributes': attributes or dict()}
+
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2, default=_to_builtin)
+
+
+def load_model(path, mmap=True):
+    """Load the arrays and metadata of a model saved with save_model().
+
+    Parameters
+    ----------
+    path : str
+        directory the model was saved to
+    mmap : bool, optional
+        memory-map the arrays read-only instead of reading them into memory, by default True
+
+    Returns
+    -------
+    dict
+        model metadata
+    dict
+        named arrays
+
+    Raises
+    ------
+    ValueError
+        If the model was saved in an unsupported format version
+    """
+
+    with open(os.path.join(path, META_FILE), 'r') as f:
+        meta = json.load(f)
+
+    if meta['format_version'] > FORMAT_VERSION:
+        raise ValueError("Unsupported model format version {0}".format(meta['format_version']))
+
+    arrays = dict()
+    for name, dtype in meta['dtypes'].items():
+        arr = np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None)
+        if arr.dtype.str != dtype:
+            raise ValueError("Array '{0}' has dtype {1}, expected {2}".format(name, arr.dtype.str, dtype))
+        arrays[name] = arr
+
+    return meta, arrays
+
+
+def save_checkpoint(path, n_iter, cost, labels, B, n_clusters, fingerprint=None):
+    """Atomically save the state of a fit to a directory, replacing any previous checkpoint.
+
+    Parameters
+    ----------
+    path : str
+        directory to write the checkpoint to, created if it does not exist
+    n_iter : int
+        number of completed iterations
+    cost : float
+        value of the objective function
+    labels : np.array
+        data cluster labels, -1 for points in no cluster
+    B : np.array
+        feature cluster matrix or vector of feature labels
+    n_clusters : int
+        number of data clusters
+    fingerprint : str, optional
+        fingerprint of the data being fit, see :code:`bmdcluster.cache.fingerprint`, by default None
+    """
+
+    os.makedirs(path, exist_ok=True)
+
+    B = np.asarray(B)
+    rng_name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    arrays = {'format_version': FORMAT_VERSION, 'n_iter': n_iter, 'cost': cost, 'n_clusters': n_clusters,
+              'labels': np.asarray(labels, dtype=np.int32), 'B_shape': np.array(B.shape), 'B_dtype': B.dtype.str,
+              'B': B if B.ndim == 1 else np.packbits(B.astype(bool)),
+              'rng_keys': keys, 'rng_state': np.array([pos, has_gauss]), 'rng_gaussian': cached_gaussian,
+              'fingerprint': fingerprint or ''}
+
+    tmp = os.path.join(path, CHECKPOINT_FILE + '.tmp')
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(path, CHECKPOINT_FILE))
+
+
+def load_checkpoint(path):
+    """Load a checkpoint saved with save_checkpoint(). The global random number generator is left alone, its 
+    saved state is returned as a separate generator.
+
+    Parameters
+    ----------
+    path : str
+        directory the checkpoint was saved to
+
+    Returns
+    -------
+    dict
+        n_iter, cost, n_clusters, labels, B, random_state, an np.random.RandomState in the saved state, and
+        fingerprint, the fingerprint of the data or None if it was not saved
+
+    Raises
+    ------
+    ValueError
+        If the checkpoint was saved in an unsupported format version
+    """
+
+    with np.load(os.path.join(path, CHECKPOINT_FILE)) as f:
+        state = {name: f[name] for name in f.files}
+
+    if state['format_version'] > FORMAT_VERSION:
+        raise ValueError("Unsupported checkpoint format version {0}".format(state['format_version']))
+
+    shape, dtype = tuple(state['B_shape']), str(state['B_dtype'])
+    if len(shape) == 1:
+        B = state['B'].astype(dtype)
+    else:
+        B = np.unpackbits(state['B'], count=int(np.prod(shape))).reshape(shape).astype(dtype)
+
+    pos, has_gauss = state['rng_state']
+    random_state = np.random.RandomState()
+    random_state.set_state(('MT19937', state['rng_keys'], int(pos), int(has_gauss), float(state['rng_gaussian'])))
+
+    return {'n_iter': int(state['n_iter']), 'cost': float(state['cost']), 'n_clusters': int(state['n_clusters']),
+            'labels': state['labels'].astype(np.int64), 'B': B, 'random_state': random_state,
+            'fingerprint': (str(state['fingerprint']) or None) if 'fingerprint' in state else None}
+
+
+class Checkpointer:
+    """Saves checkpoints of a fit every :code:`every` iterations or :code:`seconds` seconds, whichever
+    comes first. The optimizers call :code:`due` after every iteration and :code:`save` if it returns True.
+
+    Parameters
+    ----------
+    path : str
+        directory to write the checkpoints to
+    n_clusters : int
+        number of data clusters
+    every : int, optional
+        number of iterations between checkpoints, by default None which saves every iteration if
+        :code:`seconds` is not given either
+    seconds : float, optional
+        number of seconds between checkpoints, by default None
+    start_iter : int, optional
+        number of iterations completed before the optimizer started, e.g. of a resumed fit, by default 0
+    fingerprint : str, optional
+        fingerprint of the data being fit, saved with the checkpoints, by default None
+    """
+
+    def __init__(self, path, n_clusters, every=None, seconds=None, start_iter=0, fingerprint=None):
+
+        self.path = path
+        self.n_clusters = n_clusters
+        self.every = 1 if every is None and seconds is None else every
+        self.seconds = seconds
+        self.start_iter = start_iter
+        self.fingerprint = fingerprint
+        self.last_iter = start_iter
+        self.last_time = time.monotonic()
+        self.n_saved = 0
+
+    def due(self, n_iter):
+        """ Determine if a checkpoint should be saved after n_iter iterations of the optimizer. """
+
+        if self.every is not None and self.start_iter + n_iter - self.last_iter >= self.every:
+            return True
+        return self.seconds is not None and time.monotonic() - self.last_time >= self.seconds
+
+    def save(self, n_iter, cost, A, B):
+        """ Save a checkpoint of the data clusters, as a matrix or labels, and feature clusters after n_iter iterations. """
+
+        A = np.asarray(A)
+        if A.ndim == 1:
+            labels = A
+        else:
+            labels = np.where(A.any(axis=1), A.argmax(axis=1), -1)
+
+        save_checkpoint(self.path, self.start_iter + n_iter, cost, labels, B, self.n_clusters, self.fingerprint)
+        self.last_iter, self.last_time = self.start_iter + n_iter, time.monotonic()
+        self.n_saved += 1
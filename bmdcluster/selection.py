@@ -0,0 +1,249 @@
+"""
+Selection of the number of clusters by fitting a grid of models.
+
+The data is collapsed to its unique rows once and shared by every fit of a worker process. Bootstrap
+replicates, resamples of the rows with replacement, are drawn once and shared by every number of clusters,
+so the costs of different K are compared on the same data. A replicate of the collapsed data is a vector of
+row multiplicities and needs no copy of W.
+
+With warm starts the numbers of clusters of a replicate are fit in increasing order, each fit starting from
+the previous solution with its worst cluster split in two. This costs a few iterations per K instead of a
+fit from scratch and keeps the solutions of neighboring K nested, which makes their costs less noisy.
+Replicates and feature cluster counts are fit in parallel. Without warm starts every fit is independent.
+
+The recommendation is the K minimizing the Bayesian information criterion
+
+    BIC = N log(RSS/N) + p log(N),
+
+where N = n*m is the number of entries of W, RSS the squared cost and p the number of model parameters,
+m*K for the block diagonal model and K*C + m for the general model with C feature clusters, or the elbow
+of the cost curve.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bmdcluster import blockdiagonalBMD, generalBMD
+from bmdcluster.utils import collapse_rows, sq_distances
+from bmdcluster.optimizers.blockdiagonalBMD import run_bd_BMD
+from bmdcluster.optimizers.generalBMD import run_BMD
+from bmdcluster.initializers.primary_initializer import initialize_block_diagonal, initialize_general
+
+
+Selection = namedtuple('Selection', ['n_clusters', 'f_clusters', 'costs', 'costs_std', 'bic', 'elbow'])
+
+# data shared by the fits of a worker process, see _share()
+_shared = {}
+
+
+def _share(W, replicates):
+    """ Sets the data shared by the fits of a process. """
+
+    _shared['W'] = W
+    _shared['replicates'] = replicates
+
+    # forked workers inherit the random state of the parent, unseeded fits would draw the same numbers
+    np.random.seed(None)
+
+
+def _split_clusters(A, W, weights, n_clusters):
+    """Adds clusters to a data cluster matrix until it has n_clusters clusters. The cluster with the largest
+    weighted sum of squared distances to its mean is split: its member farthest from the mean seeds a new
+    cluster, which takes the members closer to the seed than to the mean.
+
+    Parameters
+    ----------
+    A : np.array
+        n x K data cluster matrix
+    W : np.array
+        binary data matrix
+    weights : np.array
+        multiplicity of each row of W
+    n_clusters : int
+        number of data clusters
+
+    Returns
+    -------
+    np.array
+        n x n_clusters data cluster matrix
+    """
+
+    W = np.asarray(W, dtype=float)
+
+    while A.shape[1] < n_clusters:
+
+        K = A.shape[1]
+        labels, assigned = A.argmax(axis=1), A.any(axis=1)
+
+        n_k = np.dot(weights, A)
+        C = np.dot(A.T*weights, W) / np.where(n_k > 0, n_k, 1).reshape((-1, 1))
+
+        d = np.where(assigned, sq_distances(W, C)[np.arange(len(W)), labels], 0)
+        k = np.bincount(labels, weights=weights*d, minlength=K).argmax()
+
+        members = np.where(assigned & (labels == k))[0]
+        seed = members[d[members].argmax()]
+        moved = members[sq_distances(W[members], W[[seed]])[:, 0] < d[members]]
+
+        A = np.hstack([A, np.zeros((len(A), 1))])
+        A[moved, k] = 0
+        A[moved, K] = 1
+
+    return A
+
+
+def _fit_chain(model, r, k_range, f_clusters):
+    """Fits models with each number of clusters of k_range to the shared replicate r and returns their costs.
+    If k_range has several values, they are fit in increasing order and each fit is warm started from the
+    previous one with _split_clusters()."""
+
+    rows, weights = _shared['replicates'][r]
+    W = _shared['W'][rows]
+    general = isinstance(model, generalBMD)
+
+    costs = []
+    A = None
+    for k in k_range:
+        if A is None and general:
+            A, B = initialize_general(W=W, n_clusters=k, b=model.b, f_clusters=f_clusters, init_ratio=model.init_ratio,
+                                      B_ident=model.B_ident, use_bootstrap=model.use_bootstrap, init=model.init,
+                                      weights=weights, B_as_labels=model.B_ident, seed=model.seed)
+        elif A is None:
+            A = initialize_block_diagonal(W=W, n_clusters=k, b=model.b, init_ratio=model.init_ratio,
+                                          use_bootstrap=model.use_bootstrap, init=model.init, weights=weights,
+                                          seed=model.seed)
+        else:
+            A = _split_clusters(A, W, weights, k)
+
+        if general:
+            cost, A, B, _ = run_BMD(A, B, W, model.max_iter, verbose=0, weights=weights)
+        else:
+            cost, A, _ = run_bd_BMD(A, W, model.max_iter, weights=weights)
+        costs.append(cost)
+
+    return costs
+
+
+def _elbow(k_range, costs):
+    """Finds the elbow of a decreasing cost curve, the point farthest below the line through its ends once
+    both axes are scaled to [0, 1]."""
+
+    k_range = np.asarray(k_range, dtype=float)
+    if len(k_range) < 3 or costs[0] <= costs[-1]:
+        return int(k_range[0])
+
+    x = (k_range - k_range[0]) / (k_range[-1] - k_range[0])
+    y = (costs - costs[-1]) / (costs[0] - costs[-1])
+
+    return int(k_range[np.argmax((1 - x) - y)])
+
+
+def select_n_clusters(W, k_range, model=None, f_range=None, n_bootstrap=0, warm_start=True, criterion='bic', n_jobs=1, seed=None):
+    """Select the number of data clusters, and of feature clusters of the general model, by fitting a grid
+    of models in parallel.
+
+    Parameters
+    ----------
+    W : np.array
+        binary data matrix
+    k_range : list
+        numbers of data clusters to try
+    model : blockdiagonalBMD or generalBMD, optional
+        unfitted model whose other parameters are used by every fit, by default a blockdiagonalBMD with
+        init='kmeans++'. With random initialization the fits tend to end in the same poor solution for every
+        number of clusters, so a model given here should use init='kmeans++' or bootstrapping as well.
+    f_range : list, optional
+        numbers of feature clusters to try with a generalBMD model with B_ident=False, by default None
+    n_bootstrap : int, optional
+        number of bootstrap replicates of the rows of W shared by every fit, the costs are averaged over the
+        replicates, W itself is used if 0, by default 0
+    warm_start : bool, optional
+        start each fit from the fit with the next smaller number of clusters, by default True
+    criterion : str, optional
+        'bic' or 'elbow' recommendation, by default 'bic'
+    n_jobs : int, optional
+        number of worker processes, by default 1
+    seed : int, optional
+        randomization seed of the bootstrap replicates, by default None
+
+    Returns
+    -------
+    Selection
+        named tuple of the recommended n_clusters and f_clusters (None without f_range), the mean and standard
+        deviation of the costs over the replicates and the BIC, indexed [f, k] with f_range and [k] otherwise,
+        and the elbow of the lowest costs over the feature cluster counts
+
+    Raises
+    ------
+    ValueError
+        If criterion is not 'bic' or 'elbow', or f_range is given for a model without feature clusters
+    """
+
+    if criterion not in ('bic', 'elbow'):
+        raise ValueError("criterion must be 'bic' or 'elbow'")
+
+    k_range = sorted(k_range)
+    model = blockdiagonalBMD(k_range[0], init='kmeans++') if model is None else model
+    general = isinstance(model, generalBMD)
+
+    if f_range is not None and (not general or model.B_ident):
+        raise ValueError("f_range requires a generalBMD model with B_ident=False")
+
+    n, m = W.shape
+    W_unique, counts, _ = collapse_rows(W)
+
+    # replicates of W as multiplicities of the unique rows, rows drawn 0 times are left out
+    if n_bootstrap:
+        if seed:
+            np.random.seed(seed)
+        replicates = [np.random.multinomial(n, counts / n) for _ in range(n_bootstrap)]
+        np.random.seed(None)
+        replicates = [(np.where(c > 0)[0], c[c > 0].astype(float)) for c in replicates]
+    else:
+        replicates = [(np.arange(len(counts)), counts.astype(float))]
+
+    f_values = [getattr(model, 'f_clusters', None)] if f_range is None else list(f_range)
+    chains = [k_range] if warm_start else [[k] for k in k_range]
+    tasks = [(r, f, chain) for r in range(len(replicates)) for f in range(len(f_values)) for chain in chains]
+    args = [(model, r, chain, f_values[f]) for r, f, chain in tasks]
+
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_share, initargs=(W_unique, replicates)) as executor:
+            results = list(executor.map(_fit_chain, *zip(*args)))
+    else:
+        _share(W_unique, replicates)
+        results = [_fit_chain(*a) for a in args]
+    _shared.clear()
+
+    costs = np.empty((len(replicates), len(f_values), len(k_range)))
+    for (r, f, chain), c in zip(tasks, results):
+        costs[r, f, [k_range.index(k) for k in chain]] = c
+
+    # number of parameters of each model
+    K = np.array(k_range).reshape((1, -1))
+    if general:
+        C = np.array([m if model.B_ident else f for f in f_values]).reshape((-1, 1))
+        p = K*C + m
+    else:
+        p = np.repeat(K*m, len(f_values), axis=0)
+
+    N = n*m
+    rss = np.square(costs).mean(axis=0)
+    bic = N*np.log(np.maximum(rss, np.finfo(float).eps) / N) + p*np.log(N)
+
+    mean, std = costs.mean(axis=0), costs.std(axis=0)
+    elbow = _elbow(k_range, mean.min(axis=0))
+
+    if criterion == 'bic':
+        f, k = np.unravel_index(np.argmin(bic), bic.shape)
+        n_clusters = k_range[k]
+    else:
+        n_clusters = elbow
+        f = np.argmin(bic[:, k_range.index(elbow)])
+
+    if f_range is None:
+        return Selection(n_clusters, None, mean[0], std[0], bic[0], elbow)
+
+    return Selection(n_clusters, f_values[f], mean, std, bic, elbow)
@@ -0,0 +1,166 @@
+"""
+A frozen, bit-packed form of a fitted blockdiagonalBMD model for prediction only.
+
+The cluster centroids of the block-diagonal model, the rows of B', are binary, and a point belongs to the
+centroid at the smallest Hamming distance. Packing the centroids and the query rows into 64-bit words, 64
+features per word, the Hamming distance between two rows is the number of set bits of their XOR. This needs
+no conversion to float and the model takes m/8 bytes per cluster.
+
+The number of set bits is counted with np.bitwise_count() on numpy >= 2.0 and with a lookup table on the
+bytes of the words otherwise.
+"""
+
+import numpy as np
+
+
+WORD_BITS = 64
+# maximum number of query x cluster x word entries compared at a time
+BLOCK_SIZE = 2**22
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def pack_rows(W):
+    """Packs the rows of a binary matrix into 64-bit words. Nonzero entries are set bits and the last
+    word of each row is padded with 0's.
+
+    Parameters
+    ----------
+    W : np.array
+        n x m binary matrix
+
+    Returns
+    -------
+    np.array
+        n x ceil(m/64) matrix of np.uint64 words
+    """
+
+    packed = np.packbits(np.asarray(W) != 0, axis=1)
+    n_bytes = -(-packed.shape[1] // 8)*8
+    packed = np.pad(packed, ((0, 0), (0, n_bytes - packed.shape[1])))
+
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def popcount(x):
+    """ Counts the set bits of each element of an array of unsigned integers. """
+
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x)
+
+    x = np.ascontiguousarray(x)
+    return _POPCOUNT_TABLE[x.view(np.uint8)].reshape(x.shape + (x.itemsize,)).sum(axis=-1, dtype=np.uint8)
+
+
+def hamming_distances(P, Q):
+    """Computes the Hamming distance between every pair of packed rows of P and Q.
+
+    Parameters
+    ----------
+    P : np.array
+        n x w matrix of packed rows
+    Q : np.array
+        K x w matrix of packed rows
+
+    Returns
+    -------
+    np.array
+        n x K matrix of Hamming distances
+    """
+
+    n, K = P.shape[0], Q.shape[0]
+    D = np.empty((n, K), dtype=np.int64)
+    step = max(1, BLOCK_SIZE // max(1, K*Q.shape[1]))
+
+    for start in range(0, n, step):
+        X = np.bitwise_xor(P[start:start+step, None, :], Q[None, :, :])
+        D[start:start+step] = popcount(X).sum(axis=2)
+
+    return D
+
+
+class PackedBMD:
+    """Frozen block-diagonal model holding its cluster centroids as packed 64-bit words. Create one from a
+    fitted model with :code:`blockdiagonalBMD.freeze()`. Predictions are the same as those of the model.
+
+    Parameters
+    ----------
+    B : np.array
+        m x K feature cluster assignment matrix of a fitted blockdiagonalBMD model
+    exclude : array-like, optional
+        clusters never predicted, such as the clusters dropped by the fit, by default None
+    """
+
+    def __init__(self, B, exclude=None):
+
+        B = np.asarray(B)
+        self.n_features, self.n_clusters = B.shape
+        self.centroids = pack_rows(B.T)
+        self.exclude = np.zeros(0, dtype=int) if exclude is None else np.asarray(exclude, dtype=int)
+
+    def _pack(self, W):
+        """ Packs W unless it is already packed. """
+
+        if W.dtype == np.uint64:
+            if W.shape[1] != self.centroids.shape[1]:
+                raise ValueError("Packed rows have {0} words, expected {1}".format(W.shape[1], self.centroids.shape[1]))
+            return W
+
+        if W.shape[1] != self.n_features:
+            raise ValueError("Data has {0} features, expected {1}".format(W.shape[1], self.n_features))
+
+        return pack_rows(W)
+
+    def distances(self, W):
+        """Computes the Hamming distance between every point and every cluster centroid.
+
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix, or its rows packed by :code:`pack_rows`
+
+        Returns
+        -------
+        np.array
+            n x K matrix of Hamming distances
+        """
+        return hamming_distances(self._pack(W), self.centroids)
+
+    def predict(self, W):
+        """Predict cluster labels of new data.
+
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix, or its rows packed by :code:`pack_rows`
+
+        Returns
+        -------
+        np.array
+            predicted cluster labels
+        """
+        D = self.distances(W)
+        # farther than any centroid
+        D[:, self.exclude] = self.n_features + 1
+
+        return D.argmin(axis=1)
+
+    def transform(self, W):
+        """Predict cluster assignment matrix of new data.
+
+        Parameters
+        ----------
+        W : np.array
+            binary data matrix, or its rows packed by :code:`pack_rows`
+
+        Returns
+        -------
+        np.array
+            predicted cluster assignment matrix as np.uint8
+        """
+
+        labels = self.predict(W)
+        A = np.zeros((len(labels), self.n_clusters), dtype=np.uint8)
+        A[np.arange(len(labels)), labels] = 1
+
+        return A
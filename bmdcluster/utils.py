@@ -0,0 +1,317 @@
+""" shared utilities """
+
+import time
+from collections import namedtuple
+
+import numpy as np
+
+
+def sq_distances(W, C):
+    """Computes the squared Euclidean distance between every row of W and every row of C.
+    For binary data this is the Hamming distance between the rows. The distances are
+    computed by expanding the square,
+
+        d[i,k] = |W[i,:]|^2 - 2*W[i,:]'C[k,:] + |C[k,:]|^2
+
+    so that the bulk of the work is a single matrix product.
+
+    Parameters
+    ----------
+    W : np.array
+        n x m data matrix
+    C : np.array
+        K x m matrix of cluster centers
+
+    Returns
+    -------
+    np.array
+        n x K matrix of squared distances
+    """
+
+    W = np.asarray(W, dtype=float)
+    C = np.asarray(C, dtype=float)
+
+    D = np.square(W).sum(axis=1).reshape((-1, 1)) - 2*np.dot(W, C.T)
+    D += np.square(C).sum(axis=1)
+
+    # clip round-off so that distances are never negative
+    return np.maximum(D, 0, out=D)
+
+
+def column_major(W):
+    """Makes a float copy of W stored in column-major (Fortran) order. The count products A'W 
+    of the feature cluster updates then read contiguous columns of W and no longer convert a 
+    compact (e.g. uint8) W to float on every iteration, at the cost of 8 bytes per entry.
+
+    Parameters
+    ----------
+    W : np.array
+        data matrix
+
+    Returns
+    -------
+    np.array
+        column-major float copy of W
+    """
+
+    return np.asfortranarray(W, dtype=float)
+
+
+def collapse_rows(W):
+    """Collapses the duplicate rows of a matrix. The rows of a binary matrix are bit-packed and 
+    compared as raw bytes, which is much cheaper than comparing the unpacked rows, the rows of
+    any other matrix are compared by their raw bytes. The unique rows are
+    returned in order of first appearance together with their multiplicities, which can be
+    used as weights when fitting, and the index of each original row into the unique rows.
+
+    Parameters
+    ----------
+    W : np.array
+        data matrix
+
+    Returns
+    -------
+    np.array
+        matrix of unique rows
+    np.array
+        number of times each unique row appears in W
+    np.array
+        index into the unique rows for each row of W, so that W_unique[inverse] == W
+    """
+
+    W = np.asarray(W)
+    if W.dtype == bool or np.all((W == 0) | (W == 1)):
+        packed = np.ascontiguousarray(np.packbits(W != 0, axis=1))
+    else:
+        packed = np.ascontiguousarray(W).view(np.uint8).reshape((W.shape[0], -1))
+    rows = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+
+    _, index, inverse, counts = np.unique(rows, return_index=True, return_inverse=True, return_counts=True)
+
+    # reorder unique rows by first appearance
+    order = np.argsort(index)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    return W[index[order]], counts[order], rank[inverse.ravel()]
+
+
+def collapse_columns(W, drop_constant=True):
+    """Collapses the duplicate columns of a binary matrix and optionally drops the constant
+    (all-zero or all-one) columns. Constant features carry no information that separates
+    the data clusters. The representative columns are returned together with their multiplicities,
+    which can be used as feature weights when fitting, and the index of each original column 
+    into the representative columns, with -1 for dropped columns.
+
+    Parameters
+    ----------
+    W : np.array
+        binary data matrix
+    drop_constant : bool, optional
+        drop the constant columns, by default True
+
+    Returns
+    -------
+    np.array
+        matrix of representative columns
+    np.array
+        number of times each representative column appears in W
+    np.array
+        index into the representative columns for each column of W, -1 for dropped columns
+    """
+
+    W_T, counts, inverse = collapse_rows(np.asarray(W).T)
+
+    if drop_constant:
+        n = W_T.shape[1]
+        col_sums = W_T.sum(axis=1)
+        keep = (col_sums != 0) & (col_sums != n)
+        new_index = np.full(len(keep), -1)
+        new_index[keep] = np.arange(keep.sum())
+        W_T, counts, inverse = W_T[keep], counts[keep], new_index[inverse]
+
+    return W_T.T, counts, inverse
+
+
+def labels_to_indicator(labels, n_clusters=None):
+    """Converts a vector of cluster labels to a cluster indicator matrix. Points labeled -1
+    (outliers) belong to no cluster and get a row of 0's.
+
+    Parameters
+    ----------
+    labels : np.array
+        vector of cluster labels
+    n_clusters : int, optional
+        number of clusters, by default the number of labels
+
+    Returns
+    -------
+    np.array
+        cluster indicator matrix
+    """
+
+    labels = np.asarray(labels)
+    if n_clusters is None:
+        n_clusters = len(labels)
+
+    M = np.zeros((len(labels), n_clusters))
+    assigned = np.where(labels >= 0)[0]
+    M[assigned, labels[assigned]] = 1
+
+    return M
+
+
+class Deadline:
+    """Time budget of a fit. The optimizers call :code:`expired()` before each update and, once the budget has
+    run out, stop with the last completed iteration. The clock is monotonic and shared by the processes of a
+    machine, so a deadline can be passed to worker processes.
+
+    Parameters
+    ----------
+    max_time : float, optional
+        number of seconds from now, by default None which never expires
+    """
+
+    def __init__(self, max_time=None):
+        self.end = None if max_time is None else time.monotonic() + max_time
+        self.truncated = False
+
+    def remaining(self):
+        """ Number of seconds left, None if there is no budget. """
+        return None if self.end is None else max(self.end - time.monotonic(), 0.0)
+
+    def expired(self):
+        """ Determine if the budget has run out, which marks the fit as truncated. """
+
+        if self.end is not None and time.monotonic() >= self.end:
+            self.truncated = True
+        return self.truncated
+
+
+def expired(deadline):
+    """ Determine if a deadline, which may be None, has expired. See Deadline. """
+    return deadline is not None and deadline.expired()
+
+
+EMPTY_CLUSTER_POLICIES = ('keep', 'reseed', 'drop')
+
+EmptyClusterStats = namedtuple('EmptyClusterStats', ['n_empty', 'n_reseeded', 'n_dropped'])
+
+
+def select_columns(M, columns):
+    """ Returns the given columns of M, or M if columns is None. """
+    return M if columns is None else M[:, columns]
+
+
+def expand_columns(M, columns, n_columns):
+    """ Inverse of select_columns(): places the columns of M at the given indices of a matrix of n_columns
+    columns of 0's. Returns M if columns is None. """
+
+    if columns is None:
+        return M
+
+    M_full = np.zeros((M.shape[0], n_columns), dtype=M.dtype)
+    M_full[:, columns] = M
+
+    return M_full
+
+
+class EmptyClusters:
+    """Policy for the data clusters left empty by an update of the data clusters, and counts of these events.
+    The optimizers call :code:`update()` after each update of the data clusters.
+
+     keep: leave the clusters empty, their centroids are 0 and they may take points again later
+     reseed: move the points with the highest cost into the empty clusters, each point taken from a cluster
+             with more than one point
+     drop: leave the clusters out of the rest of the fit, the updates of the data clusters only compute the
+           distances to the clusters in :code:`alive`
+
+    Parameters
+    ----------
+    policy : str, optional
+        one of 'keep', 'reseed' or 'drop', by default 'keep'
+    dropped : array-like, optional
+        clusters dropped before the optimizer started, e.g. by the interrupted part of a resumed fit, by default None
+
+    Raises
+    ------
+    ValueError
+        If :code:`policy` is not one of 'keep', 'reseed' or 'drop'
+    """
+
+    def __init__(self, policy='keep', dropped=None):
+
+        if policy not in EMPTY_CLUSTER_POLICIES:
+            raise ValueError("'empty_cluster' must be one of 'keep', 'reseed' or 'drop'")
+
+        self.policy = policy
+        self.dropped = [] if dropped is None else [int(k) for k in dropped]
+        self.n_empty = 0
+        self.n_reseeded = 0
+
+    def alive(self, n_clusters):
+        """ Indices of the clusters that were not dropped, None if no cluster was dropped. """
+
+        if not self.dropped:
+            return None
+
+        return np.setdiff1d(np.arange(n_clusters), self.dropped)
+
+    def stats(self):
+        """ Return the number of empty clusters found by the updates, and of clusters reseeded and dropped. """
+        return EmptyClusterStats(self.n_empty, self.n_reseeded, len(self.dropped))
+
+    def update(self, A, alive, costs):
+        """Apply the policy to the empty clusters of a data cluster matrix.
+
+        Parameters
+        ----------
+        A : np.array
+            updated data cluster matrix over the clusters alive, changed in place when reseeding
+        alive : np.array
+            indices of the clusters that are the columns of A, None for all clusters
+        costs : callable
+            function returning the cost of each point given A, the points with the highest cost are reseeded
+
+        Returns
+        -------
+        np.array
+            data cluster matrix over the clusters alive
+        np.array
+            indices of the clusters alive, None for all clusters
+        """
+
+        empty = np.where(~A.any(axis=0))[0]
+        self.n_empty += len(empty)
+
+        if len(empty) == 0 or self.policy == 'keep':
+            return A, alive
+
+        if self.policy == 'drop':
+            alive = np.arange(A.shape[1]) if alive is None else alive
+            keep = np.ones(A.shape[1], dtype=bool)
+            keep[empty] = False
+            self.dropped.extend(int(k) for k in alive[empty])
+            return A[:, keep], alive[keep]
+
+        c = costs(A)
+        labels = np.where(A.any(axis=1), A.argmax(axis=1), -1)
+        sizes = A.sum(axis=0)
+
+        # Take the costliest points first, skipping those that would leave their own cluster empty.
+        n_reseeded = 0
+        for i in np.argsort(-c, kind='stable'):
+            if n_reseeded == len(empty) or c[i] <= 0:
+                break
+            k = labels[i]
+            if k >= 0:
+                if sizes[k] <= 1:
+                    continue
+                A[i, k] = 0
+                sizes[k] -= 1
+            A[i, empty[n_reseeded]] = 1
+            n_reseeded += 1
+
+        self.n_reseeded += n_reseeded
+
+        return A, alive
@@ -15,7 +15,7 @@ A Python implementation of the Binary Matrix Decomposition algorithm for cluster
 with open('HISTORY.rst') as history_file:
     history = history_file.read()
 
-requirements = ['numpy>=1.14']
+requirements = ['numpy>=1.17']
 
 setup_requirements = ['pytest-runner', ]
 
@@ -29,13 +29,15 @@ setup(
         'Intended Audience :: Science/Research',
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
     ],
     description="Binary Matrix Decomposition algorithm for clustering binary data",
     install_requires=requirements,
+    python_requires='>=3.8',
     license="MIT license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
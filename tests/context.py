@@ -5,8 +5,23 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from bmdcluster import blockdiagonalBMD as blockdiagonalBMD_model
 from bmdcluster import generalBMD as generalBMD_model
+from bmdcluster import bisectingBMD as bisectingBMD_model
 import bmdcluster.optimizers.blockdiagonalBMD as blockdiagonalBMD
 import bmdcluster.optimizers.generalBMD as generalBMD
 import bmdcluster.initializers.cluster_initializers as cluster_initializers
 import bmdcluster.initializers.bootstrap_initializer as bootstrap_initializer
-import bmdcluster.initializers.primary_initializer as primary_initializer
\ No newline at end of file
+import bmdcluster.initializers.primary_initializer as primary_initializer
+import bmdcluster.persistence as persistence
+import bmdcluster.utils as utils
+import bmdcluster.optimizers.chunked as chunked
+import bmdcluster.loaders as loaders
+import bmdcluster.index as index
+import bmdcluster.serving as serving
+import bmdcluster.cache as cache
+import bmdcluster.optimizers.batched as batched
+from bmdcluster import fit_many
+import bmdcluster.selection as selection
+import bmdcluster.coreset as coreset
+import bmdcluster.optimizers.parallel as parallel
+import bmdcluster.distributed as distributed
+import bmdcluster.aio as aio
\ No newline at end of file
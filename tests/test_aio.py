@@ -0,0 +1,95 @@
+import unittest
+import asyncio
+import threading
+import numpy as np
+
+from .context import aio
+from .context import blockdiagonalBMD_model
+from .context import generalBMD_model
+from .context import bisectingBMD_model
+
+
+class TestAsyncBMD(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+
+    def test_fit(self):
+
+        for model_class in [blockdiagonalBMD_model, generalBMD_model, bisectingBMD_model]:
+            with self.subTest(model = model_class.__name__):
+                model = asyncio.run(aio.AsyncBMD(model_class(n_clusters = 4, seed = 3)).fit(self.W))
+                expected = model_class(n_clusters = 4, seed = 3)
+                expected.fit(self.W)
+
+                self.assertEqual(model.cost, expected.cost)
+                self.assertTrue(np.array_equal(model.A, expected.A))
+
+    def test_fit_cancel(self):
+
+        model = blockdiagonalBMD_model(n_clusters = 4, seed = 3)
+        wrapper = aio.AsyncBMD(model)
+        started, resume = threading.Event(), threading.Event()
+        iterations = []
+
+        def callback(n_iter, cost):
+            iterations.append(n_iter)
+            started.set()
+            resume.wait(5)
+
+        async def run():
+            task = asyncio.create_task(wrapper.fit(self.W, callback = callback))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            task.cancel()
+            await asyncio.sleep(0.01)
+            resume.set()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(run())
+
+        # the fit stopped at the end of the first iteration without setting the results
+        self.assertEqual(iterations, [1])
+        self.assertFalse(hasattr(model, 'cost'))
+
+    def test_predict(self):
+
+        model = blockdiagonalBMD_model(n_clusters = 4, seed = 3)
+        model.fit(self.W)
+        requests = [self.W[i:i+5] for i in range(0, 50, 5)]
+
+        for max_batch_size, n_batches in [(4096, 1), (20, 3)]:
+            with self.subTest(max_batch_size = max_batch_size):
+                wrapper = aio.AsyncBMD(model, batch_window = 0.05, max_batch_size = max_batch_size)
+
+                async def run():
+                    return await asyncio.gather(*[wrapper.predict(W) for W in requests])
+
+                labels = asyncio.run(run())
+
+                for W, l in zip(requests, labels):
+                    self.assertTrue(np.array_equal(l, model.predict(W)))
+                self.assertEqual(wrapper.n_requests, 10)
+                self.assertEqual(wrapper.n_batches, n_batches)
+
+    def test_predict_malformed(self):
+
+        model = blockdiagonalBMD_model(n_clusters = 4, seed = 3)
+        model.fit(self.W)
+        wrapper = aio.AsyncBMD(model, batch_window = 0.05)
+
+        async def run():
+            requests = [self.W[:2], np.ones((1, self.W.shape[1] - 1)), self.W[5:7]]
+            return await asyncio.gather(*[wrapper.predict(W) for W in requests], return_exceptions = True)
+
+        labels = asyncio.run(run())
+
+        self.assertTrue(np.array_equal(labels[0], model.predict(self.W[:2])))
+        self.assertIsInstance(labels[1], ValueError)
+        self.assertTrue(np.array_equal(labels[2], model.predict(self.W[5:7])))
+        self.assertEqual(wrapper.n_batches, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
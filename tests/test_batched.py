@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+
+from .context import batched
+from .context import blockdiagonalBMD
+from .context import fit_many
+from .context import blockdiagonalBMD_model
+from .context import bisectingBMD_model
+from .context import generalBMD_model
+
+
+class TestBatched(unittest.TestCase):
+
+    def setUp(self):
+
+        W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+        self.K = 4
+
+        # overlapping row subsets of zoo give several problems of the same shape
+        self.Ws = [W[start:start+60] for start in range(0, 40, 8)]
+
+        np.random.seed(3)
+        self.A = np.zeros((len(self.Ws), 60, self.K))
+        for A in self.A:
+            A[np.arange(60), np.random.randint(self.K, size = 60)] = 1
+        np.random.seed(None)
+
+    def test_run_bd_BMD_batched(self):
+
+        for max_iter in [1, 100]:
+            costs, A, B = batched.run_bd_BMD_batched(self.A, np.stack(self.Ws), max_iter = max_iter)
+            for p, W in enumerate(self.Ws):
+                with self.subTest(max_iter = max_iter, problem = p):
+                    cost, A_p, B_p = blockdiagonalBMD.run_bd_BMD(self.A[p], W, max_iter = max_iter)
+                    self.assertEqual(cost, costs[p])
+                    self.assertTrue(np.array_equal(A_p, A[p]))
+                    self.assertTrue(np.array_equal(B_p, B[p]))
+
+    def test_fit_many(self):
+
+        # an odd-shaped matrix is fit on its own
+        Ws = self.Ws + [self.Ws[0][:50]]
+        models = [blockdiagonalBMD_model(self.K, seed = 7),
+                  blockdiagonalBMD_model(self.K, seed = 7, init = 'kmeans++'),
+                  generalBMD_model(self.K, seed = 7),
+                  bisectingBMD_model(self.K, seed = 7)]
+
+        for model in models:
+            for n_jobs in [1, 2]:
+                with self.subTest(model = type(model).__name__, init = model.init, n_jobs = n_jobs):
+                    fitted = fit_many(Ws, model, n_jobs = n_jobs, batch_size = 4)
+                    self.assertEqual(len(fitted), len(Ws))
+                    for W, m in zip(Ws, fitted):
+                        single = type(model)(**model._get_params())
+                        single.fit(W)
+                        self.assertIs(m.W, W)
+                        self.assertEqual(m.cost, single.cost)
+                        self.assertTrue(np.array_equal(m.A, single.A))
+                        self.assertTrue(np.array_equal(m.B, single.B))
+                        self.assertEqual(getattr(m, 'hierarchy', None), getattr(single, 'hierarchy', None))
@@ -98,5 +98,48 @@ class IdentityTests_BD(unittest.TestCase):
         self.assertTrue(np.array_equal(self.I, A))
         
 
+class TestBoundedUpdate_BD(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.RandomState(7)
+        self.K = 8
+        prototypes = rng.rand(self.K, 40) < 0.3
+        labels = rng.randint(self.K, size = 400)
+        self.W = (prototypes[labels] ^ (rng.rand(400, 40) < 0.1)).astype(float)
+        self.A = np.zeros((400, self.K))
+        self.A[np.arange(400), rng.randint(self.K, size = 400)] = 1
+
+    def test_bd_updateA_bounded(self):
+
+        A, B, bounds = self.A, blockdiagonalBMD._bd_updateB(self.A, self.W), None
+
+        for _ in range(10):
+            A_expected = blockdiagonalBMD._bd_updateA(A, B, self.W)
+            A, bounds = blockdiagonalBMD._bd_updateA_bounded(A, B, self.W, bounds)
+            self.assertTrue(np.array_equal(A, A_expected))
+            B = blockdiagonalBMD._bd_updateB(A, self.W)
+
+    def test_run_bd_BMD_accelerate(self):
+
+        cost, A, B = blockdiagonalBMD.run_bd_BMD(self.A, self.W)
+        cost_a, A_a, B_a = blockdiagonalBMD.run_bd_BMD(self.A, self.W, accelerate = True)
+
+        self.assertEqual(cost, cost_a)
+        self.assertTrue(np.array_equal(A, A_a))
+        self.assertTrue(np.array_equal(B, B_a))
+
+    def test_run_bd_BMD_callback(self):
+
+        costs = []
+        cost, A, B = blockdiagonalBMD.run_bd_BMD(self.A, self.W, max_iter = 1)
+        cost_c, A_c, B_c = blockdiagonalBMD.run_bd_BMD(self.A, self.W, callback = lambda n_iter, cost: costs.append(cost) or n_iter == 1)
+
+        # stopping after the first iteration is the same as max_iter = 1
+        self.assertEqual(costs, [cost])
+        self.assertEqual(cost, cost_c)
+        self.assertTrue(np.array_equal(A, A_c))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
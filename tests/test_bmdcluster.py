@@ -1,9 +1,14 @@
+import os
+import shutil
+import tempfile
 import unittest
 import numpy as np
 
 
 from .context import blockdiagonalBMD_model
 from .context import generalBMD_model
+from .context import bisectingBMD_model
+from .context import fit_many
 
 class TestBMD_bd(unittest.TestCase):
 
@@ -148,5 +153,383 @@ class TestBMD_general(unittest.TestCase):
 
 
 
+class TestBMD_kmeanspp(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/test_set_3.csv','r'), delimiter = ',')
+        self.seed = 123
+
+    def test_kmeanspp_fit(self):
+
+        BMD_model = blockdiagonalBMD_model(n_clusters = 3, init = 'kmeans++', seed = self.seed)
+        BMD_model.fit(self.W)
+
+        self.assertEqual(BMD_model.cost, 0)
+
+    def test_kmeanspp_errors(self):
+
+        with self.subTest('Unknown initialization'):
+            with self.assertRaises(ValueError):
+                generalBMD_model(n_clusters = 3, init = 'wrong')
+
+        with self.subTest('Bootstrapping and kmeans++ are exclusive'):
+            with self.assertRaises(ValueError):
+                blockdiagonalBMD_model(n_clusters = 3, use_bootstrap = True, b = 5, init = 'kmeans++')
+
+
+class TestBMD_collapse(unittest.TestCase):
+
+    def setUp(self):
+
+        W = np.loadtxt(open('tests/data/test_set_4.csv', 'r'), delimiter = ',')
+        self.W = np.hstack([W, np.zeros((W.shape[0], 1))])
+
+    def test_collapse_features(self):
+
+        BMD_model = generalBMD_model(n_clusters = 3, B_ident = True, seed = 1234, collapse_features = True)
+        BMD_model.fit(self.W)
+
+        with self.subTest('Test for correct cost'):
+            self.assertEqual(BMD_model.cost, 0)
+
+        with self.subTest('Test duplicate features share labels and constant features are outliers'):
+            self.assertTrue(np.array_equal(BMD_model.get_feature_labels(), [0, 0, 1, 1, 2, 2, -1]))
+
+        with self.subTest('Test for correct data labels'):
+            self.assertTrue(np.array_equal(BMD_model.predict(self.W), np.repeat([0, 1, 2], 5)))
+
+    def test_collapse_too_few_features(self):
+
+        BMD_model = generalBMD_model(n_clusters = 3, B_ident = False, f_clusters = 4, collapse_features = True)
+        with self.assertRaises(ValueError):
+            BMD_model.fit(self.W)
+
+    def test_collapse_too_few_rows(self):
+
+        W = np.repeat(np.kron(np.eye(3), np.ones((1, 4))), 50, axis = 0)
+        for model in [blockdiagonalBMD_model(n_clusters = 3, collapse_duplicates = True),
+                      generalBMD_model(n_clusters = 3, B_ident = True, collapse_duplicates = True)]:
+            with self.subTest(model = type(model).__name__):
+                with self.assertRaises(ValueError):
+                    model.fit(W)
+
+
+class TestBMD_column_copy(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22)).astype(np.uint8)
+
+    def test_column_copy(self):
+
+        for model_class in [blockdiagonalBMD_model, generalBMD_model]:
+            with self.subTest(model = model_class.__name__):
+                BMD_model = model_class(n_clusters = 4, seed = 12)
+                BMD_model_c = model_class(n_clusters = 4, seed = 12, column_copy = True)
+                cost, A, B = BMD_model.fit_transform(self.W, verbose = False)
+                cost_c, A_c, B_c = BMD_model_c.fit_transform(self.W, verbose = False)
+
+                self.assertAlmostEqual(cost, cost_c)
+                self.assertTrue(np.array_equal(A, A_c))
+                self.assertTrue(np.array_equal(B, B_c))
+
+
+class TestBMD_parallel(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22)).astype(np.uint8)
+
+    def test_parallel(self):
+
+        for model_class in [blockdiagonalBMD_model, generalBMD_model]:
+            with self.subTest(model = model_class.__name__):
+                BMD_model = model_class(n_clusters = 4, seed = 12, collapse_duplicates = True)
+                BMD_model_p = model_class(n_clusters = 4, seed = 12, collapse_duplicates = True, n_jobs = 2)
+                cost, A, B = BMD_model.fit_transform(self.W, verbose = False)
+                cost_p, A_p, B_p = BMD_model_p.fit_transform(self.W, verbose = False)
+
+                self.assertAlmostEqual(cost, cost_p)
+                self.assertTrue(np.array_equal(A, A_p))
+                self.assertTrue(np.array_equal(B, B_p))
+
+        with self.subTest('Test collapse_features error'):
+            with self.assertRaises(ValueError):
+                generalBMD_model(n_clusters = 4, collapse_features = True, n_jobs = 2)
+
+
+class TestBMD_max_time(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+
+    def test_max_time(self):
+
+        for model_class in [blockdiagonalBMD_model, generalBMD_model]:
+            with self.subTest(model = model_class.__name__):
+                BMD_model = model_class(n_clusters = 4, seed = 12)
+                BMD_model_t = model_class(n_clusters = 4, seed = 12, max_time = 60)
+                cost, A, B = BMD_model.fit_transform(self.W, verbose = False)
+                cost_t, A_t, B_t = BMD_model_t.fit_transform(self.W, verbose = False)
+
+                self.assertFalse(BMD_model_t.truncated)
+                self.assertEqual(cost, cost_t)
+                self.assertTrue(np.array_equal(A, A_t))
+
+                # out of time before the first iteration, the initial solution is kept
+                BMD_model_0 = model_class(n_clusters = 4, seed = 12, max_time = 0)
+                BMD_model_0.fit(self.W)
+                BMD_model_1 = model_class(n_clusters = 4, seed = 12, max_iter = 0)
+                BMD_model_1.fit(self.W)
+
+                self.assertTrue(BMD_model_0.truncated)
+                self.assertEqual(BMD_model_0.cost, BMD_model_1.cost)
+                self.assertTrue(np.array_equal(BMD_model_0.A, BMD_model_1.A))
+
+    def test_fit_many_max_time(self):
+
+        Ws = [self.W[i::3] for i in range(3)]
+        for model in [blockdiagonalBMD_model(n_clusters = 3, seed = 2), generalBMD_model(n_clusters = 3, seed = 2)]:
+            with self.subTest(model = type(model).__name__):
+                self.assertTrue(all(m.truncated for m in fit_many(Ws, model, max_time = 0)))
+                self.assertFalse(any(m.truncated for m in fit_many(Ws, model, max_time = 60)))
+
+        with self.subTest('Test sample mode'):
+            BMD_model = blockdiagonalBMD_model(n_clusters = 4, seed = 5, fit_mode = 'sample', sample_size = 40, max_time = 0)
+            BMD_model.fit(self.W)
+            self.assertTrue(BMD_model.truncated)
+
+
+class TestBMD_transform_output(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+
+    def test_distances(self):
+
+        BMD_model = blockdiagonalBMD_model(n_clusters = 4, seed = 12)
+        BMD_model.fit(self.W)
+        D = BMD_model.transform(self.W, output = 'distances')
+
+        with self.subTest('Test squared distances to the centroids'):
+            D_expected = np.square(self.W[:, :, None] - BMD_model.B[None, :, :]).sum(axis = 1)
+            self.assertTrue(np.allclose(D, D_expected))
+
+        with self.subTest('Test closest cluster is the prediction'):
+            self.assertTrue(np.array_equal(D.argmin(axis = 1), BMD_model.predict(self.W)))
+
+    def test_affiliation_scores(self):
+
+        BMD_model = generalBMD_model(n_clusters = 4, seed = 12)
+        BMD_model.fit(self.W)
+        M = BMD_model.transform(self.W, output = 'distances')
+
+        E = np.dot(BMD_model.X, BMD_model.B.T)
+        v = BMD_model.B.sum(axis = 1)
+        M_expected = (np.square(self.W[:, None, :] - E[None, :, :])*v).sum(axis = 2)
+        self.assertTrue(np.allclose(M, M_expected))
+
+    def test_topk(self):
+
+        for model_class in [blockdiagonalBMD_model, generalBMD_model]:
+            with self.subTest(model = model_class.__name__):
+                BMD_model = model_class(n_clusters = 4, seed = 12, max_memory = 2**12)
+                BMD_model.fit(self.W[:60])
+                D = BMD_model.transform(self.W, output = 'distances')
+                labels, scores = BMD_model.transform(self.W, output = 'topk', k = 2)
+
+                self.assertEqual(labels.shape, (100, 2))
+                self.assertTrue(np.array_equal(labels[:, 0], D.argmin(axis = 1)))
+                self.assertTrue(np.allclose(scores, np.sort(D, axis = 1)[:, :2]))
+                self.assertTrue(np.array_equal(np.take_along_axis(D, labels, axis = 1), scores))
+
+        with self.subTest('Test k larger than the number of clusters'):
+            labels, scores = BMD_model.transform(self.W, output = 'topk', k = 10)
+            self.assertTrue(np.array_equal(np.sort(labels, axis = 1), np.tile(np.arange(4), (100, 1))))
+
+        with self.subTest('Test unknown output'):
+            with self.assertRaises(ValueError):
+                BMD_model.transform(self.W, output = 'labels')
+
+
+class TestBMD_sample(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+
+    def test_fit_sample(self):
+
+        for model_class in [blockdiagonalBMD_model, generalBMD_model]:
+            with self.subTest(model = model_class.__name__):
+                BMD_model = model_class(n_clusters = 4, seed = 5, fit_mode = 'sample', sample_size = 40, n_samples = 3)
+                BMD_model.fit(self.W)
+
+                self.assertEqual(len(BMD_model.validation_costs), 3)
+                self.assertEqual(BMD_model.A.shape, (self.W.shape[0], 4))
+                self.assertTrue(np.array_equal(BMD_model.get_data_labels(), BMD_model.predict(self.W)))
+                self.assertAlmostEqual(BMD_model.cost, BMD_model._cost(BMD_model.A, self.W))
+
+    def test_fit_mode_errors(self):
+
+        with self.subTest('Test unknown fit mode'):
+            with self.assertRaises(ValueError):
+                blockdiagonalBMD_model(n_clusters = 4, fit_mode = 'subset', sample_size = 40)
+
+        with self.subTest('Test missing sample size'):
+            with self.assertRaises(ValueError):
+                generalBMD_model(n_clusters = 4, fit_mode = 'sample')
+
+
+class TestBMD_empty_cluster(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+
+    def test_empty_cluster(self):
+
+        models = [(blockdiagonalBMD_model, {}), (blockdiagonalBMD_model, {'accelerate': True}), 
+                  (generalBMD_model, {}), (generalBMD_model, {'B_ident': False, 'f_clusters': 5})]
+
+        for model_class, params in models:
+            for policy in ['keep', 'reseed', 'drop']:
+                with self.subTest(model = model_class.__name__, policy = policy, **params):
+                    BMD_model = model_class(n_clusters = 12, seed = 1, empty_cluster = policy, **params)
+                    BMD_model.fit(self.W)
+                    labels = BMD_model.get_data_labels()
+                    stats = BMD_model.empty_cluster_stats
+
+                    self.assertGreater(stats.n_empty, 0)
+                    self.assertEqual(stats.n_dropped, len(BMD_model.dropped_clusters))
+                    self.assertTrue(np.array_equal(BMD_model.predict(self.W), labels))
+                    self.assertFalse(np.isin(labels, BMD_model.dropped_clusters).any())
+
+                    if policy == 'reseed':
+                        self.assertGreater(stats.n_reseeded, 0)
+                    if policy == 'drop':
+                        self.assertGreater(stats.n_dropped, 0)
+                        self.assertTrue(np.isinf(BMD_model.transform(self.W, output = 'distances')[:, BMD_model.dropped_clusters]).all())
+                    if model_class is blockdiagonalBMD_model:
+                        self.assertTrue(np.array_equal(BMD_model.freeze().predict(self.W), labels))
+
+    def test_unsupported(self):
+
+        with self.subTest('Test unknown policy'):
+            with self.assertRaises(ValueError):
+                blockdiagonalBMD_model(n_clusters = 3, empty_cluster = 'merge')
+
+        with self.subTest('Test parallel fit'):
+            with self.assertRaises(ValueError):
+                generalBMD_model(n_clusters = 3, empty_cluster = 'drop', n_jobs = 2)
+
+        with self.subTest('Test out-of-core fit'):
+            with self.assertRaises(ValueError):
+                blockdiagonalBMD_model(n_clusters = 3, empty_cluster = 'reseed', max_memory = 2**20).fit(self.W)
+
+
+class TestBMD_bisecting(unittest.TestCase):
+
+    def setUp(self):
+
+        # 6 blocks of 5 features with 5% of the entries flipped
+        np.random.seed(4)
+        self.K = 6
+        self.labels = np.random.randint(self.K, size = 300)
+        self.W = (np.kron(np.eye(self.K), np.ones((1, 5)))[self.labels] != (np.random.rand(300, 30) < 0.05)).astype(int)
+        np.random.seed(None)
+
+    def test_fit(self):
+
+        for n_jobs in [1, 2]:
+            with self.subTest(n_jobs = n_jobs):
+                BMD_model = bisectingBMD_model(n_clusters = self.K, seed = 3, n_jobs = n_jobs)
+                BMD_model.fit(self.W)
+                labels = BMD_model.get_data_labels()
+
+                self.assertEqual(len(BMD_model.hierarchy), self.K - 1)
+                self.assertEqual(BMD_model.B.shape, (30, self.K))
+                # every block is one cluster
+                self.assertEqual(len(set(zip(labels, self.labels))), self.K)
+                self.assertTrue(np.array_equal(BMD_model.predict(self.W), labels))
+
+    def test_cut(self):
+
+        BMD_model = bisectingBMD_model(n_clusters = self.K, seed = 3)
+        BMD_model.fit(self.W)
+
+        with self.subTest('Test cut at every level'):
+            for k in range(1, self.K + 1):
+                self.assertEqual(len(np.unique(BMD_model.cut(k))), k)
+            self.assertTrue(np.array_equal(BMD_model.cut(self.K), BMD_model.get_data_labels()))
+
+        with self.subTest('Test levels are nested'):
+            for k in range(1, self.K):
+                self.assertEqual(len(set(zip(BMD_model.cut(k + 1), BMD_model.cut(k)))), k + 1)
+
+        with self.subTest('Test too many clusters'):
+            with self.assertRaises(ValueError):
+                BMD_model.cut(self.K + 1)
+
+    def test_max_cost(self):
+
+        BMD_model = bisectingBMD_model(n_clusters = self.K, max_cost = np.inf)
+        BMD_model.fit(self.W)
+
+        self.assertEqual(len(BMD_model.leaves), 1)
+        self.assertTrue(np.array_equal(BMD_model.predict(self.W), np.zeros(300)))
+        self.assertEqual(BMD_model.A.shape, (300, 1))
+        self.assertEqual(BMD_model.transform(self.W).shape, (300, 1))
+
+    def test_save_load(self):
+
+        BMD_model = bisectingBMD_model(n_clusters = self.K, seed = 3)
+        BMD_model.fit(self.W)
+
+        path = tempfile.mkdtemp()
+        try:
+            BMD_model.save(os.path.join(path, 'model'))
+            loaded = bisectingBMD_model.load(os.path.join(path, 'model'), mmap = False)
+
+            self.assertEqual(loaded.hierarchy, BMD_model.hierarchy)
+            self.assertTrue(np.array_equal(loaded.leaves, BMD_model.leaves))
+            self.assertTrue(np.array_equal(loaded.predict(self.W), BMD_model.predict(self.W)))
+            for k in range(1, self.K + 1):
+                self.assertTrue(np.array_equal(loaded.cut(k, labels = loaded.predict(self.W)), BMD_model.cut(k)))
+        finally:
+            shutil.rmtree(path)
+
+    def test_fit_options(self):
+
+        with self.subTest('Test global random state is left alone'):
+            np.random.seed(5)
+            state = np.random.get_state()
+            bisectingBMD_model(n_clusters = self.K, seed = 3).fit(self.W)
+            self.assertTrue(np.array_equal(np.random.get_state()[1], state[1]))
+            np.random.seed(None)
+
+        with self.subTest('Test callback'):
+            calls = []
+            BMD_model = bisectingBMD_model(n_clusters = self.K, seed = 3)
+            BMD_model.fit(self.W, callback = lambda n_iter, cost: calls.append(cost))
+            self.assertEqual(calls[-1], BMD_model.cost)
+            self.assertFalse(BMD_model.truncated)
+
+        with self.subTest('Test max_time'):
+            BMD_model = bisectingBMD_model(n_clusters = self.K, seed = 3, max_time = 0)
+            BMD_model.fit(self.W)
+            self.assertTrue(BMD_model.truncated)
+            self.assertEqual(BMD_model.hierarchy, [])
+
+        with self.subTest('Test unsupported arguments'):
+            with self.assertRaises(ValueError):
+                bisectingBMD_model(n_clusters = self.K).fit(self.W, sample_weight = np.ones(300))
+            with self.assertRaises(ValueError):
+                bisectingBMD_model(n_clusters = self.K).fit(self.W, resume_from = 'checkpoint')
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
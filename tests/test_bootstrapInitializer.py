@@ -36,6 +36,18 @@ class TestboostrapInitializer(unittest.TestCase):
             self.assertEqual(len(output), 5)
 
 
+    def test_sample_data(self):
+
+        x_samp = bootstrap_initializer.sample_data(N = 100, b = 10, seed = self.seed)
+
+        self.assertEqual(len(np.unique(x_samp)), 10)
+        self.assertTrue(np.array_equal(x_samp, np.sort(x_samp)))
+        self.assertTrue(np.array_equal(x_samp, bootstrap_initializer.sample_data(N = 100, b = 10, seed = self.seed)))
+
+        with self.assertRaises(AssertionError):
+            bootstrap_initializer.sample_data(N = 10, b = 11)
+
+
     def test_bootstrap_data_assertions(self):
 
         with self.subTest('Test assert b<=N'):
@@ -0,0 +1,170 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from .context import cache
+from .context import blockdiagonalBMD_model
+from .context import generalBMD_model
+from .context import bisectingBMD_model
+
+
+class TestPredictionCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.array([[1, 0, 1], [0, 1, 1], [1, 0, 1], [1, 1, 1]])
+        self.calls = []
+
+    def assign(self, W):
+
+        self.calls.append(W.shape[0])
+        return W.sum(axis = 1)
+
+    def test_predict(self):
+
+        C = cache.PredictionCache(maxsize = 10)
+
+        with self.subTest('Test duplicate rows are computed once'):
+            self.assertTrue(np.array_equal(C.predict(self.W, self.assign), [2, 2, 2, 3]))
+            self.assertEqual(self.calls, [3])
+            self.assertEqual(C.info(), cache.CacheInfo(hits = 1, misses = 3, maxsize = 10, currsize = 3))
+
+        with self.subTest('Test cached rows are looked up'):
+            self.assertTrue(np.array_equal(C.predict(self.W[::-1], self.assign), [3, 2, 2, 2]))
+            self.assertEqual(self.calls, [3])
+            self.assertEqual(C.info().hits, 5)
+
+    def test_eviction(self):
+
+        C = cache.PredictionCache(maxsize = 2)
+        C.predict(self.W[:2], self.assign)
+        C.predict(self.W[:1], self.assign)
+        C.predict(self.W[3:], self.assign)
+
+        # the least recently used row [0, 1, 1] was evicted
+        self.assertEqual(len(C.labels), 2)
+        C.predict(self.W[1:2], self.assign)
+        self.assertEqual(self.calls, [2, 1, 1])
+
+    def test_non_binary(self):
+
+        C = cache.PredictionCache(maxsize = 10)
+        C.predict(self.W, self.assign)
+
+        # rows with the same nonzero entries but other values are not looked up
+        self.assertTrue(np.array_equal(C.predict(2*self.W, self.assign), [4, 4, 4, 6]))
+        self.assertTrue(np.array_equal(C.predict(np.array([[128]], dtype = np.uint8), self.assign), [128]))
+        self.assertEqual(self.calls, [3, 3, 1])
+
+    def test_model_cache(self):
+
+        W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+
+        for model_class in [blockdiagonalBMD_model, generalBMD_model]:
+            with self.subTest(model = model_class.__name__):
+                BMD_model = model_class(n_clusters = 4, seed = 12)
+                BMD_model_c = model_class(n_clusters = 4, seed = 12, cache_size = 1000)
+                BMD_model.fit(W)
+                BMD_model_c.fit(W)
+
+                self.assertIsNone(BMD_model.cache_info())
+                self.assertTrue(np.array_equal(BMD_model.predict(W), BMD_model_c.predict(W)))
+                self.assertTrue(np.array_equal(BMD_model.transform(W), BMD_model_c.transform(W)))
+                self.assertEqual(BMD_model_c.cache_info().hits, 100 + 100 - 58)
+
+                BMD_model_c.fit(W)
+                self.assertEqual(BMD_model_c.cache_info().currsize, 0)
+
+
+
+class TestFitCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.path)
+
+    def test_key(self):
+
+        C = cache.FitCache(self.path)
+        key = C.key(self.W, {'n_clusters': 4})
+
+        self.assertEqual(key, C.key(self.W.astype(bool), {'n_clusters': 4}))
+        self.assertNotEqual(key, C.key(self.W, {'n_clusters': 5}))
+        self.assertNotEqual(key, C.key(self.W[::-1], {'n_clusters': 4}))
+        self.assertNotEqual(key, C.key(self.W, {'n_clusters': 4}, weights = np.ones(self.W.shape[0])))
+
+        # data that is not binary is not reduced to its nonzero entries
+        self.assertNotEqual(key, C.key(2*self.W, {'n_clusters': 4}))
+        self.assertNotEqual(C.key(2*self.W, {'n_clusters': 4}), C.key(3*self.W, {'n_clusters': 4}))
+        self.assertEqual(C.key(2*self.W, {'n_clusters': 4}), C.key(2*self.W, {'n_clusters': 4}))
+
+    def test_get_put(self):
+
+        C = cache.FitCache(self.path)
+        arrays = {'B': np.eye(3), 'cost': np.float64(1.5)}
+
+        with self.subTest('Test stored arrays are loaded'):
+            self.assertIsNone(C.get('a'))
+            C.put('a', arrays)
+            loaded = C.get('a')
+            self.assertTrue(np.array_equal(loaded['B'], arrays['B']))
+            self.assertEqual(loaded['cost'], 1.5)
+            self.assertEqual((C.info().hits, C.info().misses), (1, 1))
+
+        with self.subTest('Test corrupted fits are removed'):
+            C.put('b', arrays)
+            os.replace(os.path.join(self.path, 'a.npz'), os.path.join(self.path, 'b.npz'))
+            self.assertIsNone(C.get('b'))
+            self.assertEqual(os.listdir(self.path), [])
+
+    def test_eviction(self):
+
+        C = cache.FitCache(self.path)
+        arrays = {'B': np.zeros(100)}
+        C.put('a', arrays)
+        size = C.info().currsize
+
+        C = cache.FitCache(self.path, max_bytes = 2*size)
+        C.put('b', arrays)
+        os.utime(os.path.join(self.path, 'a.npz'), ns = (0, 0))
+        os.utime(os.path.join(self.path, 'b.npz'), ns = (1, 1))
+        C.get('a')
+        C.put('c', arrays)
+
+        # the least recently used fit 'b' was removed
+        self.assertEqual(sorted(os.listdir(self.path)), ['a.npz', 'c.npz'])
+
+    def test_model_fit_cache(self):
+
+        for model_class in [blockdiagonalBMD_model, generalBMD_model, bisectingBMD_model]:
+            with self.subTest(model = model_class.__name__):
+                BMD_model = model_class(n_clusters = 4, seed = 12, fit_cache_dir = self.path)
+                BMD_model.fit(self.W)
+
+                calls = []
+                BMD_model_c = model_class(n_clusters = 4, seed = 12, fit_cache_dir = self.path)
+                BMD_model_c.fit(self.W, callback = lambda n_iter, cost: calls.append(n_iter))
+
+                self.assertEqual(calls, [])
+                self.assertEqual(BMD_model.cost, BMD_model_c.cost)
+                self.assertTrue(np.array_equal(BMD_model.A, BMD_model_c.A))
+                self.assertTrue(np.array_equal(BMD_model.B, BMD_model_c.B))
+                self.assertTrue(np.array_equal(BMD_model.predict(self.W), BMD_model_c.predict(self.W)))
+                self.assertEqual(getattr(BMD_model, 'hierarchy', None), getattr(BMD_model_c, 'hierarchy', None))
+
+                BMD_model_c = model_class(n_clusters = 4, seed = 13, fit_cache_dir = self.path)
+                BMD_model_c.fit(self.W, callback = lambda n_iter, cost: calls.append(n_iter))
+                self.assertNotEqual(calls, [])
+
+        self.assertEqual(len(os.listdir(self.path)), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
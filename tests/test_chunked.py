@@ -0,0 +1,135 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from .context import chunked
+from .context import blockdiagonalBMD
+from .context import generalBMD
+from .context import blockdiagonalBMD_model
+from .context import generalBMD_model
+
+
+class TestChunked(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+        self.n, self.m = self.W.shape
+        self.K = 4
+
+        self.labels = np.arange(self.n) % self.K
+        self.A = np.zeros((self.n, self.K))
+        self.A[np.arange(self.n), self.labels] = 1
+
+    def test_iter_chunks(self):
+
+        for prefetch in [True, False]:
+            with self.subTest(prefetch = prefetch):
+                chunks = list(chunked.iter_chunks(self.W, chunk_size = 7, prefetch = prefetch))
+                self.assertEqual([start for start, _ in chunks], list(range(0, self.n, 7)))
+                self.assertTrue(np.array_equal(np.vstack([chunk for _, chunk in chunks]), self.W))
+
+    def test_chunk_rows(self):
+
+        with self.subTest('Test default'):
+            self.assertEqual(chunked.chunk_rows(self.W, self.K), chunked.DEFAULT_CHUNK_ROWS)
+
+        with self.subTest('Test memory budget'):
+            # two blocks of 8 bytes per entry and 8 bytes per distance, plus the raw float64 rows
+            row_bytes = 8*self.m + 8*(self.m + self.K)
+            self.assertEqual(chunked.chunk_rows(self.W, self.K, max_memory = 20*row_bytes), 10)
+
+    def test_run_bd_BMD_chunked(self):
+
+        cost, A, B = blockdiagonalBMD.run_bd_BMD(self.A, self.W)
+        cost_c, labels, B_c = chunked.run_bd_BMD_chunked(self.labels, self.W, self.K, chunk_size = 7)
+
+        self.assertAlmostEqual(cost, cost_c)
+        self.assertTrue(np.array_equal(A.argmax(axis = 1), labels))
+        self.assertTrue(np.array_equal(B, B_c))
+
+    def test_run_BMD_chunked(self):
+
+        for B_init in [np.arange(self.m), np.identity(self.m)]:
+            with self.subTest(labels = B_init.ndim == 1):
+                cost, A, B, X = generalBMD.run_BMD(self.A, B_init, self.W, verbose = 0)
+                cost_c, labels, B_c, X_c = chunked.run_BMD_chunked(self.labels, B_init, self.W, self.K, chunk_size = 7)
+
+                self.assertAlmostEqual(cost, cost_c)
+                self.assertTrue(np.array_equal(A.argmax(axis = 1), labels))
+                self.assertTrue(np.array_equal(B, B_c))
+                self.assertTrue(np.allclose(X, X_c))
+
+
+    def test_deadline(self):
+
+        class CountingDeadline:
+            """ Expires at the given call of expired(). """
+            def __init__(self, calls):
+                self.calls = calls
+                self.truncated = False
+            def expired(self):
+                self.calls -= 1
+                self.truncated = self.calls <= 0
+                return self.truncated
+
+        # 15 blocks per pass, the deadline expires in the middle of the second pass
+        cost, labels, B = chunked.run_bd_BMD_chunked(self.labels, self.W, self.K, max_iter = 1, chunk_size = 7)
+        deadline = CountingDeadline(20)
+        cost_d, labels_d, B_d = chunked.run_bd_BMD_chunked(self.labels, self.W, self.K, chunk_size = 7, deadline = deadline)
+
+        self.assertTrue(deadline.truncated)
+        self.assertEqual(cost, cost_d)
+        self.assertTrue(np.array_equal(labels, labels_d))
+        self.assertTrue(np.array_equal(B, B_d))
+
+
+class TestChunkedModel(unittest.TestCase):
+
+    def setUp(self):
+
+        W = np.loadtxt(open('tests/data/test_set_3.csv', 'r'), delimiter = ',')
+        self.path = tempfile.mkdtemp()
+        self.W = np.memmap(os.path.join(self.path, 'W.dat'), dtype = np.uint8, mode = 'w+', shape = W.shape)
+        self.W[:] = W
+        self.W.flush()
+
+    def tearDown(self):
+
+        del self.W
+        shutil.rmtree(self.path)
+
+    def test_memmap_fit(self):
+
+        for model in [blockdiagonalBMD_model(n_clusters = 3, seed = 12), generalBMD_model(n_clusters = 3, seed = 12)]:
+            with self.subTest(model = type(model).__name__):
+                model.fit(self.W)
+                self.assertEqual(model._A.ndim, 1)
+                self.assertEqual(model.A.shape, (15, 3))
+                self.assertEqual(len(model.get_data_labels()), 15)
+
+    def test_memmap_in_memory_options(self):
+
+        W = np.asarray(self.W)
+        params = [{'use_bootstrap': True, 'b': 10}, {'init': 'kmeans++'}, {'collapse_duplicates': True, 'n_clusters': 2}]
+        for param in params:
+            with self.subTest(**param):
+                param = dict({'n_clusters': 3, 'seed': 12}, **param)
+                model = blockdiagonalBMD_model(**param)
+                model.fit(self.W)
+                expected = blockdiagonalBMD_model(**param)
+                expected.fit(W)
+                self.assertTrue(np.array_equal(model.A, expected.A))
+                self.assertTrue(np.array_equal(model.B, expected.B))
+
+    def test_out_of_core_errors(self):
+
+        model = blockdiagonalBMD_model(n_clusters = 3, init = 'kmeans++', max_memory = 2**10)
+        with self.assertRaises(ValueError):
+            model.fit(self.W)
+
+
+if __name__ == '__main__':
+    unittest.main()
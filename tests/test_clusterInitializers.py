@@ -81,6 +81,11 @@ class TestInitializeB(unittest.TestCase):
             B = cluster_initializers.initialize_B(self.m, B_ident = True)
             self.assertTrue(np.array_equal(np.identity(self.m), B))
 
+        with self.subTest('Check B_ident as labels'):
+            # The identity is represented by a vector of feature labels.
+            B = cluster_initializers.initialize_B(self.m, B_ident = True, as_labels = True)
+            self.assertTrue(np.array_equal(np.arange(self.m), B))
+
     
     # def test_check_assertions(self):
 
@@ -109,5 +114,33 @@ class TestInitializeB(unittest.TestCase):
             with self.assertRaises(AssertionError):
                 cluster_initializers.initialize_B(self.m, B_ident = False, f_clusters = 1)
 
+class TestInitializeAKmeanspp(unittest.TestCase):
+
+    def setUp(self):
+        self.W = np.loadtxt(open('tests/data/test_set_3.csv', 'r'), delimiter = ',')
+        self.K = 3
+        self.seed = 123
+
+    def test_initialize_A_kmeanspp_output(self):
+
+        A = cluster_initializers.initialize_A_kmeanspp(self.W, self.K, seed = self.seed)
+
+        with self.subTest('Check each point assigned exactly one cluster'):
+            self.assertTrue(np.array_equal(A.sum(axis = 1), np.ones(self.W.shape[0])))
+
+        with self.subTest('Check seeds recover the blocks'):
+            # Each block of 5 identical rows is at distance 4 from the other blocks, so
+            # distance-proportional seeding picks one seed per block.
+            labels = A.argmax(axis = 1)
+            for i in range(0, 15, 5):
+                self.assertEqual(len(set(labels[i:i+5])), 1)
+            self.assertEqual(len(set(labels)), self.K)
+
+    def test_initialize_A_kmeanspp_assertions(self):
+
+        with self.assertRaises(AssertionError):
+            cluster_initializers.initialize_A_kmeanspp(self.W, self.W.shape[0])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import numpy as np
+
+from .context import coreset
+from .context import blockdiagonalBMD_model
+from .context import generalBMD_model
+from .context import blockdiagonalBMD
+
+
+class TestCoreset(unittest.TestCase):
+
+    def setUp(self):
+
+        # 4 clusters of very different sizes
+        np.random.seed(2)
+        self.K = 4
+        prototypes = np.random.rand(self.K, 30) < 0.3
+        labels = np.random.choice(self.K, size = 4000, p = [0.6, 0.3, 0.08, 0.02])
+        self.W = (prototypes[labels] != (np.random.rand(4000, 30) < 0.05)).astype(int)
+        np.random.seed(None)
+
+        self.model = blockdiagonalBMD_model(self.K, seed = 3, init = 'kmeans++')
+        self.model.fit(self.W)
+
+    def estimate(self, W_c, w_c):
+        """ Cost of the fitted model estimated from a coreset. """
+        return np.sqrt(np.dot(w_c, blockdiagonalBMD._bd_distances(self.model.B, W_c).min(axis = 1)))
+
+    def test_build_coreset(self):
+
+        W_c, w_c = coreset.build_coreset(self.W, self.K, 400, max_memory = 2**14, seed = 1)
+
+        self.assertLessEqual(len(W_c), 400)
+        self.assertAlmostEqual(w_c.sum() / len(self.W), 1, delta = 0.1)
+        self.assertAlmostEqual(self.estimate(W_c, w_c) / self.model.cost, 1, delta = 0.1)
+
+        with self.subTest('Test seed'):
+            W_s, w_s = coreset.build_coreset(self.W, self.K, 400, max_memory = 2**14, seed = 1)
+            self.assertTrue(np.array_equal(W_c, W_s))
+            self.assertTrue(np.array_equal(w_c, w_s))
+
+    def test_small_blocks(self):
+
+        builder = coreset.CoresetBuilder(self.K, 400, seed = 1)
+
+        with self.subTest('Test no rows'):
+            with self.assertRaises(ValueError):
+                builder.coreset()
+
+        with self.subTest('Test rows held until there are more than n_clusters'):
+            builder.add(self.W[:2])
+            builder.add(self.W[2:4], weights = [2, 2])
+            W_c, w_c = builder.coreset()
+            self.assertTrue(np.array_equal(W_c, self.W[:4]))
+            self.assertTrue(np.array_equal(w_c, [1, 1, 2, 2]))
+
+        with self.subTest('Test blocks of one row'):
+            for i in range(4, 20):
+                builder.add(self.W[i:i+1])
+            builder.add(self.W[20:])
+            W_c, w_c = builder.coreset()
+            self.assertLessEqual(len(W_c), 400)
+            self.assertAlmostEqual(w_c.sum() / (len(self.W) + 2), 1, delta = 0.1)
+
+        with self.subTest('Test too few clusters'):
+            with self.assertRaises(ValueError):
+                coreset.CoresetBuilder(1, 400)
+
+    def test_merge_coresets(self):
+
+        shards = [coreset.build_coreset(self.W[i::2], self.K, 400, seed = i + 1) for i in range(2)]
+
+        with self.subTest('Test union'):
+            W_c, w_c = coreset.merge_coresets(shards)
+            self.assertEqual(len(W_c), sum(len(W_s) for W_s, _ in shards))
+            self.assertAlmostEqual(self.estimate(W_c, w_c) / self.model.cost, 1, delta = 0.1)
+
+        with self.subTest('Test reduction'):
+            W_c, w_c = coreset.merge_coresets(shards, n_clusters = self.K, size = 400, seed = 5)
+            self.assertLessEqual(len(W_c), 400)
+            self.assertAlmostEqual(self.estimate(W_c, w_c) / self.model.cost, 1, delta = 0.15)
+
+    def test_fit_sample_weight(self):
+
+        # integer weights count as duplicate rows
+        W_unique, counts = self.W[:300], np.random.randint(1, 4, size = 300)
+        W_duplicated = np.repeat(W_unique, counts, axis = 0)
+
+        for model_class in [blockdiagonalBMD_model, generalBMD_model]:
+            with self.subTest(model = model_class.__name__):
+                weighted = model_class(self.K, seed = 4, collapse_duplicates = True)
+                weighted.fit(W_unique, sample_weight = counts)
+                duplicated = model_class(self.K, seed = 4, collapse_duplicates = True)
+                duplicated.fit(W_duplicated)
+
+                self.assertAlmostEqual(weighted.cost, duplicated.cost)
+                self.assertTrue(np.array_equal(weighted.B, duplicated.B))
+
+        with self.subTest('Test sample fit mode'):
+            with self.assertRaises(ValueError):
+                model = blockdiagonalBMD_model(self.K, fit_mode = 'sample', sample_size = 100)
+                model.fit(self.W, sample_weight = np.ones(len(self.W)))
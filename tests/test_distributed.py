@@ -0,0 +1,105 @@
+import unittest
+import numpy as np
+from multiprocessing import Pipe
+
+from .context import distributed
+from .context import chunked
+from .context import cluster_initializers
+from .context import blockdiagonalBMD_model
+from .context import generalBMD_model
+
+
+class TestDistributed(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+        self.n, self.m = self.W.shape
+        self.shards = np.array_split(self.W.astype(np.uint8), 3)
+
+        # labels initialized by the workers, shard i with seed + i
+        self.labels = np.concatenate([cluster_initializers.initialize_labels(len(W), 4, seed = 7 + i) for i, W in enumerate(self.shards)])
+
+    def test_connection_transport(self):
+
+        a, b = Pipe()
+        transport_a, transport_b = distributed.ConnectionTransport(a), distributed.ConnectionTransport(b)
+        transport_a.send(('pass', 4, (np.ones((3, 2)),)))
+        message = transport_b.recv()
+
+        self.assertEqual(message[:2], ('pass', 4))
+        self.assertTrue(np.array_equal(message[2][0], np.ones((3, 2))))
+        self.assertEqual(transport_a.bytes_sent, transport_b.bytes_received)
+        self.assertGreater(transport_a.bytes_sent, 0)
+
+        transport_a.close()
+        transport_b.close()
+
+    def test_fit_distributed(self):
+
+        cost, labels, B = chunked.run_bd_BMD_chunked(self.labels, self.W, 4)
+        cost_g, labels_g, B_g, X_g = chunked.run_BMD_chunked(self.labels, np.arange(self.m), self.W, 4)
+
+        with distributed.LocalCluster(self.shards) as cluster:
+
+            with self.subTest(model = 'blockdiagonalBMD'):
+                model = distributed.fit_distributed(blockdiagonalBMD_model(n_clusters = 4, seed = 7), cluster.transports)
+
+                self.assertEqual(model.cost, cost)
+                self.assertTrue(np.array_equal(model.get_data_labels(), labels))
+                self.assertTrue(np.array_equal(model.B, B))
+
+                # init, one pass per iteration and the labels
+                self.assertEqual([r.name for r in model.rounds[:2]], ['init', 'pass'])
+                self.assertEqual(model.rounds[-1].name, 'labels')
+                self.assertTrue(all(r.bytes_sent > 0 and r.bytes_received > 0 and r.latency >= 0 for r in model.rounds))
+
+            with self.subTest(model = 'generalBMD'):
+                model = distributed.fit_distributed(generalBMD_model(n_clusters = 4, seed = 7), cluster.transports)
+
+                self.assertAlmostEqual(model.cost, cost_g)
+                self.assertTrue(np.array_equal(model.get_data_labels(), labels_g))
+                self.assertTrue(np.allclose(model.X, X_g))
+
+        with self.subTest('Test unsupported options'):
+            with self.assertRaises(ValueError):
+                distributed.fit_distributed(blockdiagonalBMD_model(n_clusters = 4, init = 'kmeans++'), [])
+            with self.assertRaises(ValueError):
+                distributed.fit_distributed(blockdiagonalBMD_model(n_clusters = 4, checkpoint_dir = 'checkpoint'), [])
+
+    def test_fit_options(self):
+
+        with distributed.LocalCluster(self.shards) as cluster:
+
+            with self.subTest('Test callback'):
+                calls = []
+                model = distributed.fit_distributed(blockdiagonalBMD_model(n_clusters = 4, seed = 7), cluster.transports,
+                                                    callback = lambda n_iter, cost: calls.append(n_iter) or True)
+                self.assertEqual(calls, [1])
+                self.assertIsNone(model.W)
+                self.assertFalse(model.truncated)
+
+            with self.subTest('Test max_time'):
+                model = distributed.fit_distributed(generalBMD_model(n_clusters = 4, seed = 7, max_time = 0), cluster.transports)
+                self.assertTrue(model.truncated)
+                self.assertEqual([r.name for r in model.rounds], ['init', 'pass', 'labels'])
+
+            with self.subTest('Test shards with too few rows'):
+                with self.assertRaises(ValueError):
+                    distributed.fit_distributed(blockdiagonalBMD_model(n_clusters = 40, seed = 7), cluster.transports)
+
+    def test_authkey(self):
+
+        for authkey in [None, b'']:
+            with self.subTest(authkey = authkey):
+                with self.assertRaises(ValueError):
+                    distributed.serve(('localhost', 0), self.W, authkey = authkey)
+                with self.assertRaises(ValueError):
+                    distributed.accept_workers(('localhost', 0), 1, authkey = authkey)
+
+        with self.assertRaises(TypeError):
+            distributed.accept_workers(('localhost', 0), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
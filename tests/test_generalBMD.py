@@ -1,5 +1,6 @@
 import unittest
 import numpy as np
+from fractions import Fraction
 
 from .context import generalBMD
 
@@ -56,5 +57,106 @@ class TestExampleDataset_General(unittest.TestCase):
             self.assertTrue(np.array_equal(B, self.expected_AB))
 
 
+class TestFeatureLabels_General(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+        self.A = np.zeros((self.W.shape[0], 4))
+        self.A[np.arange(self.W.shape[0]), np.arange(self.W.shape[0]) % 4] = 1
+
+        self.labels = np.array([0, 2, 2, -1, 1])
+        self.B = np.zeros((5, 5))
+        self.B[[0, 1, 2, 4], [0, 2, 2, 1]] = 1
+
+    def test_feature_sums(self):
+
+        M = np.arange(15).reshape((3, 5))
+
+        with self.subTest('Test label vector matches indicator matrix'):
+            self.assertTrue(np.array_equal(generalBMD._feature_sums(M, self.labels), np.dot(M, self.B)))
+
+        with self.subTest('Test expansion of X'):
+            X = np.arange(10).reshape((2, 5))
+            self.assertTrue(np.array_equal(generalBMD._expand_X(X, self.labels), np.dot(X, self.B.T)))
+
+        with self.subTest('Test feature counts'):
+            self.assertTrue(np.array_equal(generalBMD._feature_counts(self.labels), self.B.sum(axis = 0)))
+
+    def test_run_BMD_identity_labels(self):
+        # The identity given as a vector of labels gives the same result as the identity matrix.
+
+        m = self.W.shape[1]
+
+        cost, A, B, X = generalBMD.run_BMD(self.A, np.identity(m), self.W, verbose = 0)
+        cost_l, A_l, B_l, X_l = generalBMD.run_BMD(self.A, np.arange(m), self.W, verbose = 0)
+
+        self.assertEqual(B_l.ndim, 1)
+        self.assertAlmostEqual(cost, cost_l)
+        self.assertTrue(np.array_equal(A, A_l))
+        self.assertTrue(np.array_equal(B.argmax(axis = 1)[B.sum(axis = 1) > 0], B_l[B_l >= 0]))
+        self.assertTrue(np.allclose(X, X_l))
+
+
+
+def _exact_labels(scores):
+    """ baseline rule: argmin of each row, -1 if all scores of the row are equal """
+    return np.array([-1 if len(set(row)) == 1 else row.index(min(row)) for row in scores])
+
+
+class TestTies_General(unittest.TestCase):
+    """ The labels of _updateA() and _updateB() match the baseline loops over Formulas 6 and 7 of Li (2005)
+    evaluated in exact arithmetic, on inputs full of tied scores. """
+
+    def setUp(self):
+
+        self.cases = []
+        for seed in range(200):
+            r = np.random.RandomState(seed)
+            n, m, K, C = r.randint(4, 30), r.randint(3, 12), r.randint(2, 6), r.randint(2, 5)
+            # few distinct rows and duplicated columns give many tied scores
+            base = (r.rand(r.randint(1, 4), m) < .5).astype(float)
+            W = base[r.randint(0, len(base), n)]
+            W[:, r.randint(0, m, m//2)] = W[:, r.randint(0, m, m//2)]
+            A = np.zeros((n, K))
+            B = np.zeros((m, C))
+            a, b = r.randint(-1, K, n), r.randint(-1, C, m)
+            A[np.where(a >= 0)[0], a[a >= 0]] = 1
+            B[np.where(b >= 0)[0], b[b >= 0]] = 1
+            self.cases.append((A, B, W))
+
+    def _exact_X(self, A, B, W):
+        T = np.dot(np.dot(A.T, W), B).astype(int)
+        p, q = A.sum(axis = 0).astype(int), B.sum(axis = 0).astype(int)
+        return [[Fraction(int(T[k, c]), int(p[k]*q[c])) if p[k]*q[c] else Fraction(0) for c in range(len(q))]
+                for k in range(len(p))]
+
+    def test_updateA_ties(self):
+
+        for A, B, W in self.cases:
+            X = self._exact_X(A, B, W)
+            scores = [[sum((int(W[i, j]) - X[k][c])**2 for j in range(W.shape[1]) for c in np.where(B[j])[0])
+                       for k in range(A.shape[1])] for i in range(W.shape[0])]
+            A_new = generalBMD._updateA(A, B, generalBMD._updateX(A, B, W), W)
+            labels = np.where(A_new.any(axis = 1), A_new.argmax(axis = 1), -1)
+            np.testing.assert_array_equal(labels, _exact_labels(scores))
+
+    def test_updateB_ties(self):
+
+        for A, B, W in self.cases:
+            X = self._exact_X(A, B, W)
+            scores = [[sum((int(W[i, j]) - X[k][c])**2 for i in range(W.shape[0]) for k in np.where(A[i])[0])
+                       for c in range(B.shape[1])] for j in range(W.shape[1])]
+            B_new = generalBMD._updateB(A, B, generalBMD._updateX(A, B, W), W)
+            labels = np.where(B_new.any(axis = 1), B_new.argmax(axis = 1), -1)
+            np.testing.assert_array_equal(labels, _exact_labels(scores))
+
+    def test_round_off_tie(self):
+
+        # Both scores of the point are 17/12, which the expanded form does not reproduce exactly.
+        scores = np.array([[1.4166666666666665, 1.4166666666666667], [1.0, 1.5]])
+        np.testing.assert_array_equal(generalBMD._score_labels(scores, generalBMD.TIE_TOL), [-1, 0])
+        np.testing.assert_array_equal(generalBMD._score_labels(scores), [0, 0])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
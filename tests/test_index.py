@@ -0,0 +1,83 @@
+import unittest
+import numpy as np
+
+from .context import index
+from .context import utils
+from .context import blockdiagonalBMD_model
+
+
+class TestHammingLSH(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.RandomState(3)
+        self.C = (rng.rand(200, 64) < 0.3).astype(float)
+        labels = rng.randint(200, size = 500)
+        self.W = (self.C[labels].astype(bool) ^ (rng.rand(500, 64) < 0.03)).astype(float)
+        self.exact = utils.sq_distances(self.W, self.C).argmin(axis = 1)
+
+    def test_candidates(self):
+
+        lsh = index.HammingLSH(self.C, n_tables = 4, n_bits = 8, max_candidates = 1.0, seed = 5)
+        points, clusters = lsh.candidates(self.C)
+
+        with self.subTest('Test every centroid is its own candidate'):
+            self.assertTrue(np.all(np.isin(np.arange(200)*200 + np.arange(200), points*200 + clusters)))
+
+        with self.subTest('Test candidates share a bucket in some table'):
+            keys = lsh._keys(self.C)
+            self.assertTrue(np.all(np.any(keys[:, points] == keys[:, clusters], axis = 0)))
+
+        with self.subTest('Test points with too many candidates are left to the exact scan'):
+            lsh_capped = index.HammingLSH(self.C, n_tables = 4, n_bits = 8, max_candidates = 0.1, seed = 5)
+            capped_points, _ = lsh_capped.candidates(self.C)
+            self.assertLessEqual(np.bincount(capped_points).max(), 20)
+            self.assertTrue(np.array_equal(np.unique(capped_points), np.where(np.bincount(points) <= 20)[0]))
+
+    def test_sparse_centroids(self):
+
+        # Block-diagonal centroids, each with 4 of 4000 features, mostly share the all-zero key.
+        rng = np.random.RandomState(7)
+        C = np.kron(np.eye(1000), np.ones((1, 4)))
+        labels = rng.randint(1000, size = 2000)
+        W = (C[labels].astype(bool) ^ (rng.rand(2000, 4000) < 0.0005)).astype(float)
+
+        lsh = index.HammingLSH(C, n_tables = 16, n_bits = 16, seed = 5)
+        points, clusters = lsh.candidates(W)
+
+        with self.subTest('Test the shortlists are well below K'):
+            self.assertLessEqual(np.bincount(points, minlength = 2000).max(), 100)
+            self.assertLess(len(points), 2000*10)
+
+        with self.subTest('Test the query mostly matches the exact scan'):
+            self.assertGreater(np.mean(lsh.query(W) == utils.sq_distances(W, C).argmin(axis = 1)), 0.9)
+
+    def test_query(self):
+
+        lsh = index.HammingLSH(self.C, n_tables = 32, n_bits = 12, seed = 5)
+        self.assertGreater(np.mean(lsh.query(self.W) == self.exact), 0.99)
+
+    def test_exact_fallback(self):
+
+        # With every feature sampled, only exact copies of a centroid have candidates.
+        lsh_all = index.HammingLSH(self.C[:, :63], n_tables = 1, n_bits = 63, seed = 5)
+        self.assertTrue(np.array_equal(lsh_all.query(self.W[:, :63]), utils.sq_distances(self.W[:, :63], self.C[:, :63]).argmin(axis = 1)))
+
+        with self.assertRaises(ValueError):
+            index.HammingLSH(self.C, n_bits = 64)
+
+    def test_model_index(self):
+
+        W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+
+        BMD_model = blockdiagonalBMD_model(n_clusters = 4, seed = 12)
+        BMD_model_i = blockdiagonalBMD_model(n_clusters = 4, seed = 12, index_tables = 32, index_bits = 4)
+        BMD_model.fit(W)
+        BMD_model_i.fit(W)
+
+        self.assertIsNotNone(BMD_model_i.index)
+        self.assertTrue(np.array_equal(BMD_model.predict(W), BMD_model_i.predict(W)))
+
+
+if __name__ == '__main__':
+    unittest.main()
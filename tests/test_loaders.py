@@ -0,0 +1,104 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from .context import loaders
+from .context import blockdiagonalBMD_model
+from .context import generalBMD_model
+
+
+class TestLoaders(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/li_zhu.csv', 'r'), delimiter = ',', skiprows = 1)
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.path)
+
+    def test_read_csv(self):
+
+        for block_size, n_jobs in [(loaders.DEFAULT_BLOCK_SIZE, 1), (16, 1), (16, 3)]:
+            with self.subTest(block_size = block_size, n_jobs = n_jobs):
+                W = loaders.read_csv('tests/data/li_zhu.csv', skiprows = 1, block_size = block_size, n_jobs = n_jobs)
+                self.assertEqual(W.dtype, np.uint8)
+                self.assertTrue(np.array_equal(W, self.W))
+
+    def test_read_csv_fallback(self):
+
+        # fields of more than one character are parsed with np.loadtxt()
+        csv_path = os.path.join(self.path, 'W.csv')
+        np.savetxt(csv_path, self.W, delimiter = ';', fmt = '%.1f', header = 'header')
+
+        W = loaders.read_csv(csv_path, delimiter = ';', skiprows = 1, block_size = 16)
+        self.assertTrue(np.array_equal(W, self.W))
+
+    def test_read_csv_empty(self):
+
+        csv_path = os.path.join(self.path, 'W.csv')
+        for content in ['', 'a,b,c\n', '\n\n']:
+            with self.subTest(content = content):
+                with open(csv_path, 'w') as f:
+                    f.write(content)
+                with self.assertRaises(ValueError):
+                    loaders.read_csv(csv_path, skiprows = 1 if content.startswith('a') else 0)
+
+    def test_packed(self):
+
+        packed_path = os.path.join(self.path, 'W.bmd')
+        W = loaders.csv_to_packed('tests/data/li_zhu.csv', packed_path, skiprows = 1, block_size = 16)
+
+        self.assertEqual(W.shape, self.W.shape)
+        self.assertTrue(np.array_equal(W[:], self.W))
+        self.assertTrue(np.array_equal(W[2:5], self.W[2:5]))
+        self.assertTrue(np.array_equal(np.asarray(W), self.W))
+
+        with self.subTest('Test row and column indexes'):
+            cols = [0, 3, 5]
+            self.assertEqual(W[2, 3], self.W[2, 3])
+            self.assertTrue(np.array_equal(W[:, cols], self.W[:, cols]))
+            self.assertTrue(np.array_equal(W[2:5, 1:4], self.W[2:5, 1:4]))
+            self.assertTrue(np.array_equal(W[4, cols], self.W[4, cols]))
+            self.assertTrue(np.array_equal(W[(slice(1, 3),)], self.W[1:3]))
+            with self.assertRaises(IndexError):
+                W[..., 0]
+            with self.assertRaises(IndexError):
+                W[0, 0, 0]
+
+        with open(os.path.join(self.path, 'other.bin'), 'wb') as f:
+            f.write(b'\0'*loaders.HEADER_SIZE)
+        with self.assertRaises(ValueError):
+            loaders.read_packed(os.path.join(self.path, 'other.bin'))
+
+    def test_read_npy(self):
+
+        npy_path = os.path.join(self.path, 'W.npy')
+        np.save(npy_path, self.W.astype(np.uint8))
+
+        W = loaders.read_npy(npy_path)
+        self.assertIsInstance(W, np.memmap)
+        self.assertTrue(np.array_equal(W, self.W))
+
+    def test_fit_predict_packed(self):
+
+        packed_path = os.path.join(self.path, 'W.bmd')
+        loaders.write_packed(packed_path, self.W)
+        W = loaders.read_packed(packed_path)
+
+        for model, model_c in [(blockdiagonalBMD_model(n_clusters = 3, seed = 3, max_memory = 2**30), blockdiagonalBMD_model(n_clusters = 3, seed = 3)),
+                               (generalBMD_model(n_clusters = 3, seed = 3, max_memory = 2**30), generalBMD_model(n_clusters = 3, seed = 3))]:
+            with self.subTest(model = type(model).__name__):
+                model.fit(self.W)
+                model_c.fit(W)
+                self.assertEqual(model_c._A.ndim, 1)
+                self.assertTrue(np.array_equal(model.get_data_labels(), model_c.get_data_labels()))
+                self.assertTrue(np.array_equal(model_c.predict(W), model_c.predict(self.W)))
+                self.assertTrue(np.array_equal(model_c.transform(W), model_c.transform(self.W)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest import mock
+import numpy as np
+
+from .context import parallel
+from .context import chunked
+
+
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+        self.n, self.m = self.W.shape
+        self.K = 4
+
+        self.labels = np.arange(self.n) % self.K
+        self.weights = np.arange(self.n) % 3 + 1.0
+
+    def test_run_bd_BMD_parallel(self):
+
+        cost, labels, B = chunked.run_bd_BMD_chunked(self.labels, self.W, self.K, weights = self.weights, chunk_size = 7)
+
+        for n_jobs in [1, 3]:
+            with self.subTest(n_jobs = n_jobs):
+                cost_p, labels_p, B_p = parallel.run_bd_BMD_parallel(self.labels, self.W.astype(np.uint8), self.K, weights = self.weights,
+                                                                     n_jobs = n_jobs, chunk_size = 7)
+
+                self.assertEqual(cost, cost_p)
+                self.assertTrue(np.array_equal(labels, labels_p))
+                self.assertTrue(np.array_equal(B, B_p))
+
+    def test_run_BMD_parallel(self):
+
+        for B_init in [np.arange(self.m), np.identity(self.m)]:
+            with self.subTest(labels = B_init.ndim == 1):
+                cost, labels, B, X = chunked.run_BMD_chunked(self.labels, B_init, self.W, self.K, chunk_size = 7)
+                cost_p, labels_p, B_p, X_p = parallel.run_BMD_parallel(self.labels, B_init, self.W, self.K, n_jobs = 2, chunk_size = 7)
+
+                self.assertAlmostEqual(cost, cost_p)
+                self.assertTrue(np.array_equal(labels, labels_p))
+                self.assertTrue(np.array_equal(B, B_p))
+                self.assertTrue(np.allclose(X, X_p))
+
+    def test_shared_partitions(self):
+
+        with parallel._SharedPartitions(self.W, self.labels, None, 3, 7) as partitions:
+            names = [segment.name for segment in partitions.segments]
+            self.assertTrue(np.array_equal(np.vstack([arrays['W'] for arrays in partitions.arrays]), self.W))
+            self.assertTrue(np.array_equal(partitions.labels(), self.labels))
+
+        # the segments are freed on exit
+        for name in names:
+            with self.assertRaises(FileNotFoundError):
+                parallel.shared_memory.SharedMemory(name = name)
+
+    def test_open_untracked(self):
+
+        segment, _ = parallel._create((4,), np.uint8)
+        try:
+            with mock.patch.object(parallel.resource_tracker, 'register') as register:
+                attached = parallel._open(segment.name)
+                attached.close()
+            # only the creating process tracks the segment
+            register.assert_not_called()
+        finally:
+            segment.close()
+            segment.unlink()
+
+
+if __name__ == '__main__':
+    unittest.main()
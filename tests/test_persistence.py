@@ -0,0 +1,151 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+
+from .context import blockdiagonalBMD_model
+from .context import generalBMD_model
+from .context import persistence
+
+
+class TestPersistence(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/test_set_4.csv', 'r'), delimiter = ',')
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.path)
+
+    def test_save_load_general(self):
+
+        model = generalBMD_model(n_clusters = 3, B_ident = True, seed = 1234)
+        model.fit(self.W)
+        model.save(self.path)
+
+        loaded = generalBMD_model.load(self.path)
+
+        with self.subTest('Test arrays are memory-mapped'):
+            self.assertTrue(isinstance(loaded.X, np.memmap))
+
+        with self.subTest('Test parameters and cost are restored'):
+            self.assertEqual(loaded.n_clusters, 3)
+            self.assertEqual(loaded.seed, 1234)
+            self.assertEqual(loaded.cost, model.cost)
+
+        with self.subTest('Test feature clusters match'):
+            self.assertTrue(np.array_equal(loaded.B, model.B))
+            self.assertTrue(np.array_equal(loaded.get_feature_labels(), model.get_feature_labels()))
+
+        with self.subTest('Test predictions match'):
+            self.assertTrue(np.array_equal(loaded.predict(self.W), model.predict(self.W)))
+
+    def test_load_wrong_model(self):
+
+        model = blockdiagonalBMD_model(n_clusters = 3, use_bootstrap = True, b = 5, seed = 123)
+        model.fit(self.W)
+        model.save(self.path)
+
+        with self.assertRaises(ValueError):
+            generalBMD_model.load(self.path)
+
+        loaded = blockdiagonalBMD_model.load(self.path)
+        self.assertTrue(isinstance(loaded.B, np.memmap))
+        self.assertTrue(np.array_equal(loaded.B, model.B))
+
+    def test_pickle_drops_training_arrays(self):
+
+        model = blockdiagonalBMD_model(n_clusters = 3, use_bootstrap = True, b = 5, seed = 123)
+        model.fit(self.W)
+
+        unpickled = pickle.loads(pickle.dumps(model))
+
+        with self.subTest('Test training data dropped'):
+            self.assertFalse(hasattr(unpickled, 'W'))
+
+        with self.subTest('Test data clusters kept'):
+            self.assertTrue(np.array_equal(unpickled.A, model.A))
+            self.assertTrue(np.array_equal(unpickled.get_data_labels(), model.get_data_labels()))
+
+        with self.subTest('Test predictions match'):
+            self.assertTrue(np.array_equal(unpickled.predict(self.W), model.predict(self.W)))
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.path)
+
+    def test_save_load_checkpoint(self):
+
+        B = np.random.RandomState(0).rand(21, 7) < 0.3
+        labels = np.array([0, 3, -1, 6])
+        np.random.seed(3)
+        persistence.save_checkpoint(self.path, 4, 12.5, labels, B, 7, fingerprint = 'ab12')
+        expected = np.random.rand(5)
+        state = persistence.load_checkpoint(self.path)
+
+        # the saved random state is returned without replacing the global one
+        self.assertFalse(np.array_equal(np.random.rand(5), expected))
+        self.assertTrue(np.array_equal(state['random_state'].rand(5), expected))
+        self.assertEqual(state['fingerprint'], 'ab12')
+        np.random.seed(None)
+
+        self.assertEqual(os.listdir(self.path), [persistence.CHECKPOINT_FILE])
+        self.assertEqual((state['n_iter'], state['cost'], state['n_clusters']), (4, 12.5, 7))
+        self.assertTrue(np.array_equal(state['labels'], labels))
+        self.assertTrue(np.array_equal(state['B'], B))
+        self.assertEqual(state['B'].dtype, B.dtype)
+
+    def test_resume(self):
+
+        def interrupt(n_iter, cost):
+            if n_iter == 3:
+                raise KeyboardInterrupt()
+
+        models = [(blockdiagonalBMD_model, {}), (generalBMD_model, {}), (generalBMD_model, {'B_ident': False, 'f_clusters': 5})]
+        for model_class, params in models:
+            for W in [self.W, np.memmap(os.path.join(self.path, 'W.dat'), dtype = np.uint8, mode = 'w+', shape = self.W.shape)]:
+                with self.subTest(model = model_class.__name__, params = params, out_of_core = isinstance(W, np.memmap)):
+                    W[:] = self.W
+                    expected = model_class(n_clusters = 7, seed = 2, **params)
+                    expected.fit(W)
+
+                    path = os.path.join(self.path, 'checkpoint')
+                    model = model_class(n_clusters = 7, seed = 2, checkpoint_dir = path, checkpoint_every = 2, **params)
+                    with self.assertRaises(KeyboardInterrupt):
+                        model.fit(W, callback = interrupt)
+                    self.assertEqual(persistence.load_checkpoint(path)['n_iter'], 2)
+
+                    resumed = model_class(n_clusters = 7, seed = 2, **params)
+                    iterations = []
+                    resumed.fit(W, resume_from = path, callback = lambda n_iter, cost: iterations.append(n_iter))
+
+                    self.assertEqual(iterations[0], 3)
+                    self.assertEqual(resumed.cost, expected.cost)
+                    self.assertTrue(np.array_equal(resumed.A, expected.A))
+                    self.assertTrue(np.array_equal(resumed.B, expected.B))
+                    if model_class is generalBMD_model:
+                        self.assertTrue(np.array_equal(resumed.X, expected.X))
+
+        with self.subTest('Test mismatched checkpoint'):
+            with self.assertRaises(ValueError):
+                blockdiagonalBMD_model(n_clusters = 5).fit(self.W, resume_from = path)
+
+        with self.subTest('Test checkpoint of other data of the same shape'):
+            with self.assertRaises(ValueError):
+                generalBMD_model(n_clusters = 7, B_ident = False, f_clusters = 5).fit(1 - self.W, resume_from = path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+
+from .context import selection
+from .context import blockdiagonalBMD_model
+from .context import generalBMD_model
+
+
+class TestSelection(unittest.TestCase):
+
+    def setUp(self):
+
+        # 5 blocks of 8 features with 5% of the entries flipped
+        np.random.seed(1)
+        self.K = 5
+        labels = np.random.randint(self.K, size = 300)
+        self.W = (np.kron(np.eye(self.K), np.ones((1, 8)))[labels] != (np.random.rand(300, 40) < 0.05)).astype(int)
+        np.random.seed(None)
+
+    def test_split_clusters(self):
+
+        A = np.zeros((300, 2))
+        A[np.arange(300), np.arange(300) % 2] = 1
+        A = selection._split_clusters(A, self.W, np.ones(300), 4)
+
+        self.assertEqual(A.shape, (300, 4))
+        self.assertTrue(np.array_equal(A.sum(axis = 1), np.ones(300)))
+        self.assertTrue((A.sum(axis = 0) > 0).all())
+
+    def test_select_n_clusters(self):
+
+        model = blockdiagonalBMD_model(2, seed = 3)
+
+        for criterion in ['bic', 'elbow']:
+            with self.subTest(criterion = criterion):
+                s = selection.select_n_clusters(self.W, range(2, 9), model = model, criterion = criterion)
+                self.assertEqual(s.n_clusters, self.K)
+                self.assertEqual(s.costs.shape, (7,))
+
+        with self.subTest('Test parallel bootstrap replicates'):
+            s = selection.select_n_clusters(self.W, range(2, 9), model = model, n_bootstrap = 3, seed = 5)
+            s_parallel = selection.select_n_clusters(self.W, range(2, 9), model = model, n_bootstrap = 3, seed = 5, n_jobs = 2)
+            self.assertEqual(s.n_clusters, self.K)
+            self.assertTrue(np.array_equal(s.costs, s_parallel.costs))
+            self.assertTrue(np.array_equal(s.costs_std, s_parallel.costs_std))
+
+        with self.subTest('Test default model'):
+            self.assertEqual(selection.select_n_clusters(self.W, range(2, 9)).n_clusters, self.K)
+
+    def test_select_f_clusters(self):
+
+        model = generalBMD_model(2, B_ident = False, f_clusters = 2, seed = 3)
+        s = selection.select_n_clusters(self.W, range(2, 6), model = model, f_range = [2, 3])
+
+        self.assertIn(s.f_clusters, [2, 3])
+        self.assertEqual(s.costs.shape, (2, 4))
+        self.assertEqual(s.bic.shape, (2, 4))
+
+    def test_errors(self):
+
+        with self.subTest('Test unknown criterion'):
+            with self.assertRaises(ValueError):
+                selection.select_n_clusters(self.W, range(2, 5), criterion = 'aic')
+
+        with self.subTest('Test f_range without feature clusters'):
+            with self.assertRaises(ValueError):
+                selection.select_n_clusters(self.W, range(2, 5), f_range = [2, 3])
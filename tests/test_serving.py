@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+
+from .context import serving
+from .context import utils
+from .context import blockdiagonalBMD_model
+
+
+class TestServing(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.RandomState(11)
+        self.P = (rng.rand(30, 130) < 0.5).astype(np.uint8)
+        self.Q = (rng.rand(7, 130) < 0.5).astype(np.uint8)
+
+    def test_pack_rows(self):
+
+        packed = serving.pack_rows(self.P)
+        self.assertEqual(packed.dtype, np.uint64)
+        self.assertEqual(packed.shape, (30, 3))
+        self.assertTrue(np.array_equal(serving.popcount(packed).sum(axis = 1), self.P.sum(axis = 1)))
+
+    def test_hamming_distances(self):
+
+        D = serving.hamming_distances(serving.pack_rows(self.P), serving.pack_rows(self.Q))
+        self.assertTrue(np.array_equal(D, utils.sq_distances(self.P, self.Q)))
+
+    def test_popcount_table(self):
+
+        x = np.array([0, 1, 2**63 + 5, 2**64 - 1], dtype = np.uint64)
+        counts = serving._POPCOUNT_TABLE[x.view(np.uint8)].reshape((4, 8)).sum(axis = 1)
+        self.assertTrue(np.array_equal(counts, [0, 1, 3, 64]))
+
+    def test_freeze(self):
+
+        W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+
+        BMD_model = blockdiagonalBMD_model(n_clusters = 4, seed = 12)
+        BMD_model.fit(W)
+        frozen = BMD_model.freeze()
+
+        self.assertTrue(np.array_equal(frozen.predict(W), BMD_model.predict(W)))
+        self.assertTrue(np.array_equal(frozen.predict(serving.pack_rows(W)), BMD_model.predict(W)))
+        self.assertTrue(np.array_equal(frozen.transform(W), BMD_model.transform(W)))
+
+        with self.assertRaises(ValueError):
+            frozen.predict(W[:, :5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import unittest
+import numpy as np
+
+from .context import utils
+from .context import blockdiagonalBMD
+from .context import generalBMD
+from .context import cluster_initializers
+
+
+class TestCollapseRows(unittest.TestCase):
+
+    def setUp(self):
+
+        self.W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+        self.W_unique, self.weights, self.inverse = utils.collapse_rows(self.W)
+        self.K = 4
+        self.seed = 123
+
+        # initialize on the unique rows so duplicate points start in the same cluster
+        self.A_unique = cluster_initializers.initialize_A(len(self.W_unique), self.K, seed = self.seed)
+        self.A_full = self.A_unique[self.inverse]
+
+    def test_collapse_rows(self):
+
+        with self.subTest('Test unique rows reconstruct W'):
+            self.assertTrue(np.array_equal(self.W_unique[self.inverse], self.W))
+
+        with self.subTest('Test weights are multiplicities'):
+            self.assertEqual(self.weights.sum(), self.W.shape[0])
+            self.assertEqual(len(np.unique(self.W_unique, axis = 0)), len(self.W_unique))
+
+        with self.subTest('Test unique rows in order of first appearance'):
+            self.assertTrue(np.array_equal(self.W_unique[0], self.W[0]))
+            self.assertEqual(self.inverse[0], 0)
+
+        with self.subTest('Test distinct non-binary rows are kept apart'):
+            W = np.array([[0.5, 1.0], [2.0, 1.0], [0.5, 1.0]])
+            W_unique, weights, inverse = utils.collapse_rows(W)
+            self.assertTrue(np.array_equal(W_unique, W[:2]))
+            self.assertTrue(np.array_equal(weights, [2, 1]))
+            self.assertTrue(np.array_equal(inverse, [0, 1, 0]))
+
+    def test_weighted_run_bd_BMD(self):
+
+        cost, A, B = blockdiagonalBMD.run_bd_BMD(self.A_full, self.W)
+        cost_w, A_w, B_w = blockdiagonalBMD.run_bd_BMD(self.A_unique, self.W_unique, weights = self.weights)
+
+        self.assertAlmostEqual(cost, cost_w)
+        self.assertTrue(np.array_equal(A, A_w[self.inverse]))
+        self.assertTrue(np.array_equal(B, B_w))
+
+    def test_weighted_run_BMD(self):
+
+        B_init = np.identity(self.W.shape[1])
+
+        cost, A, B, X = generalBMD.run_BMD(self.A_full, B_init, self.W, verbose = 0)
+        cost_w, A_w, B_w, X_w = generalBMD.run_BMD(self.A_unique, B_init, self.W_unique, verbose = 0, weights = self.weights)
+
+        self.assertAlmostEqual(cost, cost_w)
+        self.assertTrue(np.array_equal(A, A_w[self.inverse]))
+        self.assertTrue(np.array_equal(B, B_w))
+        self.assertTrue(np.allclose(X, X_w))
+
+
+class TestCollapseColumns(unittest.TestCase):
+
+    def setUp(self):
+
+        W = np.loadtxt(open('tests/data/test_set_4.csv', 'r'), delimiter = ',')
+        # append an all-zero and an all-one feature
+        self.W = np.hstack([W, np.zeros((W.shape[0], 1)), np.ones((W.shape[0], 1))])
+
+    def test_collapse_columns(self):
+
+        W_c, feature_weights, feature_inverse = utils.collapse_columns(self.W)
+
+        with self.subTest('Test duplicate and constant columns removed'):
+            self.assertEqual(W_c.shape, (self.W.shape[0], 3))
+            self.assertTrue(np.array_equal(feature_weights, [2, 2, 2]))
+
+        with self.subTest('Test inverse maps back to W'):
+            self.assertTrue(np.array_equal(feature_inverse, [0, 0, 1, 1, 2, 2, -1, -1]))
+            self.assertTrue(np.array_equal(W_c[:, feature_inverse[:6]], self.W[:, :6]))
+
+        with self.subTest('Test constant columns kept'):
+            W_c, feature_weights, feature_inverse = utils.collapse_columns(self.W, drop_constant = False)
+            self.assertEqual(W_c.shape[1], 5)
+
+    def test_weighted_run_BMD(self):
+
+        W = self.W[:, :6]
+        W_c, feature_weights, feature_inverse = utils.collapse_columns(W)
+
+        A_init = cluster_initializers.initialize_A(W.shape[0], 3, seed = 1234)
+        B_init = np.zeros((6, 2))
+        B_init[:2, 0], B_init[2:, 1] = 1, 1
+
+        cost, A, B, X = generalBMD.run_BMD(A_init, B_init, W, verbose = 0)
+        cost_w, A_w, B_w, X_w = generalBMD.run_BMD(A_init, B_init[[0, 2, 4], :], W_c, verbose = 0, 
+                                                   feature_weights = feature_weights)
+
+        self.assertAlmostEqual(cost, cost_w)
+        self.assertTrue(np.array_equal(A, A_w))
+        self.assertTrue(np.array_equal(B, B_w[feature_inverse]))
+
+
+
+class TestEmptyClusters(unittest.TestCase):
+
+    def setUp(self):
+
+        # cluster 1 is empty, cluster 0 holds three points and cluster 2 one
+        self.A = utils.labels_to_indicator([0, 0, 0, 2], 3)
+        self.costs = lambda A: np.array([1.0, 5.0, 2.0, 9.0])
+
+    def test_keep(self):
+
+        empty = utils.EmptyClusters('keep')
+        A, alive = empty.update(self.A.copy(), None, self.costs)
+
+        self.assertTrue(np.array_equal(A, self.A))
+        self.assertIsNone(alive)
+        self.assertEqual(empty.stats(), utils.EmptyClusterStats(n_empty = 1, n_reseeded = 0, n_dropped = 0))
+
+    def test_reseed(self):
+
+        empty = utils.EmptyClusters('reseed')
+        A, alive = empty.update(self.A.copy(), None, self.costs)
+
+        # the costliest point is alone in its cluster, the next costliest is moved
+        self.assertTrue(np.array_equal(A.argmax(axis = 1), [0, 1, 0, 2]))
+        self.assertIsNone(alive)
+        self.assertEqual(empty.stats(), utils.EmptyClusterStats(n_empty = 1, n_reseeded = 1, n_dropped = 0))
+
+    def test_drop(self):
+
+        empty = utils.EmptyClusters('drop')
+        A, alive = empty.update(self.A.copy(), None, self.costs)
+
+        self.assertTrue(np.array_equal(A, self.A[:, [0, 2]]))
+        self.assertTrue(np.array_equal(alive, [0, 2]))
+        self.assertTrue(np.array_equal(empty.alive(3), [0, 2]))
+        self.assertTrue(np.array_equal(utils.expand_columns(A, alive, 3), self.A))
+
+        # cluster 2 empties next, its index is mapped back to all clusters
+        A, alive = empty.update(utils.labels_to_indicator([0, 0, 0, 0], 2), alive, self.costs)
+        self.assertTrue(np.array_equal(alive, [0]))
+        self.assertEqual(empty.dropped, [1, 2])
+
+    def test_policy(self):
+
+        with self.assertRaises(ValueError):
+            utils.EmptyClusters('merge')
+
+    def test_run_with_policy(self):
+
+        W = np.loadtxt(open('tests/data/zoo.csv', 'r'), delimiter = ',', skiprows = 1, usecols = range(1, 22))
+        A_init = cluster_initializers.initialize_A(W.shape[0], 12, seed = 3)
+        cost, A, B = blockdiagonalBMD.run_bd_BMD(A_init, W)
+
+        with self.subTest('Test keep does not change the fit'):
+            cost_k, A_k, B_k = blockdiagonalBMD.run_bd_BMD(A_init, W, empty_cluster = utils.EmptyClusters('keep'))
+            self.assertEqual(cost, cost_k)
+            self.assertTrue(np.array_equal(A, A_k))
+
+        for policy in ['reseed', 'drop']:
+            with self.subTest(policy = policy):
+                empty = utils.EmptyClusters(policy)
+                cost_p, A_p, B_p = blockdiagonalBMD.run_bd_BMD(A_init, W, empty_cluster = empty)
+                self.assertGreater(empty.stats().n_empty, 0)
+                self.assertAlmostEqual(cost_p, blockdiagonalBMD._bd_objective(A_p, B_p, W))
+                self.assertEqual(A_p.shape, A.shape)
+                # dropped clusters stay empty
+                self.assertFalse(A_p[:, empty.dropped].any())
+                self.assertFalse(B_p[:, empty.dropped].any())
+
+
+if __name__ == '__main__':
+    unittest.main()